@@ -1,72 +1,319 @@
 import os
+import io
 import json
 import uuid
+import hashlib
 import logging
+import sqlite3
+import tarfile
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
 from PIL import Image
 
+from .services.fileio import atomic_write
+
 logger = logging.getLogger("adjudicator")
 logger.setLevel(logging.INFO)
 
+# Crops are stored once per content hash (images/<sha[:2]>/<sha>.png) and
+# samples are indexed in dataset.sqlite keyed by (source_file, bbox, latex):
+# re-saving the same equation replaces its sample instead of adding one.
+# Every save is still appended to dataset.jsonl, so tools tailing it keep
+# working; there the last line per sample wins, and `compact` rewrites it to
+# one line per sample. Training shards are produced by export (see __main__).
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    key           TEXT PRIMARY KEY,
+    id            TEXT NOT NULL,
+    timestamp     TEXT NOT NULL,
+    source_file   TEXT,
+    latex_gt      TEXT,
+    bbox          TEXT,
+    image_sha256  TEXT NOT NULL,
+    image_path    TEXT NOT NULL,
+    is_figure     INTEGER NOT NULL,
+    verified      INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key     TEXT PRIMARY KEY,
+    value   TEXT
+);
+"""
+_COLUMNS = ("id", "timestamp", "source_file", "latex_gt", "bbox", "image_sha256", "image_path", "is_figure", "verified")
+
+
+def sample_key(source_file: Optional[str], bbox: Optional[list], latex: Optional[str], is_figure: bool) -> str:
+    """Identity of a sample: same source, box (to 0.01 pt) and label means same sample."""
+    box = [round(float(v), 2) for v in bbox] if bbox else None
+    ident = json.dumps([source_file, box, latex, bool(is_figure)], ensure_ascii=False)
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+
+def _file_signature(p: Path) -> Optional[str]:
+    try:
+        st = p.stat()
+    except FileNotFoundError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
 class AdjudicationManager:
     """
     Manages Human-in-the-Loop data collection.
     Saves cropped images and verified LaTeX to a dataset for future training.
     """
-    def __init__(self, data_root: str = "../data/adjudicated"):
-        # Resolve relative to this file
-        self.root = Path(__file__).resolve().parent.parent / "data" / "adjudicated"
+    def __init__(self, data_root: Optional[str] = None):
+        # Default: data/adjudicated, resolved relative to this file
+        self.root = Path(data_root) if data_root else Path(__file__).resolve().parent.parent / "data" / "adjudicated"
         self.images_dir = self.root / "images"
         self.manifest_path = self.root / "dataset.jsonl"
-        
+        self.index_path = self.root / "dataset.sqlite"
+
         self.images_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = None
 
-    def save_correction(self, image: Image.Image, latex: str, source_file: str, bbox: list = None):
-        """Save a verified equation sample."""
-        sample_id = uuid.uuid4().hex
-        timestamp = datetime.now().isoformat()
-        
-        # Save Crop
-        image_filename = f"{sample_id}.png"
-        image_path = self.images_dir / image_filename
-        image.save(image_path, format="PNG")
-        
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # opened on first use so importing the app does not touch the dataset
+        with self._lock:
+            if self._conn is None:
+                conn = sqlite3.connect(str(self.index_path), check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                self._conn = conn
+                self._import_manifest()
+            return self._conn
+
+    def store_image(self, image: Image.Image) -> Dict[str, str]:
+        """PNG-encode image and store it under its SHA-256 unless already present."""
+        buf = io.BytesIO()
+        image.save(buf, format="PNG")
+        return self._store_png(buf.getvalue())
+
+    def _store_png(self, data: bytes) -> Dict[str, str]:
+        sha = hashlib.sha256(data).hexdigest()
+        rel = f"{sha[:2]}/{sha}.png"
+        path = self.images_dir / rel
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, data)
+        return {"image_sha256": sha, "image_path": rel}
+
+    def _record(self, image_ref: Dict[str, str], latex: Optional[str], source_file: str, bbox: Optional[list],
+                is_figure: bool, sample_id: Optional[str] = None, timestamp: Optional[str] = None) -> Dict[str, Any]:
         entry = {
-            "id": sample_id,
-            "timestamp": timestamp,
+            "id": sample_id or uuid.uuid4().hex,
+            "timestamp": timestamp or datetime.now().isoformat(),
             "source_file": source_file,
             "latex_gt": latex,
-            "image_path": str(image_filename),
+            "image_path": image_ref["image_path"],
+            "image_sha256": image_ref["image_sha256"],
             "bbox": bbox,
-            "is_figure": False,
+            "is_figure": is_figure,
             "verified": True
         }
+        # latest wins: REPLACE also moves the row to the end of rowid order
+        with self._lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO samples (key, {', '.join(_COLUMNS)}) VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})",
+                (
+                    sample_key(source_file, bbox, latex, is_figure), entry["id"], entry["timestamp"], source_file, latex,
+                    json.dumps(bbox) if bbox is not None else None, entry["image_sha256"], entry["image_path"],
+                    int(is_figure), 1,
+                ),
+            )
+        return entry
+
+    def save_correction(self, image: Image.Image, latex: str, source_file: str, bbox: list = None):
+        """Save a verified equation sample."""
+        entry = self._record(self.store_image(image), latex, source_file, bbox, is_figure=False)
+        self._append_manifest(entry)
+        logger.info(f"Adjudicated: {entry['id']}")
+        return entry
 
-        with open(self.manifest_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-            
-        logger.info(f"Adjudicated: {sample_id}")
+    def sync(self):
+        """Checkpoint the index and fsync dataset.jsonl so saved samples survive a crash or power loss."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("PRAGMA wal_checkpoint(FULL)")
+            if self.manifest_path.exists():
+                with open(self.manifest_path, "rb") as f:
+                    os.fsync(f.fileno())
+
+    def _append_manifest(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            # our own line is already in the index: do not import it back
+            self._set_signature(_file_signature(self.manifest_path))
 
     def flag_as_figure(self, image: Image.Image, source_file: str, bbox: list = None):
         """Save a false positive (figure/chart detection)."""
-        sample_id = uuid.uuid4().hex
-        image_filename = f"FIG_{sample_id}.png"
-        image_path = self.images_dir / image_filename
-        image.save(image_path, format="PNG")
+        entry = self._record(self.store_image(image), None, source_file, bbox, is_figure=True)
+        self._append_manifest(entry)
+        logger.info(f"Flagged Figure: {entry['id']}")
+        return entry
 
-        entry = {
-            "id": sample_id,
-            "timestamp": datetime.now().isoformat(),
-            "source_file": source_file,
-            "latex_gt": None,
-            "image_path": str(image_filename),
-            "bbox": bbox,
-            "is_figure": True,
-            "verified": True
-        }
+    # --- index, compaction, export ---
+
+    def samples(self) -> Iterator[Dict[str, Any]]:
+        """Current samples, oldest first."""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM samples ORDER BY rowid").fetchall()
+        for row in rows:
+            entry = dict(zip(_COLUMNS, row))
+            entry["bbox"] = json.loads(entry["bbox"]) if entry["bbox"] else None
+            entry["is_figure"] = bool(entry["is_figure"])
+            entry["verified"] = bool(entry["verified"])
+            yield entry
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n, figures, images = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(is_figure), 0), COUNT(DISTINCT image_sha256) FROM samples"
+            ).fetchone()
+        return {"samples": n, "figures": figures, "images": images}
+
+    def _import_manifest(self) -> int:
+        # caller holds self._lock. A dataset.jsonl we did not write ourselves
+        # (pre-index layout: uuid-named PNGs, duplicate lines) is folded in once.
+        sig = _file_signature(self.manifest_path)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'manifest_signature'").fetchone()
+        if sig is None or (row and row[0] == sig):
+            return 0
+        n = 0
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                        data = (self.images_dir / e["image_path"]).read_bytes()
+                    except (json.JSONDecodeError, KeyError, TypeError, OSError):
+                        continue
+                    self._record(self._store_png(data), e.get("latex_gt"), e.get("source_file"), e.get("bbox"),
+                                 bool(e.get("is_figure")), e.get("id"), e.get("timestamp"))
+                    n += 1
+            self._set_signature(sig)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Imported {n} samples from {self.manifest_path}")
+        return n
+
+    def _set_signature(self, sig: Optional[str]) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('manifest_signature', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (sig,),
+        )
+
+    def compact(self, min_age_seconds: float = 3600) -> Dict[str, int]:
+        """
+        Rewrite dataset.jsonl as one line per current sample and delete image
+        files no sample references (older than min_age_seconds, so a crop
+        being saved right now is left alone).
+        """
+        entries = list(self.samples())
+        with self._lock:
+            atomic_write(self.manifest_path, "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+            self._set_signature(_file_signature(self.manifest_path))
+        referenced = {e["image_path"] for e in entries}
+        removed = 0
+        cutoff = time.time() - min_age_seconds
+        for path in self.images_dir.rglob("*.png"):
+            rel = path.relative_to(self.images_dir).as_posix()
+            if rel not in referenced and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        return {"samples": len(entries), "images_removed": removed}
+
+    def export_shards(self, out_dir: Path, shard_size: int = 1000, fmt: str = "tar",
+                      include_figures: bool = True) -> List[Path]:
+        """
+        Write samples as training shards with the PNG bytes embedded:
+        WebDataset tars (<id>.png, <id>.txt, <id>.json per sample) or, with
+        pyarrow installed, Parquet files with an `image` binary column.
+        """
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        entries = [e for e in self.samples() if include_figures or not e["is_figure"]]
+        written = []
+        for start in range(0, len(entries), max(1, shard_size)):
+            chunk = entries[start:start + shard_size]
+            path = out_dir / f"adjudicated-{start // shard_size:05d}.{'parquet' if fmt == 'parquet' else 'tar'}"
+            tmp = path.with_name(path.name + ".tmp")
+            if fmt == "parquet":
+                self._write_parquet(tmp, chunk)
+            else:
+                self._write_tar(tmp, chunk)
+            os.replace(tmp, path)
+            written.append(path)
+        return written
+
+    def _write_tar(self, path: Path, entries: List[Dict[str, Any]]) -> None:
+        with tarfile.open(path, "w") as tar:
+            for e in entries:
+                members = {
+                    "png": (self.images_dir / e["image_path"]).read_bytes(),
+                    "txt": (e["latex_gt"] or "").encode("utf-8"),
+                    "json": json.dumps(e, ensure_ascii=False).encode("utf-8"),
+                }
+                for ext, data in members.items():
+                    info = tarfile.TarInfo(f"{e['id']}.{ext}")
+                    info.size = len(data)
+                    info.mtime = 0
+                    tar.addfile(info, io.BytesIO(data))
+
+    def _write_parquet(self, path: Path, entries: List[Dict[str, Any]]) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow); use --format tar")
+        table = pa.table({
+            "id": [e["id"] for e in entries],
+            "latex_gt": [e["latex_gt"] for e in entries],
+            "source_file": [e["source_file"] for e in entries],
+            "bbox": [e["bbox"] for e in entries],
+            "is_figure": [e["is_figure"] for e in entries],
+            "image_sha256": [e["image_sha256"] for e in entries],
+            "image": [(self.images_dir / e["image_path"]).read_bytes() for e in entries],
+        })
+        pq.write_table(table, path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Adjudication dataset maintenance")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="count samples and stored images")
+    c = sub.add_parser("compact", help="rewrite dataset.jsonl latest-wins and drop unreferenced images")
+    c.add_argument("--min-age", type=float, default=3600, help="only delete images older than this (seconds)")
+    e = sub.add_parser("export", help="write training shards with embedded images")
+    e.add_argument("--out", default=None, help="output directory (default: data/adjudicated/shards)")
+    e.add_argument("--format", choices=["tar", "parquet"], default="tar")
+    e.add_argument("--shard-size", type=int, default=1000)
+    e.add_argument("--no-figures", action="store_true", help="leave out figure (false positive) samples")
+    args = ap.parse_args()
 
-        with open(self.manifest_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-            
-        logger.info(f"Flagged Figure: {sample_id}")
\ No newline at end of file
+    manager = AdjudicationManager(os.getenv("ADJUDICATION_ROOT") or None)
+    if args.command == "stats":
+        print(json.dumps(manager.stats()))
+    elif args.command == "compact":
+        print(json.dumps(manager.compact(min_age_seconds=args.min_age)))
+    else:
+        out = Path(args.out) if args.out else manager.root / "shards"
+        try:
+            paths = manager.export_shards(out, args.shard_size, args.format, include_figures=not args.no_figures)
+        except RuntimeError as err:
+            raise SystemExit(str(err))
+        for path in paths:
+            print(path)
@@ -1,36 +1,81 @@
 from pathlib import Path
 import os
+import asyncio
 import hashlib
 import json
-from typing import List, Dict, Any
+import tempfile
+from typing import Annotated, List, Dict, Any, Literal, Optional, Tuple
 
-from fastapi import Body, FastAPI, HTTPException, UploadFile, File
+from fastapi import Body, FastAPI, Header, HTTPException, Path as PathParam, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
-from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 
 from .schemas import EquationRecord
-from .storage import read_equations, append_equation, update_equation, delete_equation
-from .services.pdf import page_count, render_page_png, page_meta
-from .services.validate import validate_latex
+from .storage import (
+    read_equations, append_equation, append_equations, update_equation, delete_equation,
+    equation_history, export_jsonl, equations_revision, query_equations, apply_equation_ops, reindex_profiles,
+    flush_exports,
+)
+from .services.pdf import (
+    page_count, render_page, render_page_tile, page_meta, document_meta, documents, content_hash, page_hashes,
+    IMAGE_FORMATS, PREVIEW_ZOOM, MAX_ZOOM, TILE_SIZE,
+)
+from .services.render_cache import renders, render_key, encode_image, decode_image
+from .services.prefetch import prefetcher, page_order, PREFETCH_RADIUS
+from .services.autodetect import (
+    iter_autodetect, crop_region, ingest, load_ingest_pdf, shutdown_pool, warm_pool, AUTODETECT_DPI, DEDUP_IOU,
+)
+from .services import recognition
+from .services.recognition import recognize_batch
+from .services.recognition_cache import recognitions
+from .services.manifest import ProcessingManifest
+from .services.boxindex import PageBoxIndex
+from .services.detector import Detector
+from .services.jobs import Job, JobConflict, JobManager
+from .services.fileio import paper_lock
+from .services.uploads import PaperFiles
+from .services.adjudication_queue import AdjudicationQueue, ADJUDICATION_QUEUE_SIZE
+from .services.validate import validate_latex, validate_many, validator
+from .services.metrics import MetricsMiddleware, registry as metrics, timed
+from .services.warmup import warmup
+from .services.search import search_index, parse_symbol
 from .adjudication import AdjudicationManager
 
-from equation_scribe.recognition.inference import image_to_latex
-from equation_scribe.pdf_ingest import load_pdf, page_image, page_layout, page_size_points, pdf_to_px_transform
-from equation_scribe.detector.inference import detect_image 
-from equation_scribe.detect import find_equation_candidates
 import uuid 
+from functools import partial
+from contextlib import asynccontextmanager, closing
 
 APP_ROOT = Path(__file__).resolve().parents[1]
 YOLO_MODEL_PATH = Path(__file__).parent / "models" / "best.pt" 
+DUPLICATE_BOX_IOU = float(os.getenv("DUPLICATE_BOX_IOU", "0.9"))
+MAX_EQUATIONS_PAGE = int(os.getenv("MAX_EQUATIONS_PAGE", "1000"))
+MAX_SEARCH_PAGE = int(os.getenv("MAX_SEARCH_PAGE", "200"))
+MAX_BATCH_OPS = int(os.getenv("MAX_BATCH_OPS", "1000"))
 PROFILES_ROOT = Path(os.getenv("PROFILES_ROOT", "data/profiles"))
 PAPERS_ROOT = Path(os.getenv("PAPERS_ROOT", "data/pdfs"))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", "0"))  # 0 = unlimited
 
 PROFILES_ROOT.mkdir(parents=True, exist_ok=True)
 PAPERS_ROOT.mkdir(parents=True, exist_ok=True)
 
-app = FastAPI(title="Equation Scribe API")
-adjudicator = AdjudicationManager()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # start_warmup and drain_background_work are defined with the health endpoints below
+    start_warmup()
+    try:
+        yield
+    finally:
+        await run_in_threadpool(drain_background_work)
+
+app = FastAPI(title="Equation Scribe API", lifespan=lifespan)
+adjudicator = AdjudicationManager(os.getenv("ADJUDICATION_ROOT") or None)
+detector = Detector(YOLO_MODEL_PATH, conf_thresh=0.25)
+jobs = JobManager(max_running=int(os.getenv("AUTODETECT_MAX_JOBS", "2")))
+paper_files = PaperFiles(PAPERS_ROOT)
+SSE_POLL_SECONDS = 0.25
 
 app.add_middleware(
     CORSMiddleware,
@@ -39,20 +84,53 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 class LatexPayload(BaseModel):
     latex: str
 
+class LatexBatchPayload(BaseModel):
+    items: List[str]
+
 class AutoDetectRequest(BaseModel):
     page_index: int
 
+class AutodetectOptions(BaseModel):
+    start_page: Optional[int] = Field(None, ge=0)  # zero-based, inclusive
+    end_page: Optional[int] = Field(None, ge=0)    # zero-based, inclusive
+    force: bool = False               # re-run pages the manifest marks as done
+
 class UploadResponse(BaseModel):
     paper_id: str
+    content_hash: Optional[str] = None
+    outcome: Optional[str] = None  # "new", "duplicate" (existing paper) or "replaced"
 
 class RescanRequest(BaseModel):
     page_index: int
     bbox: List[float]
 
+class RescanBoxesRequest(BaseModel):
+    items: List[RescanRequest]
+
+class EquationOp(BaseModel):
+    op: Literal["upsert", "delete"]
+    record: Optional[EquationRecord] = None  # upsert
+    eq_uid: Optional[str] = None             # delete
+
+class EquationBatchRequest(BaseModel):
+    ops: List[EquationOp]
+    atomic: bool = True  # any failing op rejects the whole batch
+
+Zoom = Annotated[float, Field(gt=0, le=MAX_ZOOM)]
+
+class PrefetchRequest(BaseModel):
+    page_index: int = Field(0, ge=0)
+    zooms: List[Zoom] = [1.5]
+    radius: int = Field(PREFETCH_RADIUS, ge=0)
+    rasters: bool = False             # also the 150 dpi rasters autodetect and rescans use
+    client_id: Optional[str] = None   # one viewer tab; its earlier requests are superseded
+
 def slugify(name: str) -> str:
     stem = Path(name).stem
     safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in stem)
@@ -63,115 +141,447 @@ def pdf_path_for(paper_id: str) -> Path:
     if p.exists(): return p
     raise HTTPException(404, f"PDF for paper_id '{paper_id}' not found")
 
+def open_ingest_pdf(paper_id: str):
+    """Shared equation_scribe document handle for paper_id (see services.pdf.documents)."""
+    return documents.open(pdf_path_for(paper_id), loader=load_ingest_pdf, kind="ingest")
+
+def page_bytes(paper_id: str, idx: int, zoom: float, fmt: str = "png", quality: int = 85) -> bytes:
+    p = pdf_path_for(paper_id)
+    kind = "png" if fmt == "png" else f"{fmt}{quality}"
+    return renders.get_or_create(
+        render_key(p, idx, kind, zoom), lambda: render_page(p, idx, zoom=zoom, fmt=fmt, quality=quality)
+    )
+
+def cached_page_image(paper_id: str, page_ix: int, dpi: int = 150):
+    """PIL rendering of a page shared by the crop paths (rescan, adjudication, autodetect)."""
+    def render() -> bytes:
+        with open_ingest_pdf(paper_id) as doc, timed("rasterize", items=1):
+            return encode_image(ingest().page_image(doc, page_ix, dpi=dpi))
+    key = render_key(pdf_path_for(paper_id), page_ix, "raster", dpi)
+    return decode_image(renders.get_or_create(key, render))
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+IMAGE_FORMAT_PATTERN = "^(" + "|".join(IMAGE_FORMATS) + ")$"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+def schedule_prefetch(
+    paper_id: str,
+    page_index: int = 0,
+    zooms: List[float] = (1.5,),
+    radius: int = PREFETCH_RADIUS,
+    rasters: bool = False,
+    client: str = "",
+) -> int:
+    """
+    Queue background renders for the pages within radius of page_index,
+    nearest first: preview and viewer images at each zoom, then (rasters=True)
+    the 150 dpi rasters autodetect and the crop paths use. The client's
+    earlier pending work, for this or any other paper, is dropped; other
+    clients' is kept.
+    """
+    if not prefetcher.enabled:
+        return 0
+    n = page_count(pdf_path_for(paper_id))
+    prefetcher.cancel(client=client)
+    order = page_order(n, page_index, radius)
+    for rank, idx in enumerate(order):
+        prefetcher.submit(paper_id, rank, partial(page_bytes, paper_id, idx, PREVIEW_ZOOM, "jpeg", 60), client)
+        for zoom in zooms:
+            prefetcher.submit(paper_id, rank + 0.5, partial(page_bytes, paper_id, idx, zoom), client)
+        if rasters:
+            prefetcher.submit(paper_id, len(order) + rank, partial(cached_page_image, paper_id, idx, AUTODETECT_DPI), client)
+    return len(order)
+
+def image_response(
+    paper_id: str,
+    variant: str,
+    fmt: str,
+    v: Optional[str],
+    if_none_match: Optional[str],
+    render,
+) -> Response:
+    # Renders are a pure function of (PDF bytes, page, zoom, ...): the ETag is
+    # derived from those, and a URL pinned to the current content hash (?v=)
+    # can be cached forever.
+    digest = content_hash(pdf_path_for(paper_id))
+    etag = f'"{digest[:32]}-{variant}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE if v == digest else "no-cache",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=render(), media_type=IMAGE_FORMATS[fmt], headers=headers)
+
+# (mtime_ns, size) of index.json when it was parsed, and the parsed index
+_profiles_index: Tuple[Optional[Tuple[int, int]], dict] = (None, {})
+
 def load_profiles_index() -> dict:
+    """index.json, re-parsed only when its mtime or size changes. Treat the result as read-only."""
+    global _profiles_index
     idx_path = PROFILES_ROOT / "index.json"
-    if not idx_path.exists():
+    try:
+        st = idx_path.stat()
+    except FileNotFoundError:
         return {"version": 1, "papers": {}, "by_pdf_basename": {}}
+    sig = (st.st_mtime_ns, st.st_size)
+    cached_sig, cached = _profiles_index
+    if sig == cached_sig:
+        return cached
     try:
         with idx_path.open("r", encoding="utf-8") as f:
-            return json.load(f)
+            data = json.load(f)
     except Exception:
-        return {"version": 1, "papers": {}, "by_pdf_basename": {}}
-
-# --- HELPER: IoU for Deduplication ---
-def calculate_iou(boxA, boxB):
-    # box: [x0, y0, x1, y1]
-    xA = max(boxA[0], boxB[0])
-    yA = max(boxA[1], boxB[1])
-    xB = min(boxA[2], boxB[2])
-    yB = min(boxA[3], boxB[3])
-
-    interArea = max(0, xB - xA) * max(0, yB - yA)
-    boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-    boxBArea = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
-
-    unionArea = boxAArea + boxBArea - interArea
-    if unionArea == 0: return 0
-    return interArea / unionArea
+        data = {"version": 1, "papers": {}, "by_pdf_basename": {}}
+    _profiles_index = (sig, data)
+    return data
 
 # --- ENDPOINTS ---
 
 @app.post("/upload", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(file: UploadFile = File(...), replace: bool = Query(False)):
+    """
+    Copy the upload to a temp file next to the papers in UPLOAD_CHUNK_BYTES
+    chunks, hashing as it goes (Starlette has already spooled the body, so
+    this bounds memory, it does not stream from the socket), then place it: identical bytes map to the paper that already has
+    them; a different PDF whose name collides with an existing paper gets
+    "<slug>-<hash8>" unless replace=true, which swaps the existing paper's
+    PDF (and only then drops its cached renders).
+    """
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(400, "Only PDF files are supported")
-    paper_id = slugify(file.filename)
-    dest = PAPERS_ROOT / f"{paper_id}.pdf"
-    contents = await file.read()
-    dest.write_bytes(contents)
-    return UploadResponse(paper_id=paper_id)
+    slug = slugify(file.filename)
+    PAPERS_ROOT.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(PAPERS_ROOT), prefix=".upload-", suffix=".tmp")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                if size == 0 and not chunk.startswith(b"%PDF"):
+                    raise HTTPException(400, "Not a PDF file")
+                size += len(chunk)
+                if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(413, f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+                h.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+        if size == 0:
+            raise HTTPException(400, "Empty upload")
+        sha256 = h.hexdigest()
+        paper_id, outcome = await run_in_threadpool(paper_files.place, Path(tmp), sha256, slug, replace)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    if outcome == "replaced":
+        dest = PAPERS_ROOT / f"{paper_id}.pdf"
+        documents.invalidate(dest)
+        renders.invalidate(paper_id)
+    if outcome != "duplicate":
+        # page_count opens the PDF: keep it off the event loop
+        await run_in_threadpool(schedule_prefetch, paper_id, client=f"upload:{paper_id}")
+    return UploadResponse(paper_id=paper_id, content_hash=sha256, outcome=outcome)
 
 @app.get("/papers/{paper_id}/pages")
 def get_pages(paper_id: str):
-    return {"pages": page_count(pdf_path_for(paper_id))}
+    p = pdf_path_for(paper_id)
+    return {"pages": page_count(p), "content_hash": content_hash(p)}
+
+@app.post("/papers/{paper_id}/prefetch")
+def prefetch_endpoint(paper_id: str, request: Request, payload: PrefetchRequest = Body(default_factory=PrefetchRequest)):
+    # without a client_id, requests from one address count as one client
+    client = payload.client_id or (request.client.host if request.client else "")
+    queued = schedule_prefetch(paper_id, payload.page_index, payload.zooms, payload.radius, payload.rasters, client)
+    return {"queued_pages": queued, **prefetcher.status()}
+
+@app.delete("/papers/{paper_id}/prefetch")
+def cancel_prefetch_endpoint(paper_id: str, client_id: Optional[str] = None):
+    dropped = prefetcher.cancel(paper_id, client=client_id)
+    return {**prefetcher.status(), "dropped": dropped}
+
+@app.get("/prefetch/status")
+def prefetch_status_endpoint():
+    return prefetcher.status()
 
 @app.get("/papers/index")
 def get_profiles_index_endpoint():
     return load_profiles_index()
 
 @app.get("/papers/{paper_id}/page/{idx}/image")
-def get_page_image_endpoint(paper_id: str, idx: int, zoom: float = 1.5):
+def get_page_image_endpoint(
+    paper_id: str,
+    idx: int,
+    zoom: float = Query(1.5, gt=0, le=MAX_ZOOM),
+    fmt: str = Query("png", pattern=IMAGE_FORMAT_PATTERN),
+    q: int = Query(85, ge=1, le=100),
+    v: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    variant = f"{idx}-{zoom:g}" if fmt == "png" else f"{idx}-{zoom:g}-{fmt}{q}"
+    return image_response(
+        paper_id, variant, fmt, v, if_none_match,
+        lambda: page_bytes(paper_id, idx, zoom, fmt=fmt, quality=q),
+    )
+
+@app.get("/papers/{paper_id}/page/{idx}/preview")
+def get_page_preview_endpoint(
+    paper_id: str,
+    idx: int,
+    fmt: str = Query("jpeg", pattern=IMAGE_FORMAT_PATTERN),
+    q: int = Query(60, ge=1, le=100),
+    v: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Small, cheap rendering to show while the full-resolution page loads."""
+    return image_response(
+        paper_id, f"{idx}-preview-{fmt}{q}", fmt, v, if_none_match,
+        lambda: page_bytes(paper_id, idx, PREVIEW_ZOOM, fmt=fmt, quality=q),
+    )
+
+@app.get("/papers/{paper_id}/page/{idx}/tile/{z}/{x}/{y}")
+def get_page_tile_endpoint(
+    paper_id: str,
+    idx: int,
+    z: float = PathParam(gt=0, le=MAX_ZOOM),
+    x: int = PathParam(ge=0),
+    y: int = PathParam(ge=0),
+    fmt: str = Query("png", pattern=IMAGE_FORMAT_PATTERN),
+    q: int = Query(85, ge=1, le=100),
+    v: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Tile (x, y) of the page rendered at zoom z; tiles are TILE_SIZE px squares."""
     p = pdf_path_for(paper_id)
-    data = render_page_png(p, idx, zoom=zoom)
-    return Response(content=data, media_type="image/png")
+    key = render_key(p, idx, f"tile{TILE_SIZE}-{x}-{y}-{fmt}{q}", z)
+
+    def render() -> bytes:
+        try:
+            return renders.get_or_create(
+                key, lambda: render_page_tile(p, idx, z, x, y, fmt=fmt, quality=q)
+            )
+        except IndexError as e:
+            raise HTTPException(404, str(e))
+
+    return image_response(
+        paper_id, f"{idx}-t{z:g}-{x}-{y}-{fmt}{q}", fmt, v, if_none_match, render
+    )
 
 @app.get("/papers/{paper_id}/page/{idx}/meta")
-def get_page_meta_endpoint(paper_id: str, idx: int, zoom: float = 1.5):
+def get_page_meta_endpoint(paper_id: str, idx: int, zoom: float = Query(1.5, gt=0, le=MAX_ZOOM)):
     return page_meta(pdf_path_for(paper_id), idx, zoom=zoom)
 
+@app.get("/papers/{paper_id}/meta")
+def get_document_meta_endpoint(paper_id: str, zoom: float = Query(1.5, gt=0, le=MAX_ZOOM)):
+    p = pdf_path_for(paper_id)
+    return {**document_meta(p, zoom=zoom), "content_hash": content_hash(p)}
+
 @app.get("/papers/{paper_id}/equations")
-def list_equations(paper_id: str) -> Dict[str, Any]:
-    items = read_equations(PROFILES_ROOT, paper_id)
-    return {"items": items}
+def list_equations(
+    paper_id: str,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="only changes after this revision"),
+    page: Optional[int] = Query(None, ge=0, description="only equations with a box on this page"),
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_EQUATIONS_PAGE),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Equations of a paper, optionally as a delta (?since=<revision>, with the
+    deleted eq_uids), filtered to one page and/or paginated (?limit, then
+    ?cursor=<next_cursor>). The ETag is the paper's revision, so an unchanged
+    profile answers 304.
+    """
+    epoch, revision = equations_revision(PROFILES_ROOT, paper_id)
+    etag = f'"{epoch}-{revision}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    result = query_equations(PROFILES_ROOT, paper_id, since=since, page=page, cursor=cursor, limit=limit)
+    # a write may have landed in between; describe what is actually returned
+    response.headers["ETag"] = f'"{result["epoch"]}-{result["revision"]}"'
+    response.headers["Cache-Control"] = "no-cache"
+    return result
+
+@app.get("/papers/{paper_id}/equations.jsonl")
+def export_equations(paper_id: str):
+    return FileResponse(export_jsonl(PROFILES_ROOT, paper_id), media_type="application/x-ndjson",
+                        filename=f"{paper_id}_equations.jsonl")
+
+@app.get("/papers/{paper_id}/equations/{eq_uid}/history")
+def get_equation_history(paper_id: str, eq_uid: str) -> Dict[str, Any]:
+    return {"items": equation_history(PROFILES_ROOT, paper_id, eq_uid)}
+
+@app.get("/search")
+def search_equations(
+    q: str = "",
+    mode: Literal["similar", "exact"] = "similar",
+    symbols: Optional[str] = Query(None, description="comma-separated symbols every result uses, e.g. E_0,\\alpha"),
+    paper_id: Optional[str] = None,
+    min_score: float = Query(0.0, ge=0, le=1),
+    cursor: Optional[int] = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_SEARCH_PAGE),
+):
+    """
+    Equations across every profile: similar LaTeX (token n-gram overlap,
+    best first), the same normalized LaTeX (mode=exact), and/or all of the
+    given symbols. Page with ?cursor=<next_cursor>.
+    """
+    try:
+        wanted = [parse_symbol(s) for s in (symbols or "").split(",") if s.strip()]
+        return search_index(PROFILES_ROOT).search(
+            q, mode=mode, symbols=wanted, paper_id=paper_id, min_score=min_score, cursor=cursor, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/search/stats")
+def search_stats():
+    return search_index(PROFILES_ROOT).stats()
 
 @app.post("/validate")
 def validate(payload: LatexPayload):
     return validate_latex(payload.latex or "")
 
+@app.post("/validate:batch")
+def validate_batch(payload: LatexBatchPayload):
+    if len(payload.items) > MAX_BATCH_OPS:
+        raise HTTPException(413, f"At most {MAX_BATCH_OPS} items per batch")
+    return {"results": validate_many(payload.items)}
+
+@app.post("/papers/{paper_id}/validate")
+def validate_paper(paper_id: str):
+    """Validate every saved equation of a paper (e.g. after autodetect)."""
+    items = read_equations(PROFILES_ROOT, paper_id)
+    results = validate_many([eq.get("latex") or "" for eq in items])
+    invalid = sum(1 for r in results if not r["ok"])
+    return {
+        "total": len(items),
+        "invalid": invalid,
+        "results": [{"eq_uid": eq.get("eq_uid"), **r} for eq, r in zip(items, results)],
+    }
+
+@app.get("/validate/stats")
+def validate_stats():
+    return validator.stats()
+
+def reject_duplicate_boxes(paper_id: str, rec: EquationRecord) -> None:
+    """409 if a box of rec nearly coincides with a box of another saved equation."""
+    if DUPLICATE_BOX_IOU <= 0:
+        return
+    # only the pages rec has boxes on, so the check does not grow with the paper
+    index = PageBoxIndex.from_records(read_equations(PROFILES_ROOT, paper_id, pages={b.page for b in rec.boxes}))
+    for b in rec.boxes:
+        if b.page in index and index[b.page].overlaps(b.bbox_pdf, DUPLICATE_BOX_IOU, exclude_key=rec.eq_uid):
+            raise HTTPException(409, f"A saved equation already covers this box on page {b.page + 1}")
+
 @app.post("/papers/{paper_id}/equations")
 def save_equation(paper_id: str, rec: EquationRecord):
     if not rec.boxes:
         raise HTTPException(400, "At least one box is required")
-    append_equation(PROFILES_ROOT, rec)
-    try:
-        _adjudicate_record(paper_id, rec)
-    except Exception as e:
-        print(f"Adjudication error: {e}")
-    return {"ok": True}
+    # check-then-write under the paper lock so concurrent saves (or other
+    # workers) cannot both pass the duplicate check
+    with paper_lock(PROFILES_ROOT, paper_id):
+        reject_duplicate_boxes(paper_id, rec)
+        revision = append_equation(PROFILES_ROOT, rec)
+    # captured in the background; the response only waits for the profile
+    adjudications.submit(paper_id, rec.eq_uid, rec)
+    return {"ok": True, "revision": revision}
 
 @app.put("/papers/{paper_id}/equations/{eq_uid}")
 def update_equation_endpoint(paper_id: str, eq_uid: str, rec: EquationRecord):
-    update_equation(PROFILES_ROOT, paper_id, eq_uid, rec.model_dump())
-    try:
-        _adjudicate_record(paper_id, rec)
-    except Exception as e:
-        print(f"Adjudication error: {e}")
-    return {"ok": True}
-
+    with paper_lock(PROFILES_ROOT, paper_id):
+        reject_duplicate_boxes(paper_id, rec)
+        revision = update_equation(PROFILES_ROOT, paper_id, eq_uid, rec.model_dump())
+    # captured in the background; the response only waits for the profile
+    adjudications.submit(paper_id, rec.eq_uid, rec)
+    return {"ok": True, "revision": revision}
+
+@app.post("/papers/{paper_id}/equations:batch")
+def batch_equations(paper_id: str, payload: EquationBatchRequest):
+    """
+    Apply many upserts/deletes in one transaction (one revision bump per op,
+    one commit). Every op is checked first (box present, paper_id matches, no
+    duplicate box against stored equations or earlier ops of the batch).
+    With atomic=true (default) any failure rejects the whole batch with 409;
+    otherwise the valid ops are applied and failures reported per item.
+    """
+    if len(payload.ops) > MAX_BATCH_OPS:
+        raise HTTPException(413, f"At most {MAX_BATCH_OPS} operations per batch")
+    results: List[Dict[str, Any]] = []
+    with paper_lock(PROFILES_ROOT, paper_id):
+        pages = {b.page for o in payload.ops if o.record for b in o.record.boxes}
+        records = read_equations(PROFILES_ROOT, paper_id, pages=pages) if DUPLICATE_BOX_IOU > 0 else []
+        touched = {o.record.eq_uid if o.record else o.eq_uid for o in payload.ops}
+        # boxes of equations this batch does not touch; upserts are added as they pass
+        index = PageBoxIndex.from_records(r for r in records if r.get("eq_uid") not in touched)
+        valid = []
+        for i, o in enumerate(payload.ops):
+            error = None
+            if o.op == "upsert":
+                rec = o.record
+                if rec is None:
+                    error = "upsert needs a record"
+                elif rec.paper_id != paper_id:
+                    error = f"record belongs to paper '{rec.paper_id}'"
+                elif not rec.boxes:
+                    error = "At least one box is required"
+                elif DUPLICATE_BOX_IOU > 0 and any(
+                    index[b.page].overlaps(b.bbox_pdf, DUPLICATE_BOX_IOU, exclude_key=rec.eq_uid) for b in rec.boxes
+                ):
+                    error = "A saved equation already covers one of its boxes"
+                else:
+                    for b in rec.boxes:
+                        index[b.page].add(b.bbox_pdf, key=rec.eq_uid)
+                    valid.append((i, ("upsert", rec.eq_uid, rec.model_dump())))
+                results.append({"index": i, "op": "upsert", "eq_uid": rec.eq_uid if rec else None})
+            else:
+                if not o.eq_uid:
+                    error = "delete needs an eq_uid"
+                else:
+                    valid.append((i, ("delete", o.eq_uid, None)))
+                results.append({"index": i, "op": "delete", "eq_uid": o.eq_uid})
+            results[-1]["status"] = "error" if error else "pending"
+            if error:
+                results[-1]["error"] = error
+
+        failed = len(payload.ops) - len(valid)
+        if failed and payload.atomic:
+            for r in results:
+                if r["status"] == "pending":
+                    r["status"] = "skipped"
+            return JSONResponse(status_code=409, content={"ok": False, "applied": 0, "failed": failed, "results": results})
+
+        revision, revs = apply_equation_ops(PROFILES_ROOT, paper_id, [op for _, op in valid])
+    for (i, _), rev in zip(valid, revs):
+        results[i]["status"] = "ok" if rev is not None else "not_found"
+        results[i]["revision"] = rev
+    for i, (kind, eq_uid, _) in valid:
+        if kind == "upsert":
+            adjudications.submit(paper_id, eq_uid, payload.ops[i].record)
+        else:
+            adjudications.discard(paper_id, eq_uid)
+    return {"ok": failed == 0, "revision": revision, "applied": len(valid), "failed": failed, "results": results}
+
+@timed("adjudicate")
 def _adjudicate_record(paper_id: str, rec: EquationRecord):
     if not rec.boxes: return
-    pdf_path = pdf_path_for(paper_id)
-    doc = load_pdf(pdf_path)
     page_ix = rec.boxes[0].page
     bbox_pdf = rec.boxes[0].bbox_pdf
     
-    full_page_img = page_image(doc, page_ix, dpi=150)
-    pdf2px, _ = pdf_to_px_transform(doc, page_ix, dpi=150)
-    
-    x0, y0, x1, y1 = bbox_pdf
-    px0, py0 = pdf2px(x0, y0)
-    px1, py1 = pdf2px(x1, y1)
+    full_page_img = cached_page_image(paper_id, page_ix, dpi=AUTODETECT_DPI)
+    with open_ingest_pdf(paper_id) as doc:
+        pdf2px, _ = ingest().pdf_to_px_transform(doc, page_ix, dpi=AUTODETECT_DPI)
     
-    pad = 5
-    w, h = full_page_img.size
-    crop_box = (
-        max(0, min(px0, px1) - pad), 
-        max(0, min(py0, py1) - pad), 
-        min(w, max(px0, px1) + pad), 
-        min(h, max(py0, py1) + pad)
-    )
-    
-    crop_img = full_page_img.crop(crop_box)
+    crop_img = crop_region(full_page_img, pdf2px, bbox_pdf)
     
     adjudicator.save_correction(
         image=crop_img,
@@ -180,153 +590,355 @@ def _adjudicate_record(paper_id: str, rec: EquationRecord):
         bbox=bbox_pdf
     )
 
+# saves hand records to this queue; one worker crops and appends them
+adjudications = AdjudicationQueue(_adjudicate_record, max_pending=ADJUDICATION_QUEUE_SIZE)
+ADJUDICATION_DRAIN_SECONDS = float(os.getenv("ADJUDICATION_DRAIN_SECONDS", "30"))
+
+@app.get("/adjudication/status")
+def adjudication_status():
+    return adjudications.status()
+
+def _cache_lookups() -> Dict[tuple, float]:
+    r, d, rec, v = renders.stats(), documents.stats(), recognitions.stats(), validator.stats()
+    return {
+        ("render", "hit_memory"): r["hits_memory"], ("render", "hit_disk"): r["hits_disk"], ("render", "miss"): r["misses"],
+        ("pdf", "hit_memory"): d["hits"], ("pdf", "miss"): d["misses"],
+        ("recognition", "hit_memory"): rec["hits_memory"], ("recognition", "hit_disk"): rec["hits_disk"],
+        ("recognition", "miss"): rec["misses"],
+        ("validation", "hit_memory"): v["hits"], ("validation", "miss"): v["misses"],
+    }
+
+def _cache_hit_ratios() -> Dict[tuple, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), n in _cache_lookups().items():
+        t = totals.setdefault(cache, [0.0, 0.0])
+        t[0] += n if result != "miss" else 0
+        t[1] += n
+    return {(cache,): hits / n for cache, (hits, n) in totals.items() if n}
+
+def _queue_depths() -> Dict[tuple, float]:
+    return {
+        ("adjudication",): adjudications.status()["queue_depth"],
+        ("prefetch",): prefetcher.status()["queue_depth"],
+    }
+
+def _jobs_by_status() -> Dict[tuple, float]:
+    return {(status,): n for status, n in jobs.status()["jobs"].items()}
+
+metrics.callback("scribe_cache_lookups_total", "Cache lookups by cache and result.", _cache_lookups, ("cache", "result"), kind="counter")
+metrics.callback("scribe_cache_hit_ratio", "Share of cache lookups served from cache since start.", _cache_hit_ratios, ("cache",))
+metrics.callback("scribe_cache_bytes", "Render cache size by tier.", lambda: {
+    ("memory",): renders.stats()["memory_bytes"], ("disk",): renders.stats()["disk_bytes"],
+}, ("tier",))
+metrics.callback("scribe_open_documents", "PDF handles held open by the document cache.", lambda: documents.stats()["open"])
+metrics.callback("scribe_queue_depth", "Items waiting in background queues.", _queue_depths, ("queue",))
+metrics.callback("scribe_prefetch_active", "Prefetch renders currently running.", lambda: prefetcher.status()["active"])
+metrics.callback("scribe_adjudications_total", "Adjudication captures by outcome.", lambda: {
+    (k,): v for k, v in adjudications.status().items() if k in ("processed", "failed", "dropped", "coalesced", "discarded")
+}, ("outcome",), kind="counter")
+metrics.callback("scribe_jobs", "Autodetect jobs by status.", _jobs_by_status, ("status",))
+metrics.callback("scribe_validation_timeouts_total", "Validations abandoned at the timeout.", lambda: validator.stats()["timeouts"], kind="counter")
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of the counters, gauges and stage histograms."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- start-up, health and readiness ---
+
+def _warm_pdf() -> str:
+    import fitz
+    return fitz.VersionBind
+
+warmup.register("pdf", _warm_pdf)
+warmup.register("ingest", lambda: ingest().__name__)
+# forward passes start torch's thread pools, so PRELOAD only loads the weights
+warmup.register("detector", detector.warm, fork_safe=False, before_fork=detector.load)
+warmup.register("recognizer", recognition.warm, fork_safe=False, before_fork=recognition.load)
+warmup.register("validator", validator.warm, fork_safe=False)
+warmup.register("render_pool", warm_pool, fork_safe=False)
+# catches up profiles changed while no API process was running (CLI imports, crashes)
+warmup.register("search", lambda: len(reindex_profiles(PROFILES_ROOT)), fork_safe=False)
+
+# WARMUP: steps run in the background once the server starts ("all" or a
+#   comma-separated list); /readyz answers 503 until they finish.
+# PRELOAD: fork-safe steps run at import, so a preforking server
+#   (gunicorn --preload) loads the models once and its workers share them.
+WARMUP = os.getenv("WARMUP", "")
+PRELOAD = os.getenv("PRELOAD", "")
+
+if PRELOAD:
+    warmup.preload(warmup.resolve(PRELOAD))
+
+def start_warmup():
+    if WARMUP:
+        warmup.start(warmup.resolve(WARMUP))
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving requests. Touches no models, pools or disk."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: warm-up has finished and the data roots are writable; 503 otherwise."""
+    checks = {
+        "warmup": warmup.ready(),
+        "profiles_root": os.access(PROFILES_ROOT, os.W_OK),
+        "papers_root": os.access(PAPERS_ROOT, os.W_OK),
+    }
+    ready = all(checks.values())
+    body = {
+        "ready": ready,
+        "checks": checks,
+        "warmup": warmup.status()["steps"],
+        "loaded": {"detector": detector.loaded, "recognizer": recognition.loaded()},
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+def drain_background_work():
+    # finish queued captures and make them durable before the process exits
+    adjudications.close(timeout=ADJUDICATION_DRAIN_SECONDS)
+    adjudicator.sync()
+    flush_exports()
+    shutdown_pool()
+    validator.shutdown()
+
 @app.delete("/papers/{paper_id}/equations/{eq_uid}")
 def delete_equation_endpoint(paper_id: str, eq_uid: str):
-    ok = delete_equation(PROFILES_ROOT, paper_id, eq_uid)
-    if not ok:
+    revision = delete_equation(PROFILES_ROOT, paper_id, eq_uid)
+    if revision is None:
         raise HTTPException(404, "Equation not found")
-    return {"ok": True}
+    adjudications.discard(paper_id, eq_uid)
+    return {"ok": True, "revision": revision}
 
 @app.post("/papers/{paper_id}/rescan_box")
 def rescan_box(paper_id: str, payload: RescanRequest):
-    try:
-        pdf_path = pdf_path_for(paper_id)
-    except NameError:
-        pdf_path = PAPERS_ROOT / f"{paper_id}.pdf"
-
-    doc = load_pdf(pdf_path)
-    full_page_img = page_image(doc, payload.page_index, dpi=150)
-    pdf2px, _ = pdf_to_px_transform(doc, payload.page_index, dpi=150)
-
-    x0, y0, x1, y1 = payload.bbox
-    px0, py0 = pdf2px(x0, y0)
-    px1, py1 = pdf2px(x1, y1)
-
-    pad = 5
-    w, h = full_page_img.size
-    crop_box = (
-        max(0, min(px0, px1) - pad), 
-        max(0, min(py0, py1) - pad), 
-        min(w, max(px0, px1) + pad), 
-        min(h, max(py0, py1) + pad)
-    )
-    crop_img = full_page_img.crop(crop_box)
-    latex_result = image_to_latex(crop_img)
+    full_page_img = cached_page_image(paper_id, payload.page_index, dpi=AUTODETECT_DPI)
+    with open_ingest_pdf(paper_id) as doc:
+        pdf2px, _ = ingest().pdf_to_px_transform(doc, payload.page_index, dpi=AUTODETECT_DPI)
+
+    crop_img = crop_region(full_page_img, pdf2px, payload.bbox)
+    latex_result = recognize_batch([crop_img])[0]
     return {"latex": latex_result}
 
-@app.post("/papers/{paper_id}/autodetect_all")
-def autodetect_all(paper_id: str):
+@app.post("/papers/{paper_id}/rescan_boxes")
+def rescan_boxes(paper_id: str, payload: RescanBoxesRequest):
+    """Recognize many boxes in one call; each page is rendered once and all crops share a batch."""
+    by_page: Dict[int, List[int]] = {}
+    for i, item in enumerate(payload.items):
+        by_page.setdefault(item.page_index, []).append(i)
+    with open_ingest_pdf(paper_id) as doc:
+        transforms = {p: ingest().pdf_to_px_transform(doc, p, dpi=AUTODETECT_DPI)[0] for p in by_page}
+
+    crops = [None] * len(payload.items)
+    for page_ix, idxs in by_page.items():
+        full_page_img = cached_page_image(paper_id, page_ix, dpi=AUTODETECT_DPI)
+        for i in idxs:
+            crops[i] = crop_region(full_page_img, transforms[page_ix], payload.items[i].bbox)
+
+    return {"items": [{"latex": latex} for latex in recognize_batch(crops)]}
+
+@app.get("/recognition/cache")
+def recognition_cache_stats():
+    return recognitions.stats()
+
+@app.delete("/recognition/cache")
+def clear_recognition_cache():
+    recognitions.clear()
+    return {"ok": True}
+
+def autodetect_inputs(pdf_path: Path) -> List[Dict[str, Any]]:
+    """What each page's autodetect result depends on; recorded in the processing manifest."""
+    shared = {
+        "detector": detector.version,
+        "recognizer": recognition.model_version(),
+        "dpi": AUTODETECT_DPI,
+        "conf_thresh": detector.conf_thresh,
+        "dedup_iou": DEDUP_IOU,
+    }
+    return [{"page_hash": h, **shared} for h in page_hashes(pdf_path)]
+
+def autodetect_page_range(options: AutodetectOptions, num_pages: int) -> Tuple[int, int]:
+    """(first, last) page of an autodetect run; 400 unless 0 <= start_page <= end_page < num_pages."""
+    first = 0 if options.start_page is None else options.start_page
+    last = num_pages - 1 if options.end_page is None else options.end_page
+    if not 0 <= first <= last < num_pages:
+        raise HTTPException(400, f"Page range {first}..{last} is not within the paper's pages 0..{num_pages - 1}")
+    return first, last
+
+def run_autodetect(paper_id: str, job: Optional[Job] = None, options: Optional[AutodetectOptions] = None) -> Dict[str, Any]:
     """
-    Run detection on ALL pages.
+    Run detection on ALL pages (or options.start_page..end_page).
     Includes DEDUPLICATION to prevent overlapping boxes on the same equation.
+    Pages are rendered on a process pool (AUTODETECT_WORKERS) and recognized
+    in batches (RECOGNITION_BATCH); see services/autodetect.py. When run as a
+    job, each finished page is emitted as a "page" event and cancellation is
+    honoured between pages.
+
+    Pages whose content, models and thresholds match the processing manifest
+    are skipped unless options.force is set.
     """
+    options = options or AutodetectOptions()
     pdf_path = pdf_path_for(paper_id)
-    doc = load_pdf(pdf_path)
+    with open_ingest_pdf(paper_id) as doc:
+        num_pages = doc.num_pages
     detected_count = 0
+    pages_done = 0
+
+    first, last = autodetect_page_range(options, num_pages)
+    manifest = ProcessingManifest.for_paper(PROFILES_ROOT, paper_id)
+    inputs = autodetect_inputs(pdf_path)
+    pdf_sha256 = content_hash(pdf_path)
+    pages = [
+        p for p in range(first, last + 1)
+        if options.force or not manifest.is_current(p, inputs[p])
+    ]
+    pages_skipped = (last - first + 1) - len(pages)
     
     # 1. Load EXISTING equations to check for duplicates
     existing_items = read_equations(PROFILES_ROOT, paper_id)
     
-    # Map: page_index -> list of [x0, y0, x1, y1]
-    existing_boxes = {}
-    total_equations_before = 0
-    
-    if existing_items:
-        total_equations_before = len(existing_items)
-        for eq in existing_items:
-            # FIX: Use dict access (.get) instead of attribute access
-            boxes = eq.get("boxes", [])
-            for b in boxes:
-                # FIX: 'b' is a dict
-                page = b.get("page")
-                bbox = b.get("bbox_pdf")
-                if page is not None and bbox:
-                    existing_boxes.setdefault(page, []).append(bbox)
-
-    for page_ix in range(doc.num_pages):
-        candidates = []
-        
-        # YOLO Detection
-        if YOLO_MODEL_PATH.exists():
-            img_path = PAPERS_ROOT / f"temp_{paper_id}_{page_ix}.png"
-            page_img = page_image(doc, page_ix, dpi=150) 
-            page_img.save(img_path)
-            
-            try:
-                yolo_boxes = detect_image(str(YOLO_MODEL_PATH), str(img_path), conf_thresh=0.25)
-                pdf2px, px2pdf = pdf_to_px_transform(doc, page_ix, dpi=150)
-                
-                for box in yolo_boxes:
-                    px_coords = box['xyxy']
-                    x0, y0 = px2pdf(px_coords[0], px_coords[1])
-                    x1, y1 = px2pdf(px_coords[2], px_coords[3])
-                    candidates.append({
-                        "bbox_pdf": (min(x0,x1), min(y0,y1), max(x0,x1), max(y0,y1)),
-                        "score": box['conf']
-                    })
-            finally:
-                if img_path.exists(): img_path.unlink()
-
-        # Heuristic Fallback
-        if not candidates:
-             from equation_scribe.detect import find_equation_candidates
-             spans = page_layout(doc, page_ix)
-             width, _ = page_size_points(doc, page_ix)
-             candidates = find_equation_candidates(spans, width)
-
-        # Recognition & Save with DEDUPLICATION
-        if candidates:
-            full_page_img = page_image(doc, page_ix, dpi=150)
-            pdf2px, _ = pdf_to_px_transform(doc, page_ix, dpi=150)
-            
-            page_existing = existing_boxes.get(page_ix, [])
-
-            for cand in candidates:
-                cand_box = cand["bbox_pdf"]
-                
-                # --- CHECK FOR DUPLICATES ---
-                is_duplicate = False
-                for ex_box in page_existing:
-                    if calculate_iou(cand_box, ex_box) > 0.5: # 50% overlap threshold
-                        is_duplicate = True
-                        break
-                
-                if is_duplicate:
-                    continue
-                # -----------------------------
-
-                x0, y0, x1, y1 = cand_box
-                px0, py0 = pdf2px(x0, y0)
-                px1, py1 = pdf2px(x1, y1)
-                
-                pad = 5
-                w, h = full_page_img.size
-                crop_box = (
-                    max(0, min(px0, px1) - pad), 
-                    max(0, min(py0, py1) - pad), 
-                    min(w, max(px0, px1) + pad), 
-                    min(h, max(py0, py1) + pad)
-                )
-                
-                crop_img = full_page_img.crop(crop_box)
-                latex = image_to_latex(crop_img)
-                
-                rec = EquationRecord(
+    # page_index -> BoxIndex of [x0, y0, x1, y1]
+    existing_boxes = PageBoxIndex.from_records(existing_items)
+    total_equations_before = len(existing_items)
+
+    if job:
+        job.update(pages_total=len(pages), pages_done=0, pages_skipped=pages_skipped, equations_found=0)
+
+    # 2. Detect -> dedupe -> recognize, page by page in order
+    results = iter_autodetect(
+        pdf_path,
+        pages,
+        existing_boxes,
+        detect=detector.detect if detector.available else None,
+        recognize=recognize_batch,
+    )
+    with closing(results):
+        for page_result in results:
+            recs = [
+                EquationRecord(
                     eq_uid=str(uuid.uuid4())[:16],
                     paper_id=paper_id,
-                    latex=latex,
-                    notes=f"Auto (YOLO {cand['score']:.2f})",
-                    boxes=[{"page": page_ix, "bbox_pdf": cand_box}]
+                    latex=det["latex"],
+                    notes=f"Auto (YOLO {det['score']:.2f})",
+                    boxes=[{"page": page_result["page"], "bbox_pdf": det["bbox_pdf"]}]
                 )
-                append_equation(PROFILES_ROOT, rec)
-                
-                # Add to local exclusion list so we don't add overlapping boxes within the same run
-                page_existing.append(cand_box)
-                detected_count += 1
+                for det in page_result["detections"]
+            ]
+            # one transaction per page rather than per equation
+            append_equations(PROFILES_ROOT, paper_id, recs)
+            page_records = [rec.model_dump() for rec in recs]
+            detected_count += len(recs)
+            pages_done += 1
+            manifest.mark_done(page_result["page"], inputs[page_result["page"]], len(page_records), pdf_sha256)
+
+            if job:
+                job.update(pages_done=pages_done, equations_found=detected_count)
+                job.emit("page", {
+                    "page": page_result["page"],
+                    "pages_done": pages_done,
+                    "pages_total": len(pages),
+                    "equations_found": detected_count,
+                    "equations": page_records,
+                })
+                if job.cancelled:
+                    break
 
     total_after = total_equations_before + detected_count
+    message = f"Scanned {pages_done} of {len(pages)} pages" if pages_done < len(pages) else f"Scanned {pages_done} pages"
+    if pages_skipped:
+        message += f" ({pages_skipped} unchanged pages skipped)"
     return {
-        "message": f"Scanned {doc.num_pages} pages", 
+        "message": message,
+        "pages_scanned": pages_done,
+        "pages_skipped": pages_skipped,
         "equations_found": detected_count,
         "total_equations": total_after
-    }
\ No newline at end of file
+    }
+
+def submit_autodetect(paper_id: str, options: Optional[AutodetectOptions] = None) -> Job:
+    # 404 / 400 before queueing
+    autodetect_page_range(options or AutodetectOptions(), page_count(pdf_path_for(paper_id)))
+    try:
+        return jobs.submit(paper_id, "autodetect", lambda job: run_autodetect(paper_id, job, options))
+    except JobConflict as e:
+        raise HTTPException(409, {"message": str(e), "job_id": e.job.id})
+
+def job_or_404(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job '{job_id}' not found")
+    return job
+
+@app.post("/papers/{paper_id}/autodetect_all")
+async def autodetect_all(paper_id: str, options: AutodetectOptions = Body(default_factory=AutodetectOptions)):
+    """
+    Synchronous autodetect; runs as a job so the same concurrency limits
+    apply. The request waits on the event loop, not on a threadpool worker.
+    """
+    job = await run_in_threadpool(submit_autodetect, paper_id, options)
+    while not job.finished_streaming:
+        await asyncio.sleep(SSE_POLL_SECONDS)
+    if job.status == "failed":
+        raise HTTPException(500, job.error)
+    if job.status == "cancelled":
+        # cancelled through /jobs/{job_id}/cancel; result holds the pages done so far, if any
+        raise HTTPException(409, {"message": f"Job {job.id} was cancelled", "job_id": job.id, "result": job.result})
+    return job.result
+
+@app.post("/papers/{paper_id}/autodetect_jobs")
+def start_autodetect_job(paper_id: str, options: AutodetectOptions = Body(default_factory=AutodetectOptions)):
+    return submit_autodetect(paper_id, options).to_dict()
+
+@app.get("/papers/{paper_id}/autodetect_manifest")
+def autodetect_manifest_endpoint(paper_id: str):
+    return ProcessingManifest.for_paper(PROFILES_ROOT, pdf_path_for(paper_id).stem).to_dict()
+
+@app.get("/jobs")
+def list_jobs_endpoint(paper_id: Optional[str] = None):
+    return {"items": [j.to_dict() for j in jobs.list(paper_id)], **jobs.status()}
+
+@app.get("/jobs/{job_id}")
+def job_status_endpoint(job_id: str):
+    return job_or_404(job_id).to_dict()
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job_endpoint(job_id: str):
+    job = job_or_404(job_id)
+    job.cancel()
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """Server-sent events for a job: "page" per processed page, then "done", "cancelled" or "error"."""
+    job = job_or_404(job_id)
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    async def stream():
+        nonlocal after
+        idle = 0.0
+        while True:
+            # read before fetching: the final event is emitted just before the
+            # status turns terminal, so an empty fetch made after seeing it
+            # means nothing else can follow
+            finished = job.finished_streaming
+            events = job.events_since(after)
+            for ev in events:
+                after = ev["id"]
+                yield f"id: {ev['id']}\nevent: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
+            if not events and finished:
+                return
+            if events:
+                idle = 0.0
+            elif idle >= 15.0:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(SSE_POLL_SECONDS)
+            idle += SSE_POLL_SECONDS
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,125 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("adjudication")
+
+Key = Tuple[str, Hashable]
+
+
+class AdjudicationQueue:
+    """
+    Bounded, coalescing queue drained by one background worker, so saves do
+    not wait for the crop/PNG/dataset append of adjudication capture.
+
+    Items are keyed by (paper_id, eq_uid): re-submitting a key that is still
+    queued replaces its payload in place (only the latest version is
+    captured). When max_pending keys are queued the oldest is dropped. A
+    single worker keeps dataset appends in submission order.
+    """
+    def __init__(self, handler: Callable[[str, Any], None], max_pending: int = 1000):
+        self.handler = handler
+        self.max_pending = max(1, max_pending)
+        self._cv = threading.Condition()
+        self._pending: "OrderedDict[Key, Any]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._busy = False
+        self._closed = False
+        self._processed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._discarded = 0
+
+    def submit(self, paper_id: str, key: Hashable, payload: Any) -> bool:
+        """Queue payload for capture; False if the queue is closed."""
+        k = (paper_id, key)
+        with self._cv:
+            if self._closed:
+                return False
+            if k in self._pending:
+                self._pending[k] = payload
+                self._coalesced += 1
+                return True
+            if len(self._pending) >= self.max_pending:
+                (old_paper, old_key), _ = self._pending.popitem(last=False)
+                self._dropped += 1
+                logger.warning(f"Adjudication queue full; dropped {old_paper}/{old_key}")
+            self._pending[k] = payload
+            self._ensure_started()
+            self._cv.notify()
+            return True
+
+    def discard(self, paper_id: str, key: Hashable) -> bool:
+        """Forget a queued item (e.g. the equation was deleted before capture)."""
+        with self._cv:
+            if self._pending.pop((paper_id, key), None) is None:
+                return False
+            self._discarded += 1
+            return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is processed; False on timeout."""
+        with self._cv:
+            return self._cv.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def close(self, timeout: Optional[float] = 30.0) -> int:
+        """Stop accepting items and drain the queue; returns how many were left unprocessed."""
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        self.flush(timeout)
+        with self._cv:
+            left = len(self._pending)
+        if left:
+            logger.warning(f"Adjudication queue closed with {left} items unprocessed")
+        return left
+
+    def status(self) -> Dict[str, Any]:
+        with self._cv:
+            return {
+                "queue_depth": len(self._pending),
+                "max_pending": self.max_pending,
+                "busy": self._busy,
+                "closed": self._closed,
+                "processed": self._processed,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "coalesced": self._coalesced,
+                "discarded": self._discarded,
+            }
+
+    def _ensure_started(self) -> None:
+        # caller holds self._cv
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="adjudication", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while not self._pending:
+                    self._busy = False
+                    self._cv.notify_all()
+                    self._cv.wait()
+                (paper_id, key), payload = self._pending.popitem(last=False)
+                self._busy = True
+            t0 = time.perf_counter()
+            try:
+                self.handler(paper_id, payload)
+                ok = True
+            except Exception as e:
+                ok = False
+                logger.warning(f"Adjudication of {paper_id}/{key} failed: {e}")
+            with self._cv:
+                if ok:
+                    self._processed += 1
+                else:
+                    self._failed += 1
+            logger.debug(f"Adjudicated {paper_id}/{key} in {time.perf_counter() - t0:.3f}s")
+
+
+ADJUDICATION_QUEUE_SIZE = int(os.getenv("ADJUDICATION_QUEUE_SIZE", "1000"))
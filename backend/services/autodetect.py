@@ -0,0 +1,292 @@
+"""
+Staged autodetect pipeline.
+
+  1. rasterize + heuristic layout   -> process pool, bounded look-ahead
+  2. detection + deduplication      -> producer thread, pages batched in order
+  3. recognition                    -> caller's thread, crops batched across pages
+
+Stages overlap: while page N is being recognized, page N+1 is detected and
+pages N+2.. are rendered. Results are always yielded in page order.
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+from itertools import islice
+from concurrent.futures import Executor, ProcessPoolExecutor
+import multiprocessing
+import os
+import queue
+import threading
+
+from PIL import Image
+
+from .pdf import documents
+from .render_cache import renders, render_key, encode_image, decode_image
+from .boxindex import PageBoxIndex, nms
+from .metrics import collect, record, timed
+
+AUTODETECT_DPI = 150
+CROP_PAD = 5
+DEDUP_IOU = 0.5
+
+AUTODETECT_WORKERS = int(os.getenv("AUTODETECT_WORKERS", str(min(4, os.cpu_count() or 1))))
+RECOGNITION_BATCH = int(os.getenv("RECOGNITION_BATCH", "16"))
+DETECT_BATCH = int(os.getenv("DETECT_BATCH", "4"))
+
+Affine = Tuple[float, float, float, float, float, float]
+Detect = Callable[[List[Image.Image]], List[List[Dict[str, Any]]]]
+Recognize = Callable[[List[Image.Image]], List[str]]
+
+
+def ingest():
+    """equation_scribe.pdf_ingest, imported on first use rather than with the app."""
+    from equation_scribe import pdf_ingest
+    return pdf_ingest
+
+def load_ingest_pdf(path: Path):
+    """DocumentCache loader for equation_scribe document handles."""
+    return ingest().load_pdf(path)
+
+
+# --- geometry helpers ---
+
+def crop_region(img: Image.Image, pdf2px: Callable, bbox_pdf, pad: int = CROP_PAD) -> Image.Image:
+    """Crop bbox_pdf (PDF points) out of a page raster, padded by pad pixels."""
+    x0, y0, x1, y1 = bbox_pdf
+    px0, py0 = pdf2px(x0, y0)
+    px1, py1 = pdf2px(x1, y1)
+    w, h = img.size
+    crop_box = (
+        max(0, min(px0, px1) - pad),
+        max(0, min(py0, py1) - pad),
+        min(w, max(px0, px1) + pad),
+        min(h, max(py0, py1) + pad)
+    )
+    return img.crop(crop_box)
+
+def _affine(fn: Callable) -> Affine:
+    # PDF <-> pixel transforms are affine; sample them so they can cross a process boundary.
+    ox, oy = fn(0.0, 0.0)
+    ax, ay = fn(1.0, 0.0)
+    bx, by = fn(0.0, 1.0)
+    return (ax - ox, bx - ox, ox, ay - oy, by - oy, oy)
+
+def _transform(m: Affine) -> Callable:
+    return lambda x, y: (m[0] * x + m[1] * y + m[2], m[3] * x + m[4] * y + m[5])
+
+def boxes_to_pdf(boxes_px: List[Dict[str, Any]], px2pdf: Callable) -> List[Dict[str, Any]]:
+    """Detector output (page pixels) -> candidates in PDF points."""
+    candidates = []
+    for box in boxes_px:
+        px_coords = box['xyxy']
+        x0, y0 = px2pdf(px_coords[0], px_coords[1])
+        x1, y1 = px2pdf(px_coords[2], px_coords[3])
+        candidates.append({
+            "bbox_pdf": (min(x0,x1), min(y0,y1), max(x0,x1), max(y0,y1)),
+            "score": box['conf']
+        })
+    return candidates
+
+
+# --- stage 1: rasterize + layout (runs in worker processes) ---
+
+def render_page_job(pdf_path: str, page_ix: int, dpi: int = AUTODETECT_DPI, with_raster: bool = True) -> Dict[str, Any]:
+    # "timings" carries the stage times back across the process boundary
+    from equation_scribe.detect import find_equation_candidates
+    pdf_ingest = ingest()
+    out: Dict[str, Any] = {"page": page_ix}
+    with collect() as timings:
+        with documents.open(Path(pdf_path), loader=load_ingest_pdf, kind="ingest") as doc:
+            if with_raster:
+                with timed("rasterize", items=1):
+                    out["raster"] = encode_image(pdf_ingest.page_image(doc, page_ix, dpi=dpi))
+            pdf2px, px2pdf = pdf_ingest.pdf_to_px_transform(doc, page_ix, dpi=dpi)
+            out["pdf2px"] = _affine(pdf2px)
+            out["px2pdf"] = _affine(px2pdf)
+            with timed("layout", items=1):
+                spans = pdf_ingest.page_layout(doc, page_ix)
+                width, _ = pdf_ingest.page_size_points(doc, page_ix)
+                out["heuristic"] = list(find_equation_candidates(spans, width) or [])
+    out["timings"] = timings
+    return out
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _render_pool() -> Optional[Executor]:
+    global _pool
+    if AUTODETECT_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API process runs threads (prefetch, threadpool) that fork would copy mid-flight
+            _pool = ProcessPoolExecutor(
+                max_workers=AUTODETECT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def _warm_worker(_: int = 0) -> int:
+    ingest()
+    import equation_scribe.detect  # noqa: F401
+    return os.getpid()
+
+def warm_pool() -> int:
+    """Start the render workers and import the ingest stack in each; returns how many answered."""
+    pool = _render_pool()
+    if pool is None:
+        _warm_worker()
+        return 0
+    return len(set(pool.map(_warm_worker, range(AUTODETECT_WORKERS))))
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def iter_page_rasters(pdf_path: Path, pages: Iterable[int], stop: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+    """Stage 1 results in page order, with at most 2x workers pages in flight."""
+    pool = _render_pool()
+    pending: deque = deque()
+    window = max(1, 2 * AUTODETECT_WORKERS)
+    pages = iter(pages)
+
+    def submit(page_ix: int):
+        key = render_key(pdf_path, page_ix, "raster", AUTODETECT_DPI)
+        cached = renders.get(key)
+        args = (str(pdf_path), page_ix, AUTODETECT_DPI, cached is None)
+        fut = pool.submit(render_page_job, *args) if pool else None
+        pending.append((key, cached, fut, args))
+
+    try:
+        for page_ix in pages:
+            submit(page_ix)
+            if len(pending) >= window:
+                break
+        while pending:
+            if stop is not None and stop.is_set():
+                return
+            key, cached, fut, args = pending.popleft()
+            out = fut.result() if fut is not None else render_page_job(*args)
+            timings = out.pop("timings", {})
+            if fut is not None:
+                # observed in the worker process; in-process runs were already
+                record(timings)
+            if cached is None:
+                renders.put(key, out["raster"])
+            else:
+                out["raster"] = cached
+            yield out
+            for page_ix in pages:
+                submit(page_ix)
+                break
+    finally:
+        for _, _, fut, _ in pending:
+            if fut is not None:
+                fut.cancel()
+
+
+# --- stages 2 + 3 ---
+
+_DONE = object()
+
+def iter_autodetect(
+    pdf_path: Path,
+    pages: Iterable[int],
+    existing_boxes: PageBoxIndex,
+    detect: Optional[Detect],
+    recognize: Recognize,
+    batch_size: int = RECOGNITION_BATCH,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield {"page", "candidates", "detections"} per page, in page order.
+    Each detection is {"bbox_pdf", "score", "latex"}. Candidates are reduced
+    by NMS, then those overlapping existing_boxes (or an earlier detection) by
+    more than DEDUP_IOU are dropped before recognition; existing_boxes is
+    updated in place.
+
+    detect(images) returns pixel boxes per image and is fed up to
+    DETECT_BATCH pages at a time; pages where it finds nothing (or every page,
+    when detect is None) fall back to the layout heuristic.
+    """
+    stop = threading.Event()
+    handoff: "queue.Queue" = queue.Queue(maxsize=max(2, AUTODETECT_WORKERS))
+    errors: List[BaseException] = []
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def emit(out, img, boxes_px) -> bool:
+        page_ix = out["page"]
+        candidates = boxes_to_pdf(boxes_px, _transform(out["px2pdf"])) or out["heuristic"]
+
+        pdf2px = _transform(out["pdf2px"])
+        keep = nms([c["bbox_pdf"] for c in candidates], [c.get("score", 0.0) for c in candidates], DEDUP_IOU)
+        candidates_nms = [candidates[i] for i in keep]
+        # also excludes overlapping boxes within the same run
+        added = existing_boxes[page_ix].add_new([c["bbox_pdf"] for c in candidates_nms], DEDUP_IOU)
+        kept = [candidates_nms[i] for i in added]
+        crops = [crop_region(img, pdf2px, c["bbox_pdf"]) for c in kept]
+        return put((page_ix, len(candidates), kept, crops))
+
+    def produce():
+        try:
+            rasters = iter_page_rasters(pdf_path, pages, stop)
+            while True:
+                chunk = list(islice(rasters, DETECT_BATCH if detect else 1))
+                if not chunk:
+                    break
+                imgs = [decode_image(out["raster"]) for out in chunk]
+                detected = detect(imgs) if detect else [[] for _ in chunk]
+                for out, img, boxes_px in zip(chunk, imgs, detected):
+                    if not emit(out, img, boxes_px):
+                        return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="autodetect-detect", daemon=True)
+    producer.start()
+    try:
+        done = False
+        while not done:
+            item = handoff.get()
+            if item is _DONE:
+                break
+            batch = [item]
+            n_crops = len(item[3])
+            # batch crops across whichever later pages are already detected
+            while n_crops < batch_size:
+                try:
+                    nxt = handoff.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _DONE:
+                    done = True
+                    break
+                batch.append(nxt)
+                n_crops += len(nxt[3])
+
+            all_crops = [c for _, _, _, crops in batch for c in crops]
+            latex = recognize(all_crops) if all_crops else []
+            i = 0
+            for page_ix, n_candidates, kept, crops in batch:
+                detections = []
+                for cand in kept:
+                    detections.append({"bbox_pdf": cand["bbox_pdf"], "score": cand["score"], "latex": latex[i]})
+                    i += 1
+                yield {"page": page_ix, "candidates": n_candidates, "detections": detections}
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        producer.join(timeout=5)
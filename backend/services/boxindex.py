@@ -0,0 +1,126 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+BoxLike = Sequence[float]
+
+
+def as_boxes(boxes: Iterable[BoxLike]) -> np.ndarray:
+    arr = np.asarray(list(boxes), dtype=np.float64)
+    return arr.reshape(-1, 4)
+
+
+def pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU matrix (len(a), len(b)) for [x0, y0, x1, y1] boxes; 0 where the union is empty."""
+    a = as_boxes(a) if not isinstance(a, np.ndarray) else a.reshape(-1, 4)
+    b = as_boxes(b) if not isinstance(b, np.ndarray) else b.reshape(-1, 4)
+    ix0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix1 - ix0, 0, None) * np.clip(iy1 - iy0, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = np.where(union != 0, inter / union, 0.0)
+    return iou
+
+
+def nms(boxes: Iterable[BoxLike], scores: Iterable[float], iou_thresh: float) -> List[int]:
+    """Greedy non-maximum suppression; returns kept indices in input order."""
+    arr = as_boxes(boxes)
+    if len(arr) == 0:
+        return []
+    order = np.argsort(-np.asarray(list(scores), dtype=np.float64), kind="stable")
+    suppressed = np.zeros(len(arr), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(int(i))
+        # one vectorized row per kept box: O(kept * N), not an N x N matrix
+        suppressed |= pairwise_iou(arr[i:i + 1], arr)[0] > iou_thresh
+    return sorted(keep)
+
+
+class BoxIndex:
+    """
+    Growable array of one page's boxes with vectorized overlap queries.
+    Each query is one NumPy pass over the page instead of a Python loop per
+    pair.
+    """
+    def __init__(self, boxes: Iterable[BoxLike] = (), keys: Optional[Iterable[Any]] = None):
+        arr = as_boxes(boxes)
+        self._boxes = np.empty((max(16, len(arr)), 4), dtype=np.float64)
+        self._boxes[:len(arr)] = arr
+        self._n = len(arr)
+        self.keys: List[Any] = list(keys) if keys is not None else [None] * self._n
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def boxes(self) -> np.ndarray:
+        return self._boxes[:self._n]
+
+    def add(self, box: BoxLike, key: Any = None) -> None:
+        if self._n == len(self._boxes):
+            grown = np.empty((2 * len(self._boxes), 4), dtype=np.float64)
+            grown[:self._n] = self._boxes[:self._n]
+            self._boxes = grown
+        self._boxes[self._n] = box
+        self._n += 1
+        self.keys.append(key)
+
+    def ious(self, box: BoxLike) -> np.ndarray:
+        return pairwise_iou(as_boxes([box]), self.boxes)[0]
+
+    def max_iou(self, box: BoxLike, exclude_key: Any = None) -> float:
+        if self._n == 0:
+            return 0.0
+        iou = self.ious(box)
+        if exclude_key is not None:
+            iou = np.where(np.asarray([k == exclude_key for k in self.keys]), 0.0, iou)
+        return float(iou.max()) if len(iou) else 0.0
+
+    def overlaps(self, box: BoxLike, iou_thresh: float, exclude_key: Any = None) -> bool:
+        return self.max_iou(box, exclude_key) > iou_thresh
+
+    def add_new(self, boxes: Iterable[BoxLike], iou_thresh: float) -> List[int]:
+        """
+        Add each box that does not overlap the index (or an earlier box of
+        this call) by more than iou_thresh; returns the indices added.
+        """
+        arr = as_boxes(boxes)
+        if len(arr) == 0:
+            return []
+        against_existing = pairwise_iou(arr, self.boxes).max(axis=1) if self._n else np.zeros(len(arr))
+        candidate = against_existing <= iou_thresh
+        within = pairwise_iou(arr, arr)
+        kept: List[int] = []
+        for i in np.flatnonzero(candidate):
+            if kept and (within[i, kept] > iou_thresh).any():
+                continue
+            kept.append(int(i))
+        for i in kept:
+            self.add(arr[i])
+        return kept
+
+
+class PageBoxIndex(dict):
+    """page index -> BoxIndex, built from stored equation records."""
+    def __missing__(self, page: int) -> BoxIndex:
+        index = self[page] = BoxIndex()
+        return index
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "PageBoxIndex":
+        out = cls()
+        for eq in records:
+            for b in eq.get("boxes", []):
+                page = b.get("page")
+                bbox = b.get("bbox_pdf")
+                if page is not None and bbox:
+                    out[page].add(bbox, key=eq.get("eq_uid"))
+        return out
@@ -0,0 +1,120 @@
+from pathlib import Path
+from typing import Any, Dict, List, Union
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+from PIL import Image
+
+from .metrics import timed
+
+PageArray = Union[Image.Image, np.ndarray]
+
+
+class Detector:
+    """
+    Resident YOLO equation detector.
+
+    best.pt is loaded once, on first use, and kept in memory; pages are passed
+    as PIL images or HxWx3 uint8 arrays and inferred in batches. Boxes are
+    returned in page-pixel coordinates as {"xyxy": [x0, y0, x1, y1], "conf"}.
+    """
+    def __init__(self, model_path: Path, conf_thresh: float = 0.25, batch_size: int = 4):
+        self.model_path = Path(model_path)
+        self.conf_thresh = conf_thresh
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._model = None
+        self._version = None
+
+    @property
+    def available(self) -> bool:
+        return self.model_path.exists()
+
+    @property
+    def version(self) -> str:
+        """Digest of the weights file ("heuristic" when there is none); memoized per mtime/size."""
+        if not self.available:
+            return "heuristic"
+        st = self.model_path.stat()
+        signature = (st.st_mtime_ns, st.st_size)
+        if self._version is None or self._version[0] != signature:
+            h = hashlib.sha256()
+            with self.model_path.open("rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            self._version = (signature, h.hexdigest()[:16])
+        return self._version[1]
+
+    def _load(self):
+        # caller holds self._lock
+        if self._model is None:
+            try:
+                from ultralytics import YOLO
+            except ImportError:
+                self._model = False
+            else:
+                self._model = YOLO(str(self.model_path))
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self) -> bool:
+        """Load the weights without running them (fork-safe); False without weights."""
+        if not self.available:
+            return False
+        with self._lock:
+            self._load()
+        return True
+
+    def warm(self) -> bool:
+        """Load the weights and run one tiny inference now instead of on the first scan; False without weights."""
+        if not self.load():
+            return False
+        if self._model is False:
+            from equation_scribe.detector.inference import detect_image  # noqa: F401
+        else:
+            self._detect_batch([np.zeros((64, 64, 3), dtype=np.uint8)])
+        return True
+
+    def detect(self, pages: List[PageArray]) -> List[List[Dict[str, Any]]]:
+        out: List[List[Dict[str, Any]]] = []
+        for start in range(0, len(pages), self.batch_size):
+            out.extend(self._detect_batch(pages[start:start + self.batch_size]))
+        return out
+
+    def detect_one(self, page: PageArray) -> List[Dict[str, Any]]:
+        return self.detect([page])[0]
+
+    def _detect_batch(self, pages: List[PageArray]) -> List[List[Dict[str, Any]]]:
+        # ultralytics models are not safe to call from several threads at once
+        with self._lock:
+            model = self._load()
+            with timed("detect", items=len(pages)):
+                if model is False:
+                    return [self._detect_via_file(p) for p in pages]
+                results = model.predict(source=list(pages), conf=self.conf_thresh, verbose=False)
+        out = []
+        for r in results:
+            xyxy = r.boxes.xyxy.cpu().numpy().tolist()
+            conf = r.boxes.conf.cpu().numpy().tolist()
+            out.append([{"xyxy": b, "conf": float(c)} for b, c in zip(xyxy, conf)])
+        return out
+
+    def _detect_via_file(self, page: PageArray) -> List[Dict[str, Any]]:
+        # Without ultralytics in this process, fall back to equation_scribe's
+        # path-based entry point through a private temp file.
+        from equation_scribe.detector.inference import detect_image
+
+        img = Image.fromarray(page) if isinstance(page, np.ndarray) else page
+        fd, tmp = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        try:
+            img.save(tmp)
+            return detect_image(str(self.model_path), tmp, conf_thresh=self.conf_thresh)
+        finally:
+            os.unlink(tmp)
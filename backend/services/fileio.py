@@ -0,0 +1,122 @@
+from pathlib import Path
+from typing import Dict, Tuple, Union
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+
+def atomic_write(path: Union[str, Path], data: Union[bytes, str], fsync: bool = False) -> None:
+    """
+    Write data to path via a unique temp file in the same directory and
+    os.replace, so readers (and other workers) see the old or the new file,
+    never a torn one.
+    """
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class FileLock:
+    """
+    Re-entrant lock held both in-process (RLock) and across processes via an
+    advisory lock on a file: fcntl.flock on POSIX, msvcrt.locking on Windows,
+    in-process only elsewhere. Lets several uvicorn workers share a profile.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self) -> None:
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._lock_file()
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+        self._lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    def _lock_file(self) -> None:
+        if fcntl is None and msvcrt is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                # blocks (retrying every second) until the first byte is free
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def _unlock_file(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+
+_locks_guard = threading.Lock()
+_locks: Dict[Tuple[str, str], FileLock] = {}
+
+def paper_lock(root: Path, paper_id: str) -> FileLock:
+    """The per-paper write lock (PROFILES_ROOT/<paper_id>/.lock); one instance per paper per process."""
+    key = (str(Path(root).resolve()), paper_id)
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = FileLock(Path(root) / paper_id / ".lock")
+        return lock
@@ -0,0 +1,171 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import OrderedDict
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("jobs")
+
+TERMINAL = ("done", "failed", "cancelled")
+
+
+class JobConflict(Exception):
+    """Raised when a paper already has an active job."""
+    def __init__(self, job: "Job"):
+        super().__init__(f"Paper '{job.paper_id}' already has active job {job.id}")
+        self.job = job
+
+
+class Job:
+    """A background task with an append-only event log that clients can follow."""
+    def __init__(self, paper_id: str, kind: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.paper_id = paper_id
+        self.kind = kind
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._cancel = threading.Event()
+        self._cv = threading.Condition()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def emit(self, event: str, data: Dict[str, Any]) -> None:
+        with self._cv:
+            self.events.append({"id": len(self.events) + 1, "event": event, "data": data})
+            self._cv.notify_all()
+
+    def update(self, **progress) -> None:
+        with self._cv:
+            self.progress.update(progress)
+
+    def events_since(self, after: int) -> List[Dict[str, Any]]:
+        """Events with id > after (non-blocking, safe to poll from the event loop)."""
+        with self._cv:
+            return self.events[after:]
+
+    @property
+    def finished_streaming(self) -> bool:
+        return self.status in TERMINAL
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        with self._cv:
+            return self._cv.wait_for(lambda: self.status in TERMINAL, timeout)
+
+    def _set_status(self, status: str) -> None:
+        with self._cv:
+            self.status = status
+            now = time.time()
+            if status == "running":
+                self.started = now
+            elif status in TERMINAL:
+                self.finished = now
+            self._cv.notify_all()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._cv:
+            return {
+                "job_id": self.id,
+                "paper_id": self.paper_id,
+                "kind": self.kind,
+                "status": self.status,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "events": len(self.events),
+            }
+
+
+class JobManager:
+    """
+    Runs jobs on dedicated threads (never FastAPI's threadpool). At most
+    max_running jobs execute at once server-wide; the rest wait queued.
+    Each paper may have one queued-or-running job at a time.
+    """
+    def __init__(self, max_running: int = 2, keep_finished: int = 100):
+        self.max_running = max(1, max_running)
+        self.keep_finished = keep_finished
+        self._slots = threading.BoundedSemaphore(self.max_running)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._seq = itertools.count()
+
+    def submit(self, paper_id: str, kind: str, fn: Callable[[Job], Dict[str, Any]]) -> Job:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.paper_id == paper_id and job.status not in TERMINAL:
+                    raise JobConflict(job)
+            job = Job(paper_id, kind)
+            self._jobs[job.id] = job
+            self._prune()
+        t = threading.Thread(target=self._run, args=(job, fn), name=f"job-{kind}-{next(self._seq)}", daemon=True)
+        t.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, paper_id: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            return [j for j in self._jobs.values() if paper_id is None or j.paper_id == paper_id]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_running": self.max_running, "jobs": counts}
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]) -> None:
+        while not self._slots.acquire(timeout=0.5):
+            if job.cancelled:
+                job.emit("cancelled", {})
+                job._set_status("cancelled")
+                return
+        try:
+            self._execute(job, fn)
+        finally:
+            self._slots.release()
+
+    def _execute(self, job: Job, fn: Callable[[Job], Dict[str, Any]]) -> None:
+        if job.cancelled:
+            job.emit("cancelled", {})
+            job._set_status("cancelled")
+            return
+        job._set_status("running")
+        try:
+            job.result = fn(job)
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.kind}, {job.paper_id}) failed")
+            job.error = str(e)
+            job.emit("error", {"error": job.error})
+            job._set_status("failed")
+            return
+        if job.cancelled:
+            job.emit("cancelled", job.result or {})
+            job._set_status("cancelled")
+        else:
+            job.emit("done", job.result or {})
+            job._set_status("done")
+
+    def _prune(self) -> None:
+        # caller holds self._lock
+        finished = [j for j in self._jobs.values() if j.status in TERMINAL]
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
@@ -0,0 +1,68 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+from datetime import datetime
+import json
+import threading
+
+from .fileio import atomic_write
+
+
+class ProcessingManifest:
+    """
+    Per-paper record of the pages autodetect has finished, and the inputs they
+    were processed with (page content hash, detector/recognizer versions,
+    thresholds) plus the hash of the PDF they came from. A page whose recorded
+    inputs match the current ones is skipped on re-run; the page hash rather
+    than the PDF hash decides, so editing one page only re-runs that page.
+    Saved after every page, so a crashed or cancelled scan resumes where it
+    stopped.
+    """
+    FILENAME = "autodetect_manifest.json"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    self.pages = json.load(f).get("pages", {})
+            except Exception:
+                # unreadable manifest: behave as if nothing was processed
+                self.pages = {}
+
+    @classmethod
+    def for_paper(cls, root: Path, paper_id: str) -> "ProcessingManifest":
+        d = root / paper_id
+        d.mkdir(parents=True, exist_ok=True)
+        return cls(d / cls.FILENAME)
+
+    def is_current(self, page_ix: int, inputs: Dict[str, Any]) -> bool:
+        entry = self.pages.get(str(page_ix))
+        return entry is not None and entry.get("inputs") == inputs
+
+    def mark_done(self, page_ix: int, inputs: Dict[str, Any], equations_found: int, pdf_sha256: str = "") -> None:
+        with self._lock:
+            self.pages[str(page_ix)] = {
+                "inputs": inputs,
+                "pdf_sha256": pdf_sha256,
+                "equations_found": equations_found,
+                "completed": datetime.utcnow().isoformat() + "Z",
+            }
+            self._save()
+
+    def forget(self, page_ix: Optional[int] = None) -> None:
+        with self._lock:
+            if page_ix is None:
+                self.pages = {}
+            else:
+                self.pages.pop(str(page_ix), None)
+            self._save()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"version": 1, "pages": dict(self.pages)}
+
+    def _save(self) -> None:
+        # caller holds self._lock; write-then-rename so readers never see a torn file
+        atomic_write(self.path, json.dumps({"version": 1, "pages": self.pages}, ensure_ascii=False, indent=1))
@@ -0,0 +1,337 @@
+"""
+In-process metrics: counters, gauges and latency histograms, rendered in the
+Prometheus text format by GET /metrics.
+
+Pipeline stages are timed with timed(stage), as a context manager or a
+decorator; it feeds scribe_stage_seconds{stage}, the in-flight gauge and,
+inside a request, that request's Server-Timing header. Work that runs in a
+child process collects its timings with collect() and ships them back for
+record() in the parent.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from contextlib import ContextDecorator, contextmanager
+from contextvars import ContextVar
+from bisect import bisect_left
+import math
+import os
+import threading
+import time
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+
+# seconds; covers a cache hit (~0.1 ms) up to a slow recognition batch
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+def _labelstr(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labelstr(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels) -> Dict[str, float]:
+        """{"count", "sum"} for one label set."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return {"count": series[2], "sum": series[1]} if series else {"count": 0, "sum": 0.0}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = f'le="{_fmt(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labelstr(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labelstr(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labelstr(self.labelnames, key)} {count}")
+        return lines
+
+
+class Callback(_Metric):
+    """
+    Values read at scrape time from fn(), which returns a number (no labels)
+    or {label values tuple: number}. For state that already lives elsewhere,
+    e.g. cache stats() and queue depths.
+    """
+    def __init__(self, name: str, help: str, fn: Callable[[], Any], labelnames: Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def _samples(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            # a broken source must not take the whole scrape down
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_labelstr(self.labelnames, tuple(map(str, k)))} {_fmt(float(v))}"
+            for k, v in sorted(values.items())
+            if v is not None
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, Callback):
+                # module reloads re-register; keep the series collected so far
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, fn: Callable[[], Any], labelnames: Sequence[str] = (), kind: str = "gauge") -> Callback:
+        return self.register(Callback(name, help, fn, labelnames, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("scribe_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+STAGE_ITEMS = registry.counter("scribe_stage_items_total", "Items (pages, crops, strings, ops) processed per stage.", ("stage",))
+STAGE_ERRORS = registry.counter("scribe_stage_errors_total", "Stage invocations that raised.", ("stage",))
+STAGE_IN_FLIGHT = registry.gauge("scribe_stage_in_flight", "Stage invocations currently running.", ("stage",))
+
+
+# --- per-request / per-job timing accumulator ---
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("scribe_timings", default=None)
+
+def _accumulate(stage: str, seconds: float) -> None:
+    acc = _timings.get()
+    if acc is not None:
+        acc[stage] = acc.get(stage, 0.0) + seconds
+
+@contextmanager
+def collect():
+    """
+    Gather {stage: seconds} for the timed() stages run inside the block (in
+    this context); the totals are also added to any enclosing collection.
+    """
+    outer = _timings.get()
+    acc: Dict[str, float] = {}
+    token = _timings.set(acc)
+    try:
+        yield acc
+    finally:
+        _timings.reset(token)
+        if outer is not None:
+            for stage, seconds in acc.items():
+                outer[stage] = outer.get(stage, 0.0) + seconds
+
+def record(timings: Dict[str, float]) -> None:
+    """Observe stage timings measured elsewhere (a worker process's collect())."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        _accumulate(stage, seconds)
+
+
+class timed(ContextDecorator):
+    """
+    Time a pipeline stage:
+
+        with timed("rasterize"):
+            ...
+
+        @timed("recognize")
+        def _run(crops): ...
+
+    items, when given, adds to scribe_stage_items_total.
+    """
+    def __init__(self, stage: str, items: int = 0):
+        self.stage = stage
+        self.items = items
+        self._starts: List[float] = []
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(stage=self.stage)
+        self._starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._starts.pop()
+        STAGE_IN_FLIGHT.dec(stage=self.stage)
+        STAGE_SECONDS.observe(seconds, stage=self.stage)
+        if self.items:
+            STAGE_ITEMS.inc(self.items, stage=self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.stage)
+        _accumulate(self.stage, seconds)
+        return False
+
+    def _recreate_cm(self):
+        # a fresh instance per call, so concurrent calls of a decorated function don't share state
+        return timed(self.stage, self.items)
+
+
+# --- ASGI middleware ---
+
+HTTP_SECONDS = registry.histogram("scribe_http_request_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+HTTP_IN_FLIGHT = registry.gauge("scribe_http_requests_in_flight", "HTTP requests currently being served.")
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in sorted(timings.items())]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (streaming responses pass through untouched):
+    request latency by route template, in-flight requests, and, with
+    server_timing=True, a Server-Timing header listing the stages the
+    request ran. Stages finished after the response head was sent (e.g.
+    inside a streaming body) only reach the histograms.
+    """
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = {"code": 500}
+        acc: Dict[str, float] = {}
+        token = _timings.set(acc)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    value = server_timing_header(acc, time.perf_counter() - start)
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _timings.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=str(status["code"])
+            )
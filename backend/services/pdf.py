@@ -1,35 +1,261 @@
 from pathlib import Path
-from typing import Tuple, Dict, Any
-import fitz  # PyMuPDF
+from typing import Tuple, Dict, Any, Callable, List, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import hashlib
+import threading
+
+from .metrics import timed
+
+
+# PyMuPDF is imported where it is used: the API process does not need it
+# until a PDF is opened (see warmup.py to load it at start-up instead).
+
+
+class _CachedDocument:
+    __slots__ = ("signature", "doc", "lock", "refs", "retired")
+
+    def __init__(self, signature: Tuple[int, int]):
+        self.signature = signature
+        self.doc = None
+        self.lock = threading.RLock()
+        self.refs = 0
+        self.retired = False
+
+    def close(self):
+        close = getattr(self.doc, "close", None)
+        self.doc = None
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class DocumentCache:
+    """
+    Process-wide LRU of open PDF handles.
+
+    Entries are keyed by (kind, resolved path) and remember the file's
+    mtime/size; a changed file gets a fresh handle. Each handle is used by one
+    thread at a time (PyMuPDF documents are not thread-safe), and evicted
+    handles are closed once the last user releases them.
+    """
+    def __init__(self, max_open: int = 8):
+        self.max_open = max(1, max_open)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], _CachedDocument]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @contextmanager
+    def open(self, pdf_path: Path, loader: Optional[Callable[[Path], Any]] = None, kind: str = "fitz"):
+        if loader is None:
+            import fitz
+            loader = fitz.open
+        path = Path(pdf_path)
+        st = path.stat()
+        signature = (st.st_mtime_ns, st.st_size)
+        key = (kind, str(path.resolve()))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature != signature:
+                self._retire(key)
+                entry = None
+            if entry is None:
+                entry = _CachedDocument(signature)
+                self._entries[key] = entry
+                while len(self._entries) > self.max_open:
+                    self._retire(next(iter(self._entries)))
+            else:
+                self._entries.move_to_end(key)
+            entry.refs += 1
+
+        try:
+            with entry.lock:
+                if entry.doc is None:
+                    with self._lock:
+                        self._misses += 1
+                    with timed("pdf_open"):
+                        entry.doc = loader(path)
+                else:
+                    with self._lock:
+                        self._hits += 1
+                yield entry.doc
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                if entry.retired and entry.refs == 0:
+                    entry.close()
+
+    def invalidate(self, pdf_path: Path) -> None:
+        """Drop every cached handle for pdf_path (e.g. after a re-upload)."""
+        resolved = str(Path(pdf_path).resolve())
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == resolved]:
+                self._retire(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._retire(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"open": len(self._entries), "max_open": self.max_open, "hits": self._hits, "misses": self._misses}
+
+    def _retire(self, key) -> None:
+        # caller holds self._lock
+        entry = self._entries.pop(key)
+        entry.retired = True
+        if entry.refs == 0:
+            entry.close()
+
+
+documents = DocumentCache(max_open=int(os.getenv("PDF_CACHE_SIZE", "8")))
+
+
+_hash_lock = threading.Lock()
+_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+def content_hash(pdf_path: Path) -> str:
+    """SHA-256 of the PDF bytes, memoized per file mtime/size."""
+    path = Path(pdf_path)
+    st = path.stat()
+    signature = (st.st_mtime_ns, st.st_size)
+    key = str(path.resolve())
+    with _hash_lock:
+        hit = _hashes.get(key)
+    if hit is not None and hit[0] == signature:
+        return hit[1]
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _hash_lock:
+        _hashes[key] = (signature, digest)
+    return digest
+
+
+_page_hashes: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+
+def page_hashes(pdf_path: Path) -> List[str]:
+    """
+    Per-page content fingerprints: content stream, geometry and raw image
+    streams, so editing one page of a PDF leaves the other hashes unchanged.
+    Memoized per file mtime/size.
+    """
+    path = Path(pdf_path)
+    st = path.stat()
+    signature = (st.st_mtime_ns, st.st_size)
+    key = str(path.resolve())
+    with _hash_lock:
+        hit = _page_hashes.get(key)
+    if hit is not None and hit[0] == signature:
+        return hit[1]
+    out = []
+    with documents.open(path) as doc:
+        for page in doc:
+            h = hashlib.sha256()
+            h.update(f"{tuple(page.rect)}/{page.rotation}".encode("ascii"))
+            h.update(page.read_contents())
+            for img in page.get_images(full=True):
+                h.update(doc.xref_stream_raw(img[0]) or b"")
+            out.append(h.hexdigest())
+    with _hash_lock:
+        _page_hashes[key] = (signature, out)
+    return out
+
 
 def page_count(pdf_path: Path) -> int:
-    with fitz.open(pdf_path) as doc:
+    with documents.open(pdf_path) as doc:
         return doc.page_count
 
 def page_size_points(pdf_path: Path, page_index: int) -> Tuple[float, float]:
-    with fitz.open(pdf_path) as doc:
+    with documents.open(pdf_path) as doc:
         page = doc.load_page(page_index)
         r = page.rect
         return float(r.width), float(r.height)
 
-def render_page_png(pdf_path: Path, page_index: int, zoom: float = 1.5) -> bytes:
-    with fitz.open(pdf_path) as doc:
-        page = doc.load_page(page_index)
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
+IMAGE_FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+TILE_SIZE = int(os.getenv("TILE_SIZE", "512"))
+PREVIEW_ZOOM = 0.35
+MAX_ZOOM = float(os.getenv("MAX_ZOOM", "8"))  # a page at 8x is ~5000 x 6500 px
+
+@timed("encode")
+def encode_pixmap(pix: "fitz.Pixmap", fmt: str = "png", quality: int = 85) -> bytes:
+    if fmt == "png":
         return pix.tobytes("png")
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format '{fmt}'")
+    # JPEG/WebP go through Pillow
+    return pix.pil_tobytes(format=fmt.upper(), quality=quality)
 
-def page_meta(pdf_path: Path, page_index: int, zoom: float = 1.5) -> Dict[str, Any]:
-    w_pt, h_pt = page_size_points(pdf_path, page_index)
-    with fitz.open(pdf_path) as doc:
+def render_page(pdf_path: Path, page_index: int, zoom: float = 1.5, fmt: str = "png", quality: int = 85) -> bytes:
+    import fitz
+    with documents.open(pdf_path) as doc:
         page = doc.load_page(page_index)
         mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        w_px, h_px = pix.width, pix.height
+        with timed("rasterize", items=1):
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+    return encode_pixmap(pix, fmt, quality)
+
+def render_page_png(pdf_path: Path, page_index: int, zoom: float = 1.5) -> bytes:
+    return render_page(pdf_path, page_index, zoom=zoom)
+
+def render_page_tile(
+    pdf_path: Path,
+    page_index: int,
+    zoom: float,
+    x: int,
+    y: int,
+    tile_size: int = TILE_SIZE,
+    fmt: str = "png",
+    quality: int = 85,
+) -> bytes:
+    """
+    Render tile (x, y) of the page rasterized at zoom, i.e. pixels
+    [x*tile_size, (x+1)*tile_size) x [y*tile_size, (y+1)*tile_size), clipped
+    to the page. Only the clip rectangle is rasterized, so cost is bounded by
+    the tile size. Raises IndexError for tiles outside the page and
+    ValueError for a zoom that is not positive.
+    """
+    import fitz
+    if not zoom > 0:
+        raise ValueError(f"zoom must be positive, got {zoom}")
+    with documents.open(pdf_path) as doc:
+        page = doc.load_page(page_index)
+        px = fitz.Rect(x, y, x + 1, y + 1) * tile_size
+        clip = (px / zoom) & page.rect
+        if x < 0 or y < 0 or clip.is_empty:
+            raise IndexError(f"Tile ({x}, {y}) is outside page {page_index} at zoom {zoom}")
+        with timed("rasterize", items=1):
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    return encode_pixmap(pix, fmt, quality)
+
+def _page_geometry(page, zoom: float) -> Dict[str, Any]:
+    # Pixmap dimensions are the transformed page rect rounded the way MuPDF
+    # rounds it (Rect.irect), so no rasterization is needed.
+    import fitz
+    r = page.rect
+    ir = (r * fitz.Matrix(zoom, zoom)).irect
     return {
-        "width_pts": w_pt,
-        "height_pts": h_pt,
-        "width_px": w_px,
-        "height_px": h_px,
+        "width_pts": float(r.width),
+        "height_pts": float(r.height),
+        "width_px": ir.width,
+        "height_px": ir.height,
         "zoom": zoom,
     }
+
+def page_meta(pdf_path: Path, page_index: int, zoom: float = 1.5) -> Dict[str, Any]:
+    with documents.open(pdf_path) as doc:
+        return _page_geometry(doc.load_page(page_index), zoom)
+
+def document_meta(pdf_path: Path, zoom: float = 1.5) -> Dict[str, Any]:
+    """Geometry of every page at zoom, so a viewer can lay out the whole document up front."""
+    with documents.open(pdf_path) as doc:
+        pages = [_page_geometry(doc.load_page(i), zoom) for i in range(doc.page_count)]
+    return {"zoom": zoom, "page_count": len(pages), "tile_size": TILE_SIZE, "pages": pages}
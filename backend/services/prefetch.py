@@ -0,0 +1,110 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import heapq
+import itertools
+import logging
+import os
+import threading
+
+logger = logging.getLogger("prefetch")
+
+# (priority, seq, client, paper_id, task)
+_Item = Tuple[float, int, str, str, Callable[[], None]]
+
+
+class Prefetcher:
+    """
+    Bounded pool of background workers draining a priority queue of warm-up
+    tasks (lowest priority value first). Tasks are tagged with the client
+    that asked for them and the paper, so one reviewer moving on drops only
+    their own pending work.
+    """
+    def __init__(self, workers: int = 2):
+        self.workers = max(0, workers)
+        self._cv = threading.Condition()
+        self._heap: List[_Item] = []
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def submit(self, paper_id: str, priority: float, task: Callable[[], None], client: str = "") -> None:
+        if not self.enabled:
+            return
+        with self._cv:
+            self._ensure_started()
+            heapq.heappush(self._heap, (priority, next(self._seq), client, paper_id, task))
+            self._cv.notify()
+
+    def cancel(self, paper_id: Optional[str] = None, client: Optional[str] = None) -> int:
+        """Drop queued tasks of paper_id and/or client (None matches any; both None drops everything)."""
+        with self._cv:
+            before = len(self._heap)
+            self._heap = [
+                item for item in self._heap
+                if (client is not None and item[2] != client) or (paper_id is not None and item[3] != paper_id)
+            ]
+            heapq.heapify(self._heap)
+            dropped = before - len(self._heap)
+            self._cancelled += dropped
+            return dropped
+
+    def status(self) -> Dict[str, int]:
+        with self._cv:
+            by_paper: Dict[str, int] = {}
+            for item in self._heap:
+                by_paper[item[3]] = by_paper.get(item[3], 0) + 1
+            return {
+                "workers": self.workers,
+                "queue_depth": len(self._heap),
+                "active": self._active,
+                "completed": self._completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+                "by_paper": by_paper,
+            }
+
+    def _ensure_started(self) -> None:
+        # caller holds self._cv
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._run, name=f"prefetch-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while not self._heap:
+                    self._cv.wait()
+                _, _, _, paper_id, task = heapq.heappop(self._heap)
+                self._active += 1
+            try:
+                task()
+                ok = True
+            except Exception as e:
+                ok = False
+                logger.warning(f"Prefetch task for {paper_id} failed: {e}")
+            with self._cv:
+                self._active -= 1
+                if ok:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+
+
+def page_order(page_count: int, current: int, radius: Optional[int] = None) -> List[int]:
+    """Pages sorted by distance from current, the next page before the previous one."""
+    pages = range(page_count)
+    if radius is not None:
+        pages = range(max(0, current - radius), min(page_count, current + radius + 1))
+    return sorted(pages, key=lambda p: (abs(p - current), p < current))
+
+
+PREFETCH_RADIUS = int(os.getenv("PREFETCH_RADIUS", "3"))
+
+prefetcher = Prefetcher(workers=int(os.getenv("PREFETCH_WORKERS", "2")))
@@ -0,0 +1,121 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import math
+import os
+import threading
+
+from PIL import Image
+
+from .autodetect import RECOGNITION_BATCH
+from .metrics import timed
+from .recognition_cache import crop_key, recognitions
+
+
+class _Recognizer(NamedTuple):
+    batch_fn: Optional[Callable[[List[Image.Image]], List[str]]]
+    image_to_latex: Optional[Callable[[Image.Image], str]]
+    version: str
+
+
+_lock = threading.Lock()
+_model: Optional[_Recognizer] = None
+
+def _load() -> _Recognizer:
+    """
+    Import the recognizer on first use (the import initializes the model,
+    which no page or profile endpoint needs). Newer recognizer builds expose a
+    list-in/list-out forward pass; older ones only have image_to_latex, in
+    which case batches degrade to a loop.
+    """
+    global _model
+    with _lock:
+        if _model is None:
+            from equation_scribe.recognition import inference
+            batch_fn = None
+            for name in ("images_to_latex", "batch_image_to_latex"):
+                fn = getattr(inference, name, None)
+                if callable(fn):
+                    batch_fn = fn
+                    break
+            version = str(
+                getattr(inference, "MODEL_VERSION", None) or getattr(inference, "__version__", None) or "default"
+            )
+            _model = _Recognizer(batch_fn, inference.image_to_latex, version)
+        return _model
+
+def use_recognizer(batch_fn: Callable[[List[Image.Image]], List[str]], version: str) -> None:
+    """Replace the recognizer with batch_fn (benchmarks, tests); nothing is imported."""
+    global _model
+    with _lock:
+        _model = _Recognizer(batch_fn, None, version)
+
+def loaded() -> bool:
+    return _model is not None
+
+def model_version() -> str:
+    """
+    Identifies the recognizer in caches and processing manifests. Set
+    RECOGNIZER_VERSION when swapping weights under an unchanged package (it
+    also saves importing the model just to name it).
+    """
+    return os.getenv("RECOGNIZER_VERSION") or _load().version
+
+def load() -> str:
+    """Import the model without running it (safe before a fork); returns its version."""
+    return _load().version
+
+def warm() -> None:
+    """Load the model and run one forward pass, so the first request does not."""
+    _run([Image.new("RGB", (64, 32), "white")])
+
+
+def size_bucket(img: Image.Image) -> Tuple[int, int]:
+    """Half-octave (height, width) bucket; crops sharing one pad to nearly the same tensor."""
+    w, h = img.size
+    return (math.ceil(2 * math.log2(max(h, 1))), math.ceil(2 * math.log2(max(w, 1))))
+
+
+def _run(crops: List[Image.Image]) -> List[str]:
+    model = _load()
+    with timed("recognize", items=len(crops)):
+        if model.batch_fn is not None:
+            return list(model.batch_fn(crops))
+        return [model.image_to_latex(c) for c in crops]
+
+
+def recognize_batch(crops: List[Image.Image], batch_size: int = RECOGNITION_BATCH, use_cache: bool = True) -> List[str]:
+    """
+    image_to_latex over many crops. Crops already recognized by this model
+    version come from the recognition cache (see recognition_cache.py), and
+    identical crops in one call are recognized once. The rest are grouped by
+    size bucket to keep padding small, each bucket is split into chunks of
+    batch_size and sent through one forward pass; results come back in input
+    order.
+    """
+    if use_cache:
+        version = model_version()
+        keys = [crop_key(c, version) for c in crops]
+    else:
+        keys = [str(i) for i in range(len(crops))]
+    known = recognitions.get_many(keys) if use_cache else {}
+
+    # first crop of each uncached key
+    todo: Dict[str, int] = {}
+    for i, key in enumerate(keys):
+        if key not in known and key not in todo:
+            todo[key] = i
+
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for i in todo.values():
+        buckets.setdefault(size_bucket(crops[i]), []).append(i)
+
+    fresh: Dict[str, str] = {}
+    for bucket in sorted(buckets):
+        idxs = buckets[bucket]
+        for start in range(0, len(idxs), max(1, batch_size)):
+            chunk = idxs[start:start + batch_size]
+            for i, latex in zip(chunk, _run([crops[i] for i in chunk])):
+                fresh[keys[i]] = latex
+    if use_cache:
+        recognitions.put_many(fresh)
+    known.update(fresh)
+    return [known[key] for key in keys]
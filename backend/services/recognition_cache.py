@@ -0,0 +1,139 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+INK_THRESHOLD = 250  # grayscale values below this count as ink
+
+
+def crop_key(img: Image.Image, model_version: str) -> str:
+    """
+    Cache key for a crop: SHA-256 of its grayscale pixels trimmed to the ink
+    bounding box, plus the recognizer version. Nudging a box so that only the
+    white margin changes keeps the key; any change to the ink does not.
+    """
+    gray = img.convert("L")
+    bbox = gray.point(lambda v: 255 if v < INK_THRESHOLD else 0).getbbox()
+    if bbox is not None:
+        gray = gray.crop(bbox)
+    h = hashlib.sha256()
+    h.update(f"{model_version}\0{gray.width}x{gray.height}\0".encode("utf-8"))
+    h.update(gray.tobytes())
+    return h.hexdigest()
+
+
+class RecognitionCache:
+    """
+    crop key -> LaTeX. An in-memory LRU (max_items) in front of a SQLite
+    table on disk (db_path, None = memory only) that survives restarts.
+    """
+    def __init__(self, max_items: int = 10000, db_path: Optional[Path] = None):
+        self.max_items = max(0, max_items)
+        self.db_path = Path(db_path) if db_path else None
+        self._mem: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+        self._stores = 0
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # caller holds self._lock
+        if self._conn is None and self.db_path is not None:
+            try:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS recognitions (key TEXT PRIMARY KEY, latex TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                self._conn = conn
+            except sqlite3.Error:
+                # unusable cache dir: keep working from memory
+                self.db_path = None
+        return self._conn
+
+    def _remember(self, key: str, latex: str) -> None:
+        # caller holds self._lock
+        self._mem[key] = latex
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Cached results for whichever keys have one."""
+        found: Dict[str, str] = {}
+        with self._lock:
+            missing: List[str] = []
+            seen = set()
+            for key in keys:
+                if key in self._mem:
+                    self._mem.move_to_end(key)
+                    found[key] = self._mem[key]
+                    self._hits_memory += 1
+                elif key not in seen:
+                    seen.add(key)
+                    missing.append(key)
+            db = self._db()
+            if db is not None and missing:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = db.execute(
+                        f"SELECT key, latex FROM recognitions WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, latex in rows:
+                        found[key] = latex
+                        self._remember(key, latex)
+                        self._hits_disk += 1
+            self._misses += sum(1 for key in missing if key not in found)
+        return found
+
+    def put_many(self, results: Dict[str, str]) -> None:
+        if not results:
+            return
+        with self._lock:
+            for key, latex in results.items():
+                self._remember(key, latex)
+            self._stores += len(results)
+            db = self._db()
+            if db is not None:
+                now = time.time()
+                db.executemany(
+                    "INSERT OR REPLACE INTO recognitions (key, latex, created) VALUES (?, ?, ?)",
+                    [(key, latex, now) for key, latex in results.items()],
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM recognitions")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self._hits_memory + self._hits_disk + self._misses
+            return {
+                "memory_items": len(self._mem),
+                "max_items": self.max_items,
+                "db_path": str(self.db_path) if self.db_path else None,
+                "hits_memory": self._hits_memory,
+                "hits_disk": self._hits_disk,
+                "misses": self._misses,
+                "stores": self._stores,
+                "hit_rate": (self._hits_memory + self._hits_disk) / lookups if lookups else 0.0,
+            }
+
+
+recognitions = RecognitionCache(
+    max_items=int(os.getenv("RECOGNITION_CACHE_SIZE", "10000")),
+    db_path=os.getenv("RECOGNITION_CACHE_DB", "data/cache/recognition.sqlite") or None,
+)
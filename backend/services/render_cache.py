@@ -0,0 +1,225 @@
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from collections import OrderedDict
+import os
+import shutil
+import threading
+
+from PIL import Image
+
+from .fileio import atomic_write
+
+# (paper_id, pdf signature, page, kind, scale)
+RenderKey = Tuple[str, str, int, str, float]
+
+
+def render_key(pdf_path: Path, page_index: int, kind: str, scale: float) -> RenderKey:
+    """Cache key for one rendering of a page; the file signature makes stale entries unreachable."""
+    p = Path(pdf_path)
+    st = p.stat()
+    return (p.stem, f"{st.st_mtime_ns:x}-{st.st_size:x}", int(page_index), kind, float(scale))
+
+
+def encode_image(img: Image.Image) -> bytes:
+    """Raw pixels with a small header; decoding is a memcpy instead of a PNG inflate."""
+    header = f"{img.mode} {img.width} {img.height}\n".encode("ascii")
+    return header + img.tobytes()
+
+
+def decode_image(data: bytes) -> Image.Image:
+    header, _, raw = data.partition(b"\n")
+    mode, w, h = header.decode("ascii").split()
+    return Image.frombytes(mode, (int(w), int(h)), raw)
+
+
+class RenderCache:
+    """
+    Two-tier cache for rendered pages.
+
+    The memory tier is an LRU bounded by total bytes; entries pushed out of it
+    are spilled to spill_dir (one sub-directory per paper) and promoted back
+    on the next hit. Concurrent misses on the same key render only once.
+    spill_dir is created and scanned on first use, not on construction, so
+    processes that import this module without rendering (autodetect
+    workers) never touch it.
+    """
+    def __init__(self, max_bytes: int, spill_dir: Optional[Path] = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[RenderKey, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: "OrderedDict[RenderKey, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight: Dict[RenderKey, threading.Lock] = {}
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+        self._scanned = self.spill_dir is None
+
+    # --- public API ---
+
+    def get(self, key: RenderKey) -> Optional[bytes]:
+        return self._lookup(key, count=True)
+
+    def put(self, key: RenderKey, data: bytes) -> None:
+        self._put_mem(key, data)
+
+    def get_or_create(self, key: RenderKey, factory: Callable[[], bytes]) -> bytes:
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            gate = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with gate:
+                # already counted as a miss above
+                data = self._lookup(key, count=False)
+                if data is None:
+                    data = factory()
+                    self.put(key, data)
+        finally:
+            # also when factory raised: a leaked gate would pin the key forever
+            with self._lock:
+                self._inflight.pop(key, None)
+        return data
+
+    def invalidate(self, paper_id: str) -> None:
+        """Forget every rendering of paper_id, in memory and on disk."""
+        with self._lock:
+            for key in [k for k in self._mem if k[0] == paper_id]:
+                self._mem_bytes -= len(self._mem.pop(key))
+            self._open_disk()
+            for key in [k for k in self._disk if k[0] == paper_id]:
+                self._disk_bytes -= self._disk.pop(key)
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir / paper_id, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._open_disk()
+            return {
+                "memory_entries": len(self._mem),
+                "memory_bytes": self._mem_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "hits_memory": self._hits_memory,
+                "hits_disk": self._hits_disk,
+                "misses": self._misses,
+            }
+
+    # --- internals ---
+
+    def _lookup(self, key: RenderKey, count: bool) -> Optional[bytes]:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self._hits_memory += count
+                return data
+            self._open_disk()
+            on_disk = key in self._disk
+            if not on_disk:
+                self._misses += count
+        if not on_disk:
+            return None
+        try:
+            data = self._path_for(key).read_bytes()
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)
+                self._misses += count
+            return None
+        with self._lock:
+            self._hits_disk += count
+        self._put_mem(key, data)
+        return data
+
+    def _put_mem(self, key: RenderKey, data: bytes) -> None:
+        spill = []
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            if len(data) > self.max_bytes:
+                spill.append((key, data))
+            else:
+                self._mem[key] = data
+                self._mem_bytes += len(data)
+                while self._mem_bytes > self.max_bytes:
+                    k, v = self._mem.popitem(last=False)
+                    self._mem_bytes -= len(v)
+                    spill.append((k, v))
+        for k, v in spill:
+            self._spill(k, v)
+
+    def _spill(self, key: RenderKey, data: bytes) -> None:
+        if self.spill_dir is None:
+            return
+        with self._lock:
+            self._open_disk()
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                return
+        path = self._path_for(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, data)
+        except OSError:
+            return
+        drop = []
+        with self._lock:
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                k = next(iter(self._disk))
+                self._forget_disk(k)
+                drop.append(k)
+        for k in drop:
+            try:
+                self._path_for(k).unlink()
+            except OSError:
+                pass
+
+    def _forget_disk(self, key: RenderKey) -> None:
+        # caller holds self._lock
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _path_for(self, key: RenderKey) -> Path:
+        paper_id, sig, page, kind, scale = key
+        return self.spill_dir / paper_id / f"{sig}_{page}_{kind}_{scale:g}.bin"
+
+    def _open_disk(self) -> None:
+        # caller holds self._lock
+        if not self._scanned:
+            self._scanned = True
+            try:
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+            except OSError:
+                self.spill_dir = None
+                return
+            self._scan_disk()
+
+    def _scan_disk(self) -> None:
+        files = []
+        for path in self.spill_dir.glob("*/*.bin"):
+            try:
+                sig, page, kind, scale = path.stem.split("_", 3)
+                key = (path.parent.name, sig, int(page), kind, float(scale))
+                st = path.stat()
+            except (ValueError, OSError):
+                continue
+            files.append((st.st_mtime, key, st.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+
+renders = RenderCache(
+    max_bytes=int(os.getenv("RENDER_CACHE_BYTES", str(256 * 1024 * 1024))),
+    spill_dir=os.getenv("RENDER_CACHE_DIR", "data/cache/renders") or None,
+    max_disk_bytes=int(os.getenv("RENDER_CACHE_DISK_BYTES", str(2 * 1024 * 1024 * 1024))),
+)
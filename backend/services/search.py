@@ -0,0 +1,406 @@
+"""
+Corpus-wide equation search over every paper profile.
+
+One SQLite database (PROFILES_ROOT/search.sqlite) holds, per equation, its
+normalized LaTeX, the hashed token n-grams of it (1..SEARCH_NGRAM tokens) and
+the symbols it uses. Storage pushes every committed change here (see
+storage._Store._publish), so a lookup is a few index probes rather than a
+scan of every profile.
+
+  exact:    normalized LaTeX equal to the query's
+  similar:  ranked by the Dice overlap of the query's longest n-grams
+  symbols:  every listed symbol is used (a filter for either mode, or alone)
+
+Each paper's row in `papers` records the profile (epoch, revision) the index
+reflects; incremental updates only apply on top of the revision they were
+made from, anything else falls back to re-indexing that paper.
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from .metrics import timed
+
+SEARCH_DB = "search.sqlite"
+SEARCH_NGRAM = int(os.getenv("SEARCH_NGRAM", "3"))
+SEARCH_MAX_TOKENS = 256  # of a query; longer ones are truncated
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+# bump when tokenize()/symbols_of() change: the index is then rebuilt
+TOKENIZER_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS equations (
+    id         INTEGER PRIMARY KEY,
+    paper_id   TEXT NOT NULL,
+    eq_uid     TEXT NOT NULL,
+    latex      TEXT NOT NULL,
+    norm       TEXT NOT NULL,
+    norm_hash  INTEGER NOT NULL,
+    n_tokens   INTEGER NOT NULL,
+    boxes      TEXT NOT NULL,
+    UNIQUE (paper_id, eq_uid)
+);
+CREATE INDEX IF NOT EXISTS equations_norm ON equations (norm_hash);
+CREATE TABLE IF NOT EXISTS grams (
+    gram    INTEGER NOT NULL,
+    eq_id   INTEGER NOT NULL,
+    PRIMARY KEY (gram, eq_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS grams_eq ON grams (eq_id);
+CREATE TABLE IF NOT EXISTS symbols (
+    symbol  TEXT NOT NULL,
+    eq_id   INTEGER NOT NULL,
+    PRIMARY KEY (symbol, eq_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS symbols_eq ON symbols (eq_id);
+CREATE TABLE IF NOT EXISTS papers (
+    paper_id  TEXT PRIMARY KEY,
+    epoch     TEXT NOT NULL,
+    revision  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key     TEXT PRIMARY KEY,
+    value   TEXT
+);
+"""
+
+# --- tokenization ---
+
+_TOKEN = re.compile(
+    r"\\(?:text|textrm|textit|textbf|mathrm|operatorname|mbox)\s*\{[^{}]*\}"  # words: one token
+    r"|\\[A-Za-z]+|\\.|%[^\n]*|\S"
+)
+_WORD = re.compile(r"(\\[A-Za-z]+)\s*\{([^{}]*)\}")
+# layout only: spacing, sizing, alignment and line breaks
+_DROP = {
+    "\\left", "\\right", "\\middle", "\\displaystyle", "\\textstyle", "\\scriptstyle", "\\scriptscriptstyle",
+    "\\big", "\\Big", "\\bigg", "\\Bigg", "\\bigl", "\\bigr", "\\Bigl", "\\Bigr", "\\biggl", "\\biggr",
+    "\\Biggl", "\\Biggr", "\\,", "\\;", "\\:", "\\!", "\\ ", "\\quad", "\\qquad", "\\nonumber", "\\notag",
+    "\\limits", "\\nolimits", "\\\\", "&",
+}
+_ALIASES = {
+    "\\dfrac": "\\frac", "\\tfrac": "\\frac", "\\le": "\\leq", "\\ge": "\\geq", "\\ne": "\\neq",
+    "\\to": "\\rightarrow", "\\gets": "\\leftarrow", "\\lbrace": "\\{", "\\rbrace": "\\}",
+    "\\land": "\\wedge", "\\lor": "\\vee", "\\lvert": "|", "\\rvert": "|", "\\vert": "|",
+    "\\lVert": "\\|", "\\rVert": "\\|", "\\Vert": "\\|", "\\bm": "\\boldsymbol",
+}
+_GREEK = {
+    "\\" + g for g in (
+        "alpha beta gamma delta epsilon varepsilon zeta eta theta vartheta iota kappa lambda mu nu xi pi "
+        "varpi rho varrho sigma varsigma tau upsilon phi varphi chi psi omega Gamma Delta Theta Lambda Xi "
+        "Pi Sigma Upsilon Phi Psi Omega ell hbar imath jmath"
+    ).split()
+}
+# applied to the next token: \mathbf x and \mathbf{x} are one symbol
+_FONTS = {
+    "\\mathbf", "\\mathcal", "\\mathbb", "\\mathfrak", "\\mathsf", "\\mathit", "\\boldsymbol",
+    "\\vec", "\\hat", "\\bar", "\\tilde", "\\dot", "\\ddot", "\\overline", "\\widehat", "\\widetilde",
+}
+
+
+def _is_symbol(tok: str) -> bool:
+    if len(tok) == 1:
+        return tok.isalpha()
+    if tok in _GREEK:
+        return True
+    # \mathbf{x}, \mathrm{d}, \hat{\theta}
+    m = _WORD.fullmatch(tok)
+    return bool(m) and (len(m.group(2)) == 1 and m.group(2).isalpha() or m.group(2) in _GREEK)
+
+def tokenize(latex: str) -> List[str]:
+    """
+    LaTeX -> normalized tokens: layout commands dropped, aliases folded,
+    braces around a single token removed (x^{2} == x^2), font/accent commands
+    merged with their argument, words in \\text{..}/\\mathrm{..} kept whole.
+    """
+    out: List[str] = []
+
+    def push(tok: str) -> None:
+        while True:
+            if tok == "}" and len(out) >= 2 and out[-2] == "{" and out[-1] not in ("{", "}"):
+                tok = out.pop()
+                out.pop()
+                continue
+            if out and out[-1] in _FONTS and tok not in ("{", "}") and (len(tok) == 1 or tok in _GREEK):
+                tok = f"{out.pop()}{{{tok}}}"
+                continue
+            out.append(tok)
+            return
+
+    for tok in _TOKEN.findall(latex or ""):
+        if tok.startswith("%"):
+            continue
+        m = _WORD.fullmatch(tok)
+        if m:
+            tok = f"{m.group(1)}{{{''.join(m.group(2).split())}}}"
+        tok = _ALIASES.get(tok, tok)
+        if tok not in _DROP:
+            push(tok)
+    return out
+
+def normalize(latex: str) -> str:
+    """Canonical form for exact matching: tokenize() joined by single spaces."""
+    return " ".join(tokenize(latex))
+
+def symbols_of(tokens: List[str]) -> Set[str]:
+    """Identifiers used: letters, Greek, font-wrapped letters, and X_y for a subscripted symbol."""
+    out = set()
+    for i, tok in enumerate(tokens):
+        if _is_symbol(tok):
+            out.add(tok)
+            if i + 2 < len(tokens) and tokens[i + 1] == "_" and tokens[i + 2] not in ("{", "}"):
+                out.add(f"{tok}_{tokens[i + 2]}")
+    return out
+
+def parse_symbol(text: str) -> str:
+    """One symbol of a query (`E_0`, `\\alpha`, `\\mathbf{x}`) in its indexed form."""
+    tokens = tokenize(text)
+    if len(tokens) == 1 and _is_symbol(tokens[0]):
+        return tokens[0]
+    if len(tokens) == 3 and tokens[1] == "_" and _is_symbol(tokens[0]):
+        return f"{tokens[0]}_{tokens[2]}"
+    raise ValueError(f"Not a symbol: {text!r}")
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+def _grams(tokens: List[str], sizes: Iterable[int]) -> Set[int]:
+    return {_hash("\x1f".join(tokens[i:i + k])) for k in sizes for i in range(len(tokens) - k + 1)}
+
+
+class SearchIndex:
+    """The corpus index under one PROFILES_ROOT; every statement runs under self.lock."""
+    def __init__(self, root: Path):
+        self.path = Path(root) / SEARCH_DB
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            str(self.path), timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._check_version()
+
+    def _check_version(self) -> None:
+        # a different tokenizer or n-gram size makes every stored gram stale:
+        # start empty, storage.reindex_profiles() fills it again
+        version = f"{TOKENIZER_VERSION}:{SEARCH_NGRAM}"
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if row is None or row[0] != version:
+                    for table in ("equations", "grams", "symbols", "papers"):
+                        self.conn.execute(f"DELETE FROM {table}")
+                    self.conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('version', ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (version,)
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    # --- updates ---
+
+    def paper_state(self, paper_id: str) -> Optional[Tuple[str, int]]:
+        """(epoch, revision) of the profile the index reflects, None if not indexed."""
+        with self.lock:
+            row = self.conn.execute("SELECT epoch, revision FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def papers(self) -> List[str]:
+        with self.lock:
+            return [p for (p,) in self.conn.execute("SELECT paper_id FROM papers")]
+
+    def apply(
+        self,
+        paper_id: str,
+        epoch: str,
+        revision: int,
+        records: Dict[str, Optional[Dict[str, Any]]],
+        base: Optional[int] = None,
+    ) -> bool:
+        """
+        Index records ({eq_uid: record, or None if deleted}) as the paper's
+        state at `revision`. With base=None they replace everything indexed
+        for the paper; otherwise they are a delta on top of revision `base`
+        and are refused (False) unless that is what the index holds. Never
+        moves a paper back to an older revision.
+        """
+        with self.lock, timed("search_index", items=len(records)):
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self.paper_state(paper_id)
+                if state is not None and state[0] == epoch and state[1] >= revision:
+                    self.conn.execute("COMMIT")
+                    return True
+                if base is not None and state != (epoch, base):
+                    self.conn.execute("COMMIT")
+                    return False
+                if base is None:
+                    self._drop(paper_id)
+                for eq_uid, rec in records.items():
+                    self._put(paper_id, eq_uid, rec)
+                self.conn.execute(
+                    "INSERT INTO papers (paper_id, epoch, revision) VALUES (?, ?, ?) ON CONFLICT(paper_id) "
+                    "DO UPDATE SET epoch = excluded.epoch, revision = excluded.revision",
+                    (paper_id, epoch, revision),
+                )
+                self.conn.execute("COMMIT")
+                return True
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def drop_paper(self, paper_id: str) -> None:
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._drop(paper_id)
+                self.conn.execute("DELETE FROM papers WHERE paper_id = ?", (paper_id,))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _drop(self, paper_id: str) -> None:
+        # caller is inside a write transaction
+        ids = "SELECT id FROM equations WHERE paper_id = ?"
+        self.conn.execute(f"DELETE FROM grams WHERE eq_id IN ({ids})", (paper_id,))
+        self.conn.execute(f"DELETE FROM symbols WHERE eq_id IN ({ids})", (paper_id,))
+        self.conn.execute("DELETE FROM equations WHERE paper_id = ?", (paper_id,))
+
+    def _put(self, paper_id: str, eq_uid: str, rec: Optional[Dict[str, Any]]) -> None:
+        # caller is inside a write transaction
+        latex = (rec or {}).get("latex") or ""
+        tokens = tokenize(latex)
+        norm = " ".join(tokens)
+        boxes = json.dumps((rec or {}).get("boxes") or [], ensure_ascii=False)
+        row = self.conn.execute(
+            "SELECT id, norm FROM equations WHERE paper_id = ? AND eq_uid = ?", (paper_id, eq_uid)
+        ).fetchone()
+        if row is not None and rec is not None and row[1] == norm:
+            # same formula (e.g. only the box moved): postings unchanged
+            self.conn.execute("UPDATE equations SET latex = ?, boxes = ? WHERE id = ?", (latex, boxes, row[0]))
+            return
+        if row is not None:
+            self.conn.execute("DELETE FROM grams WHERE eq_id = ?", (row[0],))
+            self.conn.execute("DELETE FROM symbols WHERE eq_id = ?", (row[0],))
+            self.conn.execute("DELETE FROM equations WHERE id = ?", (row[0],))
+        if rec is None or not tokens:
+            return
+        cur = self.conn.execute(
+            "INSERT INTO equations (paper_id, eq_uid, latex, norm, norm_hash, n_tokens, boxes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (paper_id, eq_uid, latex, norm, _hash(norm), len(tokens), boxes),
+        )
+        eq_id = cur.lastrowid
+        self.conn.executemany("INSERT INTO grams (gram, eq_id) VALUES (?, ?)",
+                              [(g, eq_id) for g in _grams(tokens, range(1, SEARCH_NGRAM + 1))])
+        self.conn.executemany("INSERT INTO symbols (symbol, eq_id) VALUES (?, ?)",
+                              [(s, eq_id) for s in symbols_of(tokens)])
+
+    # --- queries ---
+
+    def search(
+        self,
+        q: str = "",
+        mode: str = "similar",
+        symbols: Iterable[str] = (),
+        paper_id: Optional[str] = None,
+        min_score: float = 0.0,
+        cursor: Optional[int] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Equations matching q (mode "exact" or "similar") and/or using every
+        symbol in `symbols` (already in parse_symbol() form), optionally
+        within one paper. Exact and symbol-only results come in index order,
+        similar ones by score; pass the returned next_cursor to continue.
+
+        Returns {"items", "next_cursor", "query": {"normalized", "symbols"}}.
+        """
+        tokens = tokenize(q)[:SEARCH_MAX_TOKENS]
+        symbols = sorted(set(symbols), key=lambda s: (-len(s), s))  # longer ones first: usually rarer
+        conds: List[str] = []
+        args: List[Any] = []
+        if paper_id is not None:
+            conds.append("e.paper_id = ?")
+            args.append(paper_id)
+        for s in symbols[1:]:
+            conds.append("EXISTS (SELECT 1 FROM symbols s WHERE s.symbol = ? AND s.eq_id = e.id)")
+            args.append(s)
+
+        with self.lock, timed("search"):
+            if tokens and mode == "similar":
+                k = min(SEARCH_NGRAM, len(tokens))
+                grams = sorted(_grams(tokens, (k,)))
+                if symbols:
+                    conds.append("EXISTS (SELECT 1 FROM symbols s WHERE s.symbol = ? AND s.eq_id = e.id)")
+                    args.append(symbols[0])
+                offset = cursor or 0
+                # Dice overlap of k-grams; an equation of n tokens has at most n - k + 1 of them
+                sql = (
+                    "SELECT e.id, e.paper_id, e.eq_uid, e.latex, e.boxes, "
+                    "MIN(1.0, 2.0 * COUNT(*) / (? + MAX(1, e.n_tokens - ? + 1))) AS score "
+                    "FROM grams g JOIN equations e ON e.id = g.eq_id "
+                    f"WHERE g.gram IN ({','.join('?' * len(grams))})"
+                    + "".join(" AND " + c for c in conds)
+                    + " GROUP BY e.id HAVING score >= ? ORDER BY score DESC, e.id LIMIT ? OFFSET ?"
+                )
+                rows = self.conn.execute(sql, [len(grams), k, *grams, *args, min_score, limit + 1, offset]).fetchall()
+                next_cursor = offset + limit if len(rows) > limit else None
+            else:
+                if tokens:
+                    norm = " ".join(tokens)
+                    sql = "SELECT e.id, e.paper_id, e.eq_uid, e.latex, e.boxes, 1.0 FROM equations e WHERE e.norm_hash = ? AND e.norm = ?"
+                    head = [_hash(norm), norm]
+                    if symbols:
+                        conds.append("EXISTS (SELECT 1 FROM symbols s WHERE s.symbol = ? AND s.eq_id = e.id)")
+                        args.append(symbols[0])
+                elif symbols:
+                    # walk the first symbol's postings in eq_id order, so LIMIT stops early
+                    sql = ("SELECT e.id, e.paper_id, e.eq_uid, e.latex, e.boxes, 1.0 FROM symbols s0 "
+                           "JOIN equations e ON e.id = s0.eq_id WHERE s0.symbol = ?")
+                    head = [symbols[0]]
+                else:
+                    raise ValueError("Give a query, symbols, or both")
+                if cursor is not None:
+                    conds.append("e.id > ?")
+                    args.append(cursor)
+                sql += "".join(" AND " + c for c in conds) + " ORDER BY e.id LIMIT ?"
+                rows = self.conn.execute(sql, [*head, *args, limit + 1]).fetchall()
+                next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        items = [
+            {"paper_id": p, "eq_uid": u, "latex": latex, "boxes": json.loads(boxes), "score": round(score, 4)}
+            for _, p, u, latex, boxes, score in rows[:limit]
+        ]
+        return {"items": items, "next_cursor": next_cursor, "query": {"normalized": " ".join(tokens), "symbols": symbols}}
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "papers": self.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0],
+                "equations": self.conn.execute("SELECT COUNT(*) FROM equations").fetchone()[0],
+            }
+
+
+_indexes_lock = threading.Lock()
+_indexes: Dict[str, SearchIndex] = {}
+
+def search_index(root: Path) -> SearchIndex:
+    """The shared SearchIndex for a PROFILES_ROOT."""
+    key = str(Path(root).resolve())
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            Path(root).mkdir(parents=True, exist_ok=True)
+            index = _indexes[key] = SearchIndex(Path(root))
+        return index
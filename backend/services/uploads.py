@@ -0,0 +1,120 @@
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import json
+import os
+
+from .fileio import FileLock, atomic_write
+from .pdf import content_hash
+
+INDEX_NAME = "content_index.json"
+
+
+class PaperFiles:
+    """
+    The PDFs under papers_root, addressed by paper_id and by SHA-256.
+
+    A finished upload (already on disk as a temp file in papers_root, with
+    its hash computed while copying it there) is placed with place():
+
+    - same bytes as an existing paper -> that paper_id, temp file discarded
+    - new bytes, free slug            -> <slug>.pdf
+    - new bytes, slug taken           -> <slug>-<sha8>.pdf (a longer prefix
+                                         of the hash if that is taken too),
+                                         or, with replace=True, the slug's
+                                         file is swapped atomically
+    """
+    def __init__(self, papers_root: Path):
+        self.root = Path(papers_root)
+        self._lock = FileLock(self.root / ".upload.lock")
+        self._index: Optional[Dict[str, str]] = None
+        self._index_sig = None
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / INDEX_NAME
+
+    def _load_index(self) -> Dict[str, str]:
+        # caller holds self._lock; reloads if another worker rewrote it
+        try:
+            st = self.index_path.stat()
+            sig = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            sig = None
+        if self._index is not None and sig == self._index_sig:
+            return self._index
+        index: Dict[str, str] = {}
+        if sig is not None:
+            try:
+                with self.index_path.open("r", encoding="utf-8") as f:
+                    index = json.load(f).get("by_sha256", {})
+            except Exception:
+                index = {}
+        if not index:
+            # first run (or lost index): hash what is already there
+            for pdf in sorted(self.root.glob("*.pdf")):
+                index.setdefault(content_hash(pdf), pdf.stem)
+        self._index, self._index_sig = index, sig
+        return index
+
+    def _save_index(self, index: Dict[str, str]) -> None:
+        atomic_write(self.index_path, json.dumps({"version": 1, "by_sha256": index}, indent=1))
+        st = self.index_path.stat()
+        self._index, self._index_sig = index, (st.st_mtime_ns, st.st_size)
+
+    def find(self, sha256: str) -> Optional[str]:
+        """paper_id holding exactly these bytes, if any."""
+        with self._lock:
+            return self._find(self._load_index(), sha256)
+
+    def _find(self, index: Dict[str, str], sha256: str) -> Optional[str]:
+        paper_id = index.get(sha256)
+        if paper_id is None:
+            return None
+        p = self.root / f"{paper_id}.pdf"
+        # the file may have been replaced or removed behind the index
+        if p.exists() and content_hash(p) == sha256:
+            return paper_id
+        index.pop(sha256, None)
+        return None
+
+    def place(self, tmp_path: Path, sha256: str, slug: str, replace: bool = False) -> Tuple[str, str]:
+        """
+        Move tmp_path into place; returns (paper_id, outcome) with outcome
+        "duplicate", "new" or "replaced". tmp_path is consumed either way.
+        """
+        with self._lock:
+            index = self._load_index()
+            existing = self._find(index, sha256)
+            if existing is not None:
+                os.unlink(tmp_path)
+                return existing, "duplicate"
+
+            paper_id, outcome = slug, "new"
+            dest = self.root / f"{slug}.pdf"
+            if dest.exists():
+                if replace:
+                    outcome = "replaced"
+                    index.pop(content_hash(dest), None)
+                else:
+                    paper_id, dest = self._free_name(slug, sha256)
+                    if dest.exists():
+                        # these very bytes, placed without going through the index
+                        os.unlink(tmp_path)
+                        index[sha256] = paper_id
+                        self._save_index(index)
+                        return paper_id, "duplicate"
+            os.replace(tmp_path, dest)
+            index[sha256] = paper_id
+            self._save_index(index)
+            return paper_id, outcome
+
+    def _free_name(self, slug: str, sha256: str) -> Tuple[str, Path]:
+        # caller holds self._lock. <slug>-<sha8>, then longer prefixes, so an
+        # unrelated file that happens to have the name is never overwritten;
+        # returns an existing path only if it holds exactly these bytes.
+        for n in (8, 16, 64):
+            paper_id = f"{slug}-{sha256[:n]}"
+            dest = self.root / f"{paper_id}.pdf"
+            if not dest.exists() or content_hash(dest) == sha256:
+                return paper_id, dest
+        raise FileExistsError(f"No free name for '{slug}' with hash {sha256}")
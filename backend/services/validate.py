@@ -1,22 +1,36 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import logging
+import multiprocessing
+import os
 import re
-from sympy.parsing.latex import parse_latex
+import threading
+import time
+
+from .metrics import timed
+
+logger = logging.getLogger("validate")
+
+VALIDATE_WORKERS = int(os.getenv("VALIDATE_WORKERS", "2"))
+VALIDATE_TIMEOUT = float(os.getenv("VALIDATE_TIMEOUT", "2.0"))
+VALIDATE_CACHE_SIZE = int(os.getenv("VALIDATE_CACHE_SIZE", "4096"))
+# extra time a just-started pool gets for spawning and importing the parser
+VALIDATE_START_GRACE = float(os.getenv("VALIDATE_START_GRACE", "15"))
+
+_core = None
+
+def _core_validate():
+    # resolved on first parse, in whichever process parses: the API process
+    # never imports equation_scribe/sympy unless VALIDATE_WORKERS=0
+    global _core
+    if _core is None:
+        try:
+            from equation_scribe.validate import validate_latex as fn
+        except Exception:
+            fn = False
+        _core = fn
+    return _core or None
 
-def _fallback_validate(latex: str) -> Dict[str, Any]:
-    latex = (latex or "").strip()
-    if not latex:
-        return {"ok": True, "errors": []}
-    return {"ok": True, "errors": []}
-
-try:
-    from equation_scribe.validate import validate_latex as _core_validate
-    def validate_latex(latex: str) -> Dict[str, Any]:
-        res = _core_validate(latex or "")
-        return {"ok": bool(res.ok), "errors": res.errors or []}
-except Exception:
-    def validate_latex(latex: str) -> Dict[str, Any]:
-        return _fallback_validate(latex)
-    
 def normalize_latex(latex: str) -> str:
     """
     Cleans up common recognition artifacts before validation/display.
@@ -30,23 +44,201 @@ def normalize_latex(latex: str) -> str:
     latex = re.sub(pattern, "", latex, flags=re.DOTALL)
 
     # 2. Fix common double-escapes if they exist
-    latex = latex.replace("\\\\", "\\") 
-    
+    latex = latex.replace("\\\\", "\\")
+
     # 3. Strip leading/trailing whitespace
     return latex.strip()
 
-def validate_latex(latex: str):
-    # Use the normalizer first
-    clean_latex = normalize_latex(latex)
-    
-    if not clean_latex:
-        return {"ok": False, "errors": ["Empty string"]}
-    
+def _cache_key(clean_latex: str) -> str:
+    # runs of spaces/tabs never change the parse (newlines might: % comments)
+    return re.sub(r"[ \t]+", " ", clean_latex)
+
+def _validate_clean(clean_latex: str) -> Dict[str, Any]:
+    """Parse one normalized, non-empty string. Runs in the validation pool."""
+    core = _core_validate()
+    if core is not None:
+        res = core(clean_latex)
+        return {"ok": bool(res.ok), "errors": list(res.errors or [])}
+    from sympy.parsing.latex import parse_latex
     try:
         # Attempt to parse
         parse_latex(clean_latex)
         return {"ok": True, "errors": []}
     except Exception as e:
-        # Return the error, but also the normalized version might be useful to see?
         # For now, just return error string
-        return {"ok": False, "errors": [str(e)]}
\ No newline at end of file
+        return {"ok": False, "errors": [str(e)]}
+
+
+class Validator:
+    """
+    LaTeX validation with an LRU of results keyed by normalized LaTeX, and
+    parsing in a small spawn-context process pool. An item that does not
+    finish within `timeout` seconds is reported as an error; the pool is then
+    terminated and recreated, since the stuck parse cannot be interrupted
+    otherwise. Timeouts and worker failures depend on load, not on the LaTeX,
+    so they are never cached. For start_grace seconds after a pool starts,
+    deadlines are pushed back to allow for spawning it. workers=0 parses in
+    the calling thread, without the timeout.
+    """
+    def __init__(self, workers: int = 2, timeout: float = 2.0, cache_size: int = 4096, start_grace: float = 15.0):
+        self.workers = max(0, workers)
+        self.timeout = timeout
+        self.start_grace = start_grace
+        self.cache_size = max(0, cache_size)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_started = 0.0
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._timeouts = 0
+        self._restarts = 0
+
+    def validate(self, latex: str) -> Dict[str, Any]:
+        return self.validate_many([latex])[0]
+
+    def validate_many(self, latexes: List[str]) -> List[Dict[str, Any]]:
+        """Results in input order; identical strings are parsed once."""
+        keys = []
+        for latex in latexes:
+            clean = normalize_latex(latex)
+            keys.append(_cache_key(clean) if clean else None)
+        results: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in keys:
+                if key is None or key in results or key in missing:
+                    continue
+                hit = self._cache.get(key)
+                if hit is not None:
+                    self._cache.move_to_end(key)
+                    self._hits += 1
+                    results[key] = hit
+                else:
+                    self._misses += 1
+                    missing.append(key)
+        cacheable = []
+        for key, (res, final) in zip(missing, self._parse(missing)):
+            results[key] = res
+            if final:
+                cacheable.append(key)
+        if cacheable:
+            with self._lock:
+                for key in cacheable:
+                    self._cache[key] = results[key]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [
+            {"ok": False, "errors": ["Empty string"]} if key is None else dict(results[key])
+            for key in keys
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "cached": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+                "timeouts": self._timeouts,
+                "pool_restarts": self._restarts,
+            }
+
+    def warm(self) -> None:
+        """Start the pool and have each worker import the parser (no timeout applies)."""
+        if self.workers == 0:
+            _validate_clean("x")
+            return
+        with self._lock:
+            pool, _ = self._get_pool()
+        pool.map(_validate_clean, ["x"] * self.workers, chunksize=1)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+    def _get_pool(self):
+        # caller holds self._lock
+        if self._pool is None:
+            self._pool = multiprocessing.get_context("spawn").Pool(self.workers)
+            self._pool_started = time.monotonic()
+            self._generation += 1
+        return self._pool, self._generation
+
+    def _restart(self, generation: int) -> None:
+        with self._lock:
+            # several waiters may time out on the same stuck pool: kill it once
+            if self._pool is not None and self._generation == generation:
+                self._pool.terminate()
+                self._pool = None
+                self._restarts += 1
+
+    def _parse(self, items: List[str]) -> List[Tuple[Dict[str, Any], bool]]:
+        """(result, cacheable) per item; timeouts and worker failures are not cacheable."""
+        if not items:
+            return []
+        with timed("validate", items=len(items)):
+            if self.workers == 0:
+                return [(_validate_clean(s), True) for s in items]
+            out: List[Tuple[Dict[str, Any], bool]] = []
+            # waves of `workers` items, so each item gets its own timeout budget
+            for start in range(0, len(items), self.workers):
+                out.extend(self._parse_wave(items[start:start + self.workers]))
+            return out
+
+    def _parse_wave(self, wave: List[str], retry: bool = True) -> List[Tuple[Dict[str, Any], bool]]:
+        with self._lock:
+            pool, generation = self._get_pool()
+            # a cold pool is still spawning and importing: that is not the item's fault
+            deadline = max(time.monotonic(), self._pool_started + self.start_grace) + self.timeout
+        try:
+            pending = [pool.apply_async(_validate_clean, (s,)) for s in wave]
+        except ValueError as e:
+            # "Pool not running": another caller's _restart terminated it
+            # between _get_pool and here; drop it and go again on a fresh one
+            self._restart(generation)
+            if retry:
+                return self._parse_wave(wave, retry=False)
+            logger.warning(f"Validation pool unavailable: {e}")
+            return [({"ok": False, "errors": [f"Validation pool unavailable: {e}"]}, False) for _ in wave]
+        out: List[Optional[Tuple[Dict[str, Any], bool]]] = []
+        timed_out = False
+        for s, res in zip(wave, pending):
+            try:
+                out.append((res.get(max(0.0, deadline - time.monotonic())), True))
+            except multiprocessing.TimeoutError:
+                out.append(None)
+                timed_out = True
+            except Exception as e:
+                out.append(({"ok": False, "errors": [str(e)]}, False))
+        if timed_out:
+            with self._lock:
+                # another caller restarted the pool under us: our items were
+                # collateral, not slow, so run them again once
+                killed_elsewhere = self._generation != generation or self._pool is not pool
+            if killed_elsewhere and retry:
+                redo = [s for s, r in zip(wave, out) if r is None]
+                again = iter(self._parse_wave(redo, retry=False))
+                return [r if r is not None else next(again) for r in out]
+            self._restart(generation)
+            for i, r in enumerate(out):
+                if r is None:
+                    with self._lock:
+                        self._timeouts += 1
+                    logger.warning(f"Validation timed out after {self.timeout}s: {wave[i][:80]!r}")
+                    out[i] = ({"ok": False, "errors": [f"Validation timed out after {self.timeout:g}s"]}, False)
+        return out
+
+
+validator = Validator(
+    workers=VALIDATE_WORKERS, timeout=VALIDATE_TIMEOUT, cache_size=VALIDATE_CACHE_SIZE, start_grace=VALIDATE_START_GRACE
+)
+
+def validate_latex(latex: str) -> Dict[str, Any]:
+    return validator.validate(latex)
+
+def validate_many(latexes: List[str]) -> List[Dict[str, Any]]:
+    return validator.validate_many(latexes)
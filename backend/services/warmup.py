@@ -0,0 +1,112 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+logger = logging.getLogger("warmup")
+
+
+class Warmup:
+    """
+    Named start-up steps (imports, model loads, pool starts) that would
+    otherwise run on the first request needing them.
+
+    start() runs the requested steps in order on a background thread, so the
+    server accepts requests (and answers /healthz) at once; ready() turns true
+    when they have all finished, successfully or not. preload() runs the
+    fork-safe steps inline, for servers that import the app once and fork
+    workers from it (gunicorn --preload): those workers then share the loaded
+    pages copy-on-write. Steps that start threads or process pools are not
+    fork-safe: preload() runs only their before_fork part (e.g. loading
+    weights without a forward pass, which would start torch's thread pools in
+    the master), leaves them "preloaded", and a later run() in each worker
+    finishes them.
+    """
+    def __init__(self):
+        self._steps: "OrderedDict[str, Tuple[Callable[[], Any], bool, Optional[Callable[[], Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def register(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        fork_safe: bool = True,
+        before_fork: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """before_fork: the fork-safe part of a step that is not, run by preload()."""
+        self._steps[name] = (fn, fork_safe, before_fork)
+
+    def resolve(self, spec: str) -> List[str]:
+        """'all', or a comma-separated list of step names (unknown names are logged and ignored)."""
+        names = [n.strip() for n in spec.split(",") if n.strip()]
+        if "all" in names:
+            return list(self._steps)
+        for n in names:
+            if n not in self._steps:
+                logger.warning(f"Unknown warm-up step '{n}' (known: {', '.join(self._steps)})")
+        return [n for n in self._steps if n in names]
+
+    def run(self, names: List[str]) -> None:
+        self._run(names, before_fork=False)
+
+    def _run(self, names: List[str], before_fork: bool) -> None:
+        with self._lock:
+            for name in names:
+                self._state.setdefault(name, {"status": "pending"})
+        # a "preloaded" step still has its fork-unsafe part to run
+        skip = ("running", "done", "preloaded") if before_fork else ("running", "done")
+        for name in names:
+            with self._lock:
+                if self._state[name]["status"] in skip:
+                    continue
+                self._state[name] = {"status": "running"}
+            t0 = time.perf_counter()
+            fn, _, part = self._steps[name]
+            try:
+                result = (part if before_fork else fn)()
+                state = {"status": "preloaded" if before_fork else "done", "result": result}
+            except Exception as e:
+                logger.error(f"Warm-up step '{name}' failed: {e}")
+                state = {"status": "failed", "error": str(e)}
+            state["seconds"] = round(time.perf_counter() - t0, 3)
+            with self._lock:
+                self._state[name] = state
+            logger.info(f"Warm-up step '{name}' {state['status']} in {state['seconds']}s")
+
+    def start(self, names: List[str]) -> Optional[threading.Thread]:
+        if not names:
+            return None
+        with self._lock:
+            for name in names:
+                if self._state.get(name, {}).get("status") in (None, "preloaded"):
+                    self._state[name] = {"status": "pending"}
+        self._thread = threading.Thread(target=self.run, args=(names,), name="warmup", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def preload(self, names: List[str]) -> None:
+        safe = [n for n in names if self._steps[n][1]]
+        split = [n for n in names if not self._steps[n][1] and self._steps[n][2] is not None]
+        for n in names:
+            if n not in safe and n not in split:
+                logger.warning(f"Warm-up step '{n}' starts threads or processes; use WARMUP for it, not PRELOAD")
+        self.run(safe)
+        self._run(split, before_fork=True)
+
+    def ready(self) -> bool:
+        with self._lock:
+            return all(s["status"] in _FINISHED for s in self._state.values())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = {name: dict(s) for name, s in self._state.items()}
+        return {"ready": all(s["status"] in _FINISHED for s in steps.values()), "steps": steps}
+
+
+_FINISHED = ("done", "failed", "preloaded")
+
+
+warmup = Warmup()
@@ -1,34 +1,125 @@
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
 import json
-import shutil
+import logging
+import os
+import sqlite3
+import threading
+import uuid
 from datetime import datetime
 
 from .schemas import EquationRecord
+from .services.fileio import atomic_write, paper_lock
+from .services.metrics import timed
+from .services.search import search_index
 
-def _maybe_backup_profile_file(profile_dir: Path, fname: str = "equations.jsonl"):
-    src = profile_dir / fname
-    if not src.exists():
-        return None
-    history_dir = profile_dir / "history"
-    history_dir.mkdir(parents=True, exist_ok=True)
-    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    dst = history_dir / f"{fname}.bak.{ts}"
-    # copy file preserving metadata
-    shutil.copy2(src, dst)
-    return dst
+logger = logging.getLogger("storage")
 
-def equations_path(root: Path, paper_id: str) -> Path:
-    d = root / paper_id
-    d.mkdir(parents=True, exist_ok=True)
-    return d / "equations.jsonl"
+# Each paper's equations live in PROFILES_ROOT/<paper_id>/equations.sqlite
+# (WAL mode): upserts and deletes touch one row instead of rewriting the
+# whole profile. equations.jsonl stays the interchange format: it is imported
+# on first use (and re-imported if something else rewrites it) and can be
+# regenerated with export_jsonl(). Rewriting it is O(equations), so saves do
+# not: papers written to are exported by flush_exports() on shutdown, or in
+# the background JSONL_EXPORT_DELAY seconds after a burst of writes when that
+# is set to 0 or more (off by default). Re-imports are reconciled:
+# jsonl_baseline holds a digest of each line as the backend last wrote or read
+# it, and only lines that differ from it (edited or added by someone else)
+# are upserted. A stale copy of the file therefore cannot bring back deleted
+# equations or undo edits made through the API.
+#
+# Writes go through _Store.write(): concurrent callers queue their change and
+# whichever thread gets the store lock commits everything queued in a single
+# transaction (group commit), so a burst of saves costs one fsync. SQLite
+# serializes writers across processes; paper_lock() (in-process lock plus an
+# advisory file lock) additionally guards read-check-write sequences such as
+# duplicate checks and JSONL import/export when several workers share
+# PROFILES_ROOT.
+#
+# After each commit the changed equations are pushed to the corpus search
+# index (services/search.py, PROFILES_ROOT/search.sqlite). A push that fails
+# or finds the index at another revision re-indexes the whole paper instead;
+# reindex_profiles() catches up profiles changed while no API was running.
 
+DB_NAME = "equations.sqlite"
+JSONL_NAME = "equations.jsonl"
+HISTORY_PER_EQUATION = int(os.getenv("HISTORY_PER_EQUATION", "20"))
+MAX_OPEN_STORES = int(os.getenv("MAX_OPEN_STORES", "64"))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+JSONL_EXPORT_DELAY = float(os.getenv("JSONL_EXPORT_DELAY", "-1"))  # < 0: export on shutdown or request only
 
-def read_equations(root: Path, paper_id: str) -> List[Dict[str, Any]]:
-    p = equations_path(root, paper_id)
-    if not p.exists():
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS equations (
+    seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+    eq_uid  TEXT NOT NULL UNIQUE,
+    record  TEXT NOT NULL,
+    rev     INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS equation_pages (
+    page    INTEGER NOT NULL,
+    eq_uid  TEXT NOT NULL,
+    PRIMARY KEY (page, eq_uid)
+);
+CREATE TABLE IF NOT EXISTS tombstones (
+    eq_uid  TEXT PRIMARY KEY,
+    rev     INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    eq_uid  TEXT NOT NULL,
+    op      TEXT NOT NULL,
+    record  TEXT,
+    ts      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_eq_uid ON history (eq_uid, id);
+CREATE TABLE IF NOT EXISTS jsonl_baseline (
+    eq_uid  TEXT PRIMARY KEY,
+    digest  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key     TEXT PRIMARY KEY,
+    value   TEXT
+);
+"""
+SCHEMA_VERSION = 2
+
+
+def _dumps(obj: Dict[str, Any]) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+def _record_json(rec: EquationRecord) -> str:
+    # Pydantic v2 or v1 compatible JSON serialization
+    try:
+        # v2 path: dump to dict then json.dumps to control ensure_ascii
+        return _dumps(rec.model_dump())
+    except AttributeError:
+        # v1 path: use .json with ensure_ascii
+        return rec.json(ensure_ascii=False)
+
+def _record_pages(record_json: str) -> List[int]:
+    try:
+        rec = json.loads(record_json)
+    except json.JSONDecodeError:
         return []
-    out: List[Dict[str, Any]] = []
+    boxes = rec.get("boxes") if isinstance(rec, dict) else None
+    return sorted({b["page"] for b in boxes or [] if isinstance(b, dict) and isinstance(b.get("page"), int)})
+
+def _file_signature(p: Path) -> Optional[str]:
+    try:
+        st = p.stat()
+    except FileNotFoundError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _digest(rec: Dict[str, Any]) -> str:
+    return hashlib.sha1(_dumps(rec).encode("utf-8")).hexdigest()
+
+def _jsonl_records(p: Path) -> List[Dict[str, Any]]:
+    """Records of a JSONL profile that have an eq_uid; broken lines are skipped."""
+    out = []
     with p.open("r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
@@ -37,98 +128,615 @@ def read_equations(root: Path, paper_id: str) -> List[Dict[str, Any]]:
             try:
                 rec = json.loads(line)
             except json.JSONDecodeError:
-                # skip broken lines
                 continue
-            if isinstance(rec, dict):
+            if isinstance(rec, dict) and rec.get("eq_uid"):
                 out.append(rec)
     return out
 
 
-def append_equation(root: Path, rec: EquationRecord) -> None:
-    p = equations_path(root, rec.paper_id)
-    # Pydantic v2 or v1 compatible JSON serialization
-    try:
-        # v2 path: dump to dict then json.dumps to control ensure_ascii
-        payload = json.dumps(rec.model_dump(), ensure_ascii=False)
-    except AttributeError:
-        # v1 path: use .json with ensure_ascii
-        payload = rec.json(ensure_ascii=False)
-    with p.open("a", encoding="utf-8") as f:
-        f.write(payload + "\n")
+class _Store:
+    """One paper's SQLite database; every statement runs under self.lock."""
+    def __init__(self, root: Path, paper_id: str):
+        self.root = root
+        self.paper_id = paper_id
+        self.dir = root / paper_id
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            str(self.dir / DB_NAME), timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: a commit is fsynced before write() returns (NORMAL could lose
+        # the last commits on power loss); group commit amortizes the fsync
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(_SCHEMA)
+        # eq_uids written by the open transaction, and the revision it started from
+        self._touched: set = set()
+        self._base: Optional[int] = None
+        self._migrate()
+        self._pending_lock = threading.Lock()
+        self._pending: List[Tuple[Callable[["_Store"], Any], Future]] = []
+        self.writes = 0
+        self.flushes = 0
+        self.sync_from_jsonl()
+
+    def _migrate(self) -> None:
+        # v1: databases created before revisions existed: add rev, index pages
+        # v2: seed jsonl_baseline from an equations.jsonl that is already imported
+        with self.lock:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
+            with self.transaction():
+                cols = [r[1] for r in self.conn.execute("PRAGMA table_info(equations)")]
+                if "rev" not in cols:
+                    self.conn.execute("ALTER TABLE equations ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS equations_rev ON equations (rev)")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS tombstones_rev ON tombstones (rev)")
+                self.conn.execute("DELETE FROM equation_pages")
+                for eq_uid, raw in self.conn.execute("SELECT eq_uid, record FROM equations").fetchall():
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO equation_pages (page, eq_uid) VALUES (?, ?)",
+                        [(page, eq_uid) for page in _record_pages(raw)],
+                    )
+                if self._meta("epoch") is None:
+                    # distinguishes a recreated database whose revisions restart at 0
+                    self._set_meta("epoch", uuid.uuid4().hex[:8])
+                src = self.dir / JSONL_NAME
+                sig = _file_signature(src)
+                if sig is not None and sig == self._meta("jsonl_signature"):
+                    self._set_baseline(_jsonl_records(src))
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def write(self, op: Callable[["_Store"], Any]) -> Any:
+        """
+        Run op(store) in a write transaction, committed together with any
+        other writes queued meanwhile; returns op's result once durable.
+        An op that raises is rolled back alone.
+        """
+        fut: Future = Future()
+        with self._pending_lock:
+            self._pending.append((op, fut))
+        flushed = None
+        with self.lock:
+            if not fut.done():
+                flushed = self._flush()
+        if flushed is not None:
+            # indexing runs outside the store lock, so the next group commit
+            # can proceed; results are handed out once the index has them
+            outcomes, changes = flushed
+            self._publish(changes)
+            for f, result, error in outcomes:
+                if error is not None:
+                    f.set_exception(error)
+                else:
+                    f.set_result(result)
+        return fut.result()
+
+    def _flush(self):
+        # caller holds self.lock; returns the (future, result, error) outcomes
+        # and the committed changes for _publish(), or None
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return None
+        outcomes = []
+        with timed("storage_write", items=len(batch)):
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                for op, fut in batch:
+                    self.conn.execute("SAVEPOINT op")
+                    try:
+                        outcomes.append((fut, op(self), None))
+                    except Exception as e:
+                        self.conn.execute("ROLLBACK TO op")
+                        outcomes.append((fut, None, e))
+                    finally:
+                        self.conn.execute("RELEASE op")
+                self.conn.execute("COMMIT")
+            except Exception as e:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                self._take_changes()
+                for _, fut in batch:
+                    fut.set_exception(e)
+                return None
+        self.writes += len(batch)
+        self.flushes += 1
+        _schedule_export(self)
+        return outcomes, self._take_changes()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def sync_from_jsonl(self) -> int:
+        """
+        Import equations.jsonl if it changed since we last imported or
+        exported it (first open of an existing profile, or an external tool
+        such as the equation_scribe CLI rewrote it). Only lines that differ
+        from the baseline (what the backend last wrote or read) are upserted,
+        by eq_uid; lines missing from the file delete nothing. Returns how
+        many records were imported.
+        """
+        src = self.dir / JSONL_NAME
+        sig = _file_signature(src)
+        with self.lock:
+            if sig is None or sig == self._meta("jsonl_signature"):
+                return 0
+        with paper_lock(self.root, self.paper_id), self.transaction():
+            # another worker may have imported it while we waited
+            sig = _file_signature(src)
+            if sig is None or sig == self._meta("jsonl_signature"):
+                return 0
+            records = _jsonl_records(src)
+            baseline = dict(self.conn.execute("SELECT eq_uid, digest FROM jsonl_baseline"))
+            n = 0
+            for rec in records:
+                if baseline.get(rec["eq_uid"]) == _digest(rec):
+                    # unchanged since we exported (or imported) it: the database is as new or newer
+                    continue
+                self.upsert(rec["eq_uid"], _dumps(rec), history=False)
+                n += 1
+            self._set_baseline(records)
+            self._set_meta("jsonl_signature", sig)
+            return n
+
+    def _set_baseline(self, records: List[Dict[str, Any]]) -> None:
+        self._set_digests([(rec["eq_uid"], _digest(rec)) for rec in records])
+
+    def _set_digests(self, digests: List[Tuple[str, str]]) -> None:
+        # caller is inside a write transaction
+        self.conn.execute("DELETE FROM jsonl_baseline")
+        self.conn.executemany("INSERT OR REPLACE INTO jsonl_baseline (eq_uid, digest) VALUES (?, ?)", digests)
+
+    def transaction(self):
+        return _Transaction(self)
+
+    def revision(self) -> int:
+        return int(self._meta("revision") or 0)
+
+    def _bump(self) -> int:
+        # caller is inside a write transaction
+        rev = self.revision() + 1
+        if self._base is None:
+            self._base = rev - 1
+        self._set_meta("revision", str(rev))
+        return rev
+
+    def upsert(self, eq_uid: str, record_json: str, history: bool = True) -> int:
+        """Insert or replace eq_uid; returns the paper's new revision."""
+        if history:
+            self._record_history(eq_uid, "update")
+        rev = self._bump()
+        self.conn.execute(
+            "INSERT INTO equations (eq_uid, record, rev) VALUES (?, ?, ?) "
+            "ON CONFLICT(eq_uid) DO UPDATE SET record = excluded.record, rev = excluded.rev",
+            (eq_uid, record_json, rev),
+        )
+        self._touched.add(eq_uid)
+        self.conn.execute("DELETE FROM equation_pages WHERE eq_uid = ?", (eq_uid,))
+        self.conn.executemany(
+            "INSERT INTO equation_pages (page, eq_uid) VALUES (?, ?)",
+            [(page, eq_uid) for page in _record_pages(record_json)],
+        )
+        self.conn.execute("DELETE FROM tombstones WHERE eq_uid = ?", (eq_uid,))
+        return rev
+
+    def delete(self, eq_uid: str) -> Optional[int]:
+        """Remove eq_uid; returns the new revision, or None if it did not exist."""
+        self._record_history(eq_uid, "delete")
+        cur = self.conn.execute("DELETE FROM equations WHERE eq_uid = ?", (eq_uid,))
+        if cur.rowcount == 0:
+            return None
+        rev = self._bump()
+        self._touched.add(eq_uid)
+        self.conn.execute("DELETE FROM equation_pages WHERE eq_uid = ?", (eq_uid,))
+        self.conn.execute(
+            "INSERT INTO tombstones (eq_uid, rev) VALUES (?, ?) ON CONFLICT(eq_uid) DO UPDATE SET rev = excluded.rev",
+            (eq_uid, rev),
+        )
+        return rev
+
+    def _record_history(self, eq_uid: str, op: str) -> None:
+        # keep the previous version of the row, bounded per equation
+        row = self.conn.execute("SELECT record FROM equations WHERE eq_uid = ?", (eq_uid,)).fetchone()
+        if row is None or HISTORY_PER_EQUATION <= 0:
+            return
+        ts = datetime.utcnow().strftime("%Y%m%dT%H%M%S.%fZ")
+        self.conn.execute(
+            "INSERT INTO history (eq_uid, op, record, ts) VALUES (?, ?, ?, ?)", (eq_uid, op, row[0], ts)
+        )
+        self.conn.execute(
+            "DELETE FROM history WHERE eq_uid = ? AND id NOT IN "
+            "(SELECT id FROM history WHERE eq_uid = ? ORDER BY id DESC LIMIT ?)",
+            (eq_uid, eq_uid, HISTORY_PER_EQUATION),
+        )
+
+    def _take_changes(self) -> Tuple[set, Optional[int], int]:
+        """(eq_uids touched, revision before, revision after) of the transaction just ended; resets them."""
+        # caller holds self.lock
+        changes = (self._touched, self._base, self.revision())
+        self._touched, self._base = set(), None
+        return changes
+
+    def _publish(self, changes: Tuple[set, Optional[int], int]) -> None:
+        """Push a committed transaction's changes to the search index. Called without self.lock held."""
+        touched, base, committed = changes
+        if not touched:
+            return
+        try:
+            if len(touched) > 500:
+                self.publish_all()
+                return
+            with self.lock:
+                self.conn.execute("BEGIN")
+                try:
+                    epoch, revision = self._meta("epoch") or "", self.revision()
+                    marks = ",".join("?" * len(touched))
+                    records: Dict[str, Optional[Dict[str, Any]]] = {u: None for u in touched}
+                    for eq_uid, raw in self.conn.execute(
+                        f"SELECT eq_uid, record FROM equations WHERE eq_uid IN ({marks})", tuple(touched)
+                    ):
+                        records[eq_uid] = json.loads(raw)
+                finally:
+                    self.conn.execute("COMMIT")
+            if revision != committed:
+                # later commits landed: their push starts from `committed`, finds the
+                # index elsewhere and re-indexes the whole paper, covering this one
+                return
+            if not search_index(self.root).apply(self.paper_id, epoch, revision, records, base=base):
+                self.publish_all()
+        except Exception as e:
+            # the index stays at its old revision; the next push re-indexes the paper
+            logger.warning(f"Search index update for '{self.paper_id}' failed: {e}")
+
+    def publish_all(self) -> int:
+        """Re-index every equation of the paper from one snapshot; returns how many."""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                epoch, revision = self._meta("epoch") or "", self.revision()
+                records = {rec["eq_uid"]: rec for _, rec in self.records() if rec.get("eq_uid")}
+            finally:
+                self.conn.execute("COMMIT")
+        search_index(self.root).apply(self.paper_id, epoch, revision, records)
+        return len(records)
+
+    def records(self, where: str = "", args: Tuple = (), limit: Optional[int] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """(seq, record) pairs in insertion order; where/args filter the equations table (alias e)."""
+        sql = f"SELECT e.seq, e.record FROM equations e {where} ORDER BY e.seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args = tuple(args) + (limit,)
+        out: List[Tuple[int, Dict[str, Any]]] = []
+        for seq, raw in self.conn.execute(sql, args):
+            try:
+                rec = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(rec, dict):
+                out.append((seq, rec))
+        return out
+
+
+class _Transaction:
+    def __init__(self, store: _Store):
+        self.store = store
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        self.store.conn.execute("BEGIN IMMEDIATE")
+        return self.store
+
+    def __exit__(self, exc_type, exc, tb):
+        changes = None
+        try:
+            self.store.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            changes = self.store._take_changes()
+        finally:
+            self.store.lock.release()
+        if changes is not None and not exc_type:
+            self.store._publish(changes)
+        return False
+
+
+_stores_lock = threading.Lock()
+_stores: "OrderedDict[str, _Store]" = OrderedDict()
+
+def _store(root: Path, paper_id: str) -> _Store:
+    d = root / paper_id
+    key = str(d.resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is not None:
+            _stores.move_to_end(key)
+            return store
+    d.mkdir(parents=True, exist_ok=True)
+    store = _Store(root, paper_id)
+    with _stores_lock:
+        existing = _stores.get(key)
+        if existing is not None:
+            return existing
+        _stores[key] = store
+        while len(_stores) > MAX_OPEN_STORES:
+            # not closed here: a thread may still be using it; the connection
+            # closes when the last reference goes away
+            _stores.popitem(last=False)
+    return store
+
 
-def update_equation(root: Path, paper_id: str, eq_uid: str, new_record: Dict[str, Any]) -> None:
+def equations_path(root: Path, paper_id: str) -> Path:
+    d = root / paper_id
+    d.mkdir(parents=True, exist_ok=True)
+    return d / JSONL_NAME
+
+
+@timed("storage_read")
+def read_equations(root: Path, paper_id: str, pages: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+    """Every record, or with pages only those with a box on one of them (through equation_pages)."""
+    store = _store(root, paper_id)
+    store.sync_from_jsonl()
+    where, args = "", ()
+    if pages is not None:
+        args = tuple(sorted(set(pages)))
+        if not args:
+            return []
+        where = f"WHERE e.eq_uid IN (SELECT eq_uid FROM equation_pages WHERE page IN ({', '.join('?' * len(args))}))"
+    with store.lock:
+        return [rec for _, rec in store.records(where, args)]
+
+
+def equations_revision(root: Path, paper_id: str) -> Tuple[str, int]:
+    """(epoch, revision) of the paper's equations; changes on every write."""
+    store = _store(root, paper_id)
+    store.sync_from_jsonl()
+    with store.lock:
+        return store._meta("epoch") or "", store.revision()
+
+
+@timed("storage_read")
+def query_equations(
+    root: Path,
+    paper_id: str,
+    since: Optional[int] = None,
+    page: Optional[int] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Filtered, paginated read from one consistent snapshot.
+
+    since:  only records changed after that revision, plus the eq_uids deleted
+            since then ("deleted", reported on the first page only)
+    page:   only records with a box on that page (current boxes; an equation
+            moved off the page is not reported by a page-filtered delta)
+    cursor: the "next_cursor" of the previous response; limit: page size
+
+    Returns {"items", "revision", "epoch", "next_cursor"[, "deleted"]}.
+    """
+    store = _store(root, paper_id)
+    store.sync_from_jsonl()
+    joins, conds, args = "", [], []
+    if page is not None:
+        joins = "JOIN equation_pages p ON p.eq_uid = e.eq_uid"
+        conds.append("p.page = ?")
+        args.append(page)
+    if since is not None:
+        conds.append("e.rev > ?")
+        args.append(since)
+    if cursor is not None:
+        conds.append("e.seq > ?")
+        args.append(cursor)
+    where = joins + (" WHERE " + " AND ".join(conds) if conds else "")
+    with store.lock:
+        store.conn.execute("BEGIN")
+        try:
+            revision = store.revision()
+            # one row past the page tells whether there is a next one
+            rows = store.records(where, tuple(args), None if limit is None else limit + 1)
+            deleted = None
+            if since is not None and cursor is None:
+                deleted = [u for (u,) in store.conn.execute(
+                    "SELECT eq_uid FROM tombstones WHERE rev > ? ORDER BY rev", (since,)
+                )]
+            epoch = store._meta("epoch") or ""
+        finally:
+            store.conn.execute("COMMIT")
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0]
+    out = {"items": [rec for _, rec in rows], "revision": revision, "epoch": epoch, "next_cursor": next_cursor}
+    if deleted is not None:
+        out["deleted"] = deleted
+    return out
+
+
+def append_equation(root: Path, rec: EquationRecord) -> int:
+    """Insert rec (replacing any record with the same eq_uid); returns the new revision."""
+    store = _store(root, rec.paper_id)
+    raw = _record_json(rec)
+    return store.write(lambda s: s.upsert(rec.eq_uid, raw))
+
+def append_equations(root: Path, paper_id: str, recs: List[EquationRecord]) -> Optional[int]:
+    """append_equation for many records in one transaction."""
+    if not recs:
+        return None
+    store = _store(root, paper_id)
+    rows = [(rec.eq_uid, _record_json(rec)) for rec in recs]
+    def op(s: _Store) -> int:
+        return max(s.upsert(eq_uid, raw) for eq_uid, raw in rows)
+    return store.write(op)
+
+def update_equation(root: Path, paper_id: str, eq_uid: str, new_record: Dict[str, Any]) -> int:
     """
-    Replace an existing equation record (matching eq_uid) in the JSONL file.
+    Replace an existing equation record (matching eq_uid).
     If no matching eq_uid is found, append the new_record.
+    The previous version is kept in the history table.
+    Returns the new revision.
     """
-    p = equations_path(root, paper_id)
-    # backup current state before rewrite
-    paper_dir = p.parent
-    _maybe_backup_profile_file(paper_dir)
-    if not p.exists():
-        # Just append if file doesn't exist yet
-        with p.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(new_record, ensure_ascii=False) + "\n")
-        return
-
-    lines = []
-    replaced = False
-    with p.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                lines.append(line)
-                continue
-            if obj.get("eq_uid") == eq_uid:
-                lines.append(json.dumps(new_record, ensure_ascii=False))
-                replaced = True
-            else:
-                lines.append(json.dumps(obj, ensure_ascii=False))
+    store = _store(root, paper_id)
+    raw = _dumps(new_record)
+    return store.write(lambda s: s.upsert(eq_uid, raw))
 
-    if not replaced:
-        lines.append(json.dumps(new_record, ensure_ascii=False))
+def delete_equation(root: Path, paper_id: str, eq_uid: str) -> Optional[int]:
+    """
+    Remove the equation record with eq_uid for paper_id.
+    Returns the new revision, or None if not found.
+    """
+    store = _store(root, paper_id)
+    return store.write(lambda s: s.delete(eq_uid))
 
-    with p.open("w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + "\n")
 
-def delete_equation(root: Path, paper_id: str, eq_uid: str) -> bool:
+def apply_equation_ops(
+    root: Path, paper_id: str, ops: List[Tuple[str, str, Optional[Dict[str, Any]]]]
+) -> Tuple[int, List[Optional[int]]]:
     """
-    Remove the equation record with eq_uid from the JSONL file for paper_id.
-    Returns True if an equation was removed, False if not found.
+    Apply ("upsert", eq_uid, record) and ("delete", eq_uid, None) operations
+    in order, in one transaction: all of them or none. Returns the paper's
+    revision afterwards and, per op, the revision it produced (None for a
+    delete of an unknown eq_uid).
     """
-    p = equations_path(root, paper_id)
-    # backup current state before delete
-    paper_dir = p.parent
-    _maybe_backup_profile_file(paper_dir)
-    if not p.exists():
-        return False
+    store = _store(root, paper_id)
+    rows = [(kind, eq_uid, _dumps(record) if kind == "upsert" else None) for kind, eq_uid, record in ops]
+    def op(s: _Store) -> Tuple[int, List[Optional[int]]]:
+        revs = [s.upsert(eq_uid, raw) if kind == "upsert" else s.delete(eq_uid) for kind, eq_uid, raw in rows]
+        return s.revision(), revs
+    return store.write(op)
 
-    lines = []
-    removed = False
-    with p.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                # keep malformed lines unchanged
-                lines.append(line)
-                continue
-            if obj.get("eq_uid") == eq_uid:
-                removed = True
-                # skip this line (delete)
-            else:
-                lines.append(json.dumps(obj, ensure_ascii=False))
 
-    if not removed:
-        return False
+def equation_history(root: Path, paper_id: str, eq_uid: str) -> List[Dict[str, Any]]:
+    """Previous versions of eq_uid, newest first."""
+    store = _store(root, paper_id)
+    with store.lock:
+        rows = store.conn.execute(
+            "SELECT op, record, ts FROM history WHERE eq_uid = ? ORDER BY id DESC", (eq_uid,)
+        ).fetchall()
+    return [{"op": op, "ts": ts, "record": json.loads(raw) if raw else None} for op, raw, ts in rows]
+
+
+def export_jsonl(root: Path, paper_id: str, dest: Optional[Path] = None) -> Path:
+    """
+    Write the paper's equations as JSONL (default: its equations.jsonl),
+    atomically. Exporting in place does not trigger a re-import and resets
+    the baseline later imports are reconciled against.
+    """
+    store = _store(root, paper_id)
+    dest = Path(dest) if dest else store.dir / JSONL_NAME
+    with paper_lock(root, paper_id):
+        store.sync_from_jsonl()
+        with store.transaction():
+            rows = store.conn.execute("SELECT eq_uid, record FROM equations ORDER BY seq").fetchall()
+            atomic_write(dest, "".join(raw + "\n" for _, raw in rows))
+            if dest == store.dir / JSONL_NAME:
+                store._set_meta("jsonl_signature", _file_signature(dest))
+                # rows are stored as _dumps(record), so hashing the raw line
+                # equals _digest() of it re-read, without parsing every row
+                store._set_digests([(eq_uid, hashlib.sha1(raw.encode("utf-8")).hexdigest()) for eq_uid, raw in rows])
+    return dest
+
+
+# stores written to since their equations.jsonl was last exported, with the
+# background export timer when JSONL_EXPORT_DELAY >= 0
+_exports_lock = threading.Lock()
+_exports: Dict[_Store, Optional[threading.Timer]] = {}
+
+def _schedule_export(store: _Store) -> None:
+    with _exports_lock:
+        if store in _exports:
+            return
+        timer = None
+        if JSONL_EXPORT_DELAY >= 0:
+            timer = threading.Timer(JSONL_EXPORT_DELAY, _run_export, (store,))
+            timer.daemon = True
+        _exports[store] = timer
+    if timer is not None:
+        timer.start()
+
+def _run_export(store: _Store) -> None:
+    with _exports_lock:
+        _exports.pop(store, None)
+    try:
+        export_jsonl(store.root, store.paper_id)
+    except Exception as e:
+        # the database stays authoritative; the next write schedules another export
+        logger.warning(f"Exporting {JSONL_NAME} for '{store.paper_id}' failed: {e}")
+
+def flush_exports() -> int:
+    """Export equations.jsonl for every paper written to since its last export (e.g. on shutdown); returns how many ran."""
+    with _exports_lock:
+        pending = list(_exports.items())
+        _exports.clear()
+    for store, timer in pending:
+        if timer is not None:
+            timer.cancel()
+        _run_export(store)
+    return len(pending)
+
+
+def write_stats(root: Path, paper_id: str) -> Dict[str, int]:
+    """Writes committed and transactions used for them (writes / flushes = coalescing factor)."""
+    store = _store(root, paper_id)
+    return {"writes": store.writes, "flushes": store.flushes}
+
+
+def migrate_profiles(root: Path) -> List[Tuple[str, int]]:
+    """One-shot import of every PROFILES_ROOT/<paper_id>/equations.jsonl; returns (paper_id, records read)."""
+    out = []
+    for src in sorted(Path(root).glob(f"*/{JSONL_NAME}")):
+        paper_id = src.parent.name
+        out.append((paper_id, _store(root, paper_id).sync_from_jsonl()))
+    return out
+
+
+def reindex_profiles(root: Path, full: bool = False) -> List[Tuple[str, int]]:
+    """
+    Bring the corpus search index in line with every profile under root:
+    re-index papers whose revision differs from the indexed one (all papers
+    with full=True) and drop papers that no longer exist. Returns
+    (paper_id, equations indexed) for each paper it touched.
+    """
+    root = Path(root)
+    index = search_index(root)
+    papers = sorted({p.parent.name for name in (DB_NAME, JSONL_NAME) for p in root.glob(f"*/{name}")})
+    out = []
+    for paper_id in papers:
+        # opening the store imports a changed equations.jsonl (and pushes it)
+        store = _store(root, paper_id)
+        store.sync_from_jsonl()
+        with store.lock:
+            state = (store._meta("epoch") or "", store.revision())
+        if full or index.paper_state(paper_id) != state:
+            out.append((paper_id, store.publish_all()))
+    for paper_id in sorted(set(index.papers()) - set(papers)):
+        index.drop_paper(paper_id)
+        out.append((paper_id, 0))
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Equation profile storage maintenance")
+    ap.add_argument("command", choices=["migrate", "export", "reindex"])
+    ap.add_argument("--root", default=os.getenv("PROFILES_ROOT", "data/profiles"))
+    ap.add_argument("--paper-id", help="export a single paper (default: all)")
+    ap.add_argument("--full", action="store_true", help="reindex: rebuild every paper, not only changed ones")
+    args = ap.parse_args()
 
-    with p.open("w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + "\n")
-    return True
+    root = Path(args.root)
+    if args.command == "migrate":
+        for paper_id, n in migrate_profiles(root):
+            print(f"{paper_id}: imported {n} records")
+    elif args.command == "reindex":
+        for paper_id, n in reindex_profiles(root, full=args.full):
+            print(f"{paper_id}: indexed {n} equations")
+    else:
+        papers = [args.paper_id] if args.paper_id else sorted(p.parent.name for p in root.glob(f"*/{DB_NAME}"))
+        for paper_id in papers:
+            print(f"{paper_id}: wrote {export_jsonl(root, paper_id)}")
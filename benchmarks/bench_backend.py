@@ -0,0 +1,514 @@
+"""
+End-to-end backend benchmarks on the bundled SAR paper and synthetic papers/profiles.
+
+    python -m benchmarks.bench_backend [--suites render autodetect storage validate search load]
+                                       [--quick] [--out results.json] [--compare baseline.json]
+
+Runs offline and on CPU: when equation_scribe, best.pt or the recognizer are
+not installed, the stand-ins in benchmarks/stubs.py are used (recorded under
+meta.models; only compare runs made with the same models). Everything runs
+in a temp PROFILES_ROOT/PAPERS_ROOT with memory-only caches, through the
+ASGI app in-process.
+
+The output is one JSON document: "meta" (commit, interpreter, CPU, knobs)
+and "results", a list of {"key", "suite", "name", ... "p50_ms", ...}.
+--compare matches results by key against an earlier run and exits 1 if a p50
+regressed by more than --threshold.
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import stubs
+
+# before any backend import: spawned render/validation workers re-import this
+# module, and need the same stand-ins as the parent
+STUBBED_PACKAGE = stubs.install_equation_scribe()
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+SAMPLE_PDF = REPO_ROOT / "data" / "pdfs" / "Research_on_SAR_Imaging_Simulation_Based_on_Time-Domain_Shooting_and_Bouncing_Ray_Algorithm.pdf"
+SUITES = ("render", "autodetect", "storage", "validate", "search", "load")
+
+# geometry of synthetic equation boxes (PDF points): a 10 x 25 grid of 50 x 25
+# boxes per page, shifted right for every further 250 on the same page
+GRID_COLS, GRID_ROWS = 10, 25
+
+
+# --- helpers ---
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency stats in ms for samples in seconds."""
+    xs = sorted(samples)
+    def q(p):
+        return xs[min(len(xs) - 1, int(round(p * (len(xs) - 1))))]
+    return {
+        "n": len(xs),
+        "mean_ms": round(1000 * sum(xs) / len(xs), 3),
+        "p50_ms": round(1000 * q(0.5), 3),
+        "p95_ms": round(1000 * q(0.95), 3),
+        "min_ms": round(1000 * xs[0], 3),
+        "max_ms": round(1000 * xs[-1], 3),
+    }
+
+def row(suite: str, name: str, samples: List[float], **params) -> Dict[str, Any]:
+    key = f"{suite}/{name}" + "".join(f" {k}={v}" for k, v in sorted(params.items()))
+    return {"key": key, "suite": suite, "name": name, **params, **summarize(samples)}
+
+def timed_calls(fn: Callable[[], Any], n: int) -> List[float]:
+    out = []
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t)
+    return out
+
+def check(resp, *ok: int):
+    if resp.status_code not in (ok or (200,)):
+        raise RuntimeError(f"{resp.request.method} {resp.request.url} -> {resp.status_code}: {resp.text[:200]}")
+    return resp
+
+def make_synthetic_pdf(path: Path, pages: int, equations_per_page: int, seed: int = 0) -> None:
+    """Text pages with display-style equation lines between paragraphs."""
+    import fitz
+    rng = random.Random(seed)
+    words = "the of radar scattering field incident surface model ray bounce range azimuth image".split()
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page(width=612, height=792)
+        y = 60.0
+        step = (792 - 120) / max(1, equations_per_page)
+        for i in range(equations_per_page):
+            for _ in range(2):
+                page.insert_text((72, y), " ".join(rng.choice(words) for _ in range(14)), fontsize=10)
+                y += 13
+            page.insert_text((160, y + 10), f"E_{i} = sum_k a_{p}k x^k + {rng.randint(2, 99)} / (1 + r^2)", fontsize=12)
+            y += step - 26
+    doc.save(str(path))
+    doc.close()
+
+def synthetic_record(paper_id: str, i: int, pages: int):
+    from backend.schemas import EquationRecord
+    page, slot = i % pages, i // pages
+    col, row_, shift = slot % GRID_COLS, (slot // GRID_COLS) % GRID_ROWS, slot // (GRID_COLS * GRID_ROWS)
+    x0, y0 = 40 + 53 * col + 5 * shift, 40 + 28 * row_
+    return EquationRecord(
+        eq_uid=f"syn{i:07d}", paper_id=paper_id, latex=f"x_{{{i}}} = {i % 17}",
+        boxes=[{"page": page, "bbox_pdf": (x0, y0, x0 + 50, y0 + 25)}],
+    )
+
+
+class Context:
+    """Temp data roots, the app (imported after the env is set) and model choices."""
+    def __init__(self, work: Path, args):
+        self.work = work
+        self.args = args
+        env = {
+            "PROFILES_ROOT": str(work / "profiles"),
+            "PAPERS_ROOT": str(work / "pdfs"),
+            "RENDER_CACHE_DIR": "",
+            "RECOGNITION_CACHE_DB": "",
+            "PREFETCH_WORKERS": "0",
+            # keep adjudication crops out of the repo's data/
+            "ADJUDICATION_ROOT": str(work / "adjudicated"),
+        }
+        os.environ.update(env)
+        (work / "pdfs").mkdir(parents=True)
+        shutil.copy(SAMPLE_PDF, work / "pdfs" / "sar.pdf")
+        make_synthetic_pdf(work / "pdfs" / "synthetic.pdf", args.pages, args.equations_per_page)
+
+        from fastapi.testclient import TestClient
+        import backend.main as m
+        from backend.services import recognition
+
+        self.m = m
+        self.models = {"equation_scribe": "stub" if STUBBED_PACKAGE else "installed"}
+        if args.models == "stub" or not m.detector.available:
+            m.detector = stubs.StubDetector(ms_per_page=args.detector_ms)
+            self.models["detector"] = f"stub({args.detector_ms:g}ms/page)"
+        else:
+            self.models["detector"] = m.detector.version
+        if args.models == "stub" or STUBBED_PACKAGE:
+            self.models["recognizer"] = f"stub({args.recognizer_ms:g}ms/crop)"
+            recognition.use_recognizer(stubs.stub_recognizer(args.recognizer_ms), self.models["recognizer"])
+        else:
+            self.models["recognizer"] = recognition.model_version()
+        self.client = TestClient(m.app)
+
+    def add_paper(self, paper_id: str, source: str = "sar") -> str:
+        shutil.copy(self.work / "pdfs" / f"{source}.pdf", self.work / "pdfs" / f"{paper_id}.pdf")
+        return paper_id
+
+    def page_count(self, paper_id: str) -> int:
+        return self.m.page_count(self.m.pdf_path_for(paper_id))
+
+    def close(self) -> None:
+        self.m.drain_background_work()
+
+
+# --- suites ---
+
+def bench_render(ctx: Context) -> List[Dict[str, Any]]:
+    m, c = ctx.m, ctx.client
+    rows = []
+    for paper in ("sar", "synthetic"):
+        pages = range(min(ctx.page_count(paper), ctx.args.render_pages))
+        path = m.pdf_path_for(paper)
+        samples: Dict[str, List[float]] = {k: [] for k in (
+            "document_meta_cold", "document_meta", "page_meta", "image_cold", "image_warm", "image_304", "preview_cold",
+        )}
+        for _ in range(ctx.args.repeat):
+            m.documents.invalidate(path)
+            samples["document_meta_cold"] += timed_calls(lambda: check(c.get(f"/papers/{paper}/meta")), 1)
+            samples["document_meta"] += timed_calls(lambda: check(c.get(f"/papers/{paper}/meta")), 1)
+            m.renders.invalidate(paper)
+            for i in pages:
+                samples["page_meta"] += timed_calls(lambda: check(c.get(f"/papers/{paper}/page/{i}/meta")), 1)
+                t = time.perf_counter()
+                etag = check(c.get(f"/papers/{paper}/page/{i}/image")).headers["etag"]
+                samples["image_cold"].append(time.perf_counter() - t)
+                samples["image_warm"] += timed_calls(lambda: check(c.get(f"/papers/{paper}/page/{i}/image")), 1)
+                samples["image_304"] += timed_calls(
+                    lambda: check(c.get(f"/papers/{paper}/page/{i}/image", headers={"If-None-Match": etag}), 304), 1
+                )
+                samples["preview_cold"] += timed_calls(lambda: check(c.get(f"/papers/{paper}/page/{i}/preview")), 1)
+        rows += [row("render", name, s, paper=paper) for name, s in samples.items()]
+    return rows
+
+
+def stage_totals() -> Dict[str, float]:
+    from backend.services.metrics import STAGE_SECONDS
+    stages = ("pdf_open", "rasterize", "layout", "detect", "recognize", "storage_read", "storage_write")
+    return {s: STAGE_SECONDS.snapshot(stage=s)["sum"] for s in stages}
+
+def bench_autodetect(ctx: Context) -> List[Dict[str, Any]]:
+    m, c = ctx.m, ctx.client
+    rows = []
+    # pool start-up and first imports are not what we want to measure
+    check(c.post(f"/papers/{ctx.add_paper('ad-warmup')}/autodetect_all", json={"end_page": 0}))
+    n = 0
+    for paper in ("sar", "synthetic"):
+        for mode in ("cold", "warm_recognition_cache"):
+            samples, pages, found = [], 0, 0
+            before = stage_totals()
+            for _ in range(ctx.args.repeat):
+                # a fresh copy each run: no manifest, no boxes to dedup against, cold renders
+                pid = ctx.add_paper(f"ad-{paper}-{n}", paper)
+                n += 1
+                if mode == "cold":
+                    m.recognitions.clear()
+                t = time.perf_counter()
+                out = check(c.post(f"/papers/{pid}/autodetect_all", json={})).json()
+                samples.append(time.perf_counter() - t)
+                pages, found = out["pages_scanned"], out["equations_found"]
+            after = stage_totals()
+            r = row("autodetect", mode, samples, paper=paper)
+            p50 = r["p50_ms"] / 1000
+            r.update({
+                "pages": pages,
+                "equations": found,
+                "pages_per_s": round(pages / p50, 2) if p50 else None,
+                "equations_per_s": round(found / p50, 2) if p50 else None,
+                # where the time went, ms per run (stages overlap, so these can sum past the wall time)
+                "stages_ms": {s: round(1000 * (after[s] - before[s]) / len(samples), 1) for s in after},
+            })
+            rows.append(r)
+    return rows
+
+
+def bench_storage(ctx: Context) -> List[Dict[str, Any]]:
+    from backend import storage
+    m, c, root = ctx.m, ctx.client, ctx.m.PROFILES_ROOT
+    rows = []
+    ops = ctx.args.storage_ops
+    pages = ctx.page_count("synthetic")
+    for size in ctx.args.sizes:
+        pid = ctx.add_paper(f"storage-{size}", "synthetic")
+        recs = [synthetic_record(pid, i, pages) for i in range(size)]
+        t = time.perf_counter()
+        for start in range(0, size, 500):
+            storage.append_equations(root, pid, recs[start:start + 500])
+        bulk = row("storage", "bulk_append", [time.perf_counter() - t], size=size)
+        bulk["equations_per_s"] = round(size / (bulk["p50_ms"] / 1000), 1) if bulk["p50_ms"] else None
+        rows.append(bulk)
+
+        rng = random.Random(size)
+        targets = rng.sample(recs, min(ops, size))
+        samples: Dict[str, List[float]] = {k: [] for k in (
+            "api_get_all", "api_get_page", "api_get_delta", "read_equations", "api_post", "api_put", "api_delete",
+        )}
+        for _ in range(max(1, ops // 10)):
+            samples["api_get_all"] += timed_calls(lambda: check(c.get(f"/papers/{pid}/equations")), 1)
+            samples["read_equations"] += timed_calls(lambda: storage.read_equations(root, pid), 1)
+        revision = storage.equations_revision(root, pid)[1]
+        for j in range(ops):
+            samples["api_get_page"] += timed_calls(lambda: check(c.get(f"/papers/{pid}/equations", params={"page": j % pages})), 1)
+            samples["api_get_delta"] += timed_calls(
+                lambda: check(c.get(f"/papers/{pid}/equations", params={"since": max(0, revision - 10)})), 1
+            )
+        for j, rec in enumerate(targets):
+            new = rec.model_copy(update={"eq_uid": f"new{j:05d}", "boxes": [{"page": 0, "bbox_pdf": (2 * j, 2, 2 * j + 8, 10)}]})
+            samples["api_post"] += timed_calls(lambda: check(c.post(f"/papers/{pid}/equations", json=new.model_dump())), 1)
+            changed = rec.model_copy(update={"latex": rec.latex + " + 1"})
+            samples["api_put"] += timed_calls(
+                lambda: check(c.put(f"/papers/{pid}/equations/{rec.eq_uid}", json=changed.model_dump())), 1
+            )
+            samples["api_delete"] += timed_calls(lambda: check(c.delete(f"/papers/{pid}/equations/{rec.eq_uid}")), 1)
+            # adjudication capture runs in the background; keep it out of the next sample
+            m.adjudications.flush(timeout=60)
+        rows += [row("storage", name, s, size=size) for name, s in samples.items()]
+    return rows
+
+
+def latex_corpus(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    templates = (
+        r"\frac{a_{%d}}{b_{%d}} + x^{2}",
+        r"\int_{0}^{%d} f(x)\,dx = %d",
+        r"\sum_{k=1}^{%d} k^{2} = \frac{n(n+1)(2n+1)}{%d}",
+        r"E = m c^{2} + \sqrt{%d x + %d}",
+        r"\nabla \times \mathbf{E} = -\frac{\partial B_{%d}}{\partial t_{%d}}",
+        r"\frac{a_{%d}}{b_{%d}",  # unbalanced: the error path
+    )
+    return [rng.choice(templates) % (rng.randint(1, 10 ** 6), i) for i in range(n)]
+
+def bench_validate(ctx: Context) -> List[Dict[str, Any]]:
+    from backend.services.validate import Validator, VALIDATE_WORKERS, VALIDATE_TIMEOUT
+    c = ctx.client
+    n = ctx.args.validate_items
+    rows = []
+    validator = Validator(workers=VALIDATE_WORKERS, timeout=VALIDATE_TIMEOUT, cache_size=4 * n)
+    try:
+        validator.warm()
+        corpus = latex_corpus(n, seed=1)
+        for mode in ("cold", "cached"):
+            t = time.perf_counter()
+            validator.validate_many(corpus)
+            r = row("validate", f"batch_{mode}", [time.perf_counter() - t], items=n, workers=VALIDATE_WORKERS)
+            r["items_per_s"] = round(n / (r["p50_ms"] / 1000), 1) if r["p50_ms"] else None
+            rows.append(r)
+    finally:
+        validator.shutdown()
+    ctx.m.validator.warm()
+    fresh = iter(latex_corpus(ctx.args.storage_ops * 50 + 50, seed=2))
+    single = [next(fresh) for _ in range(ctx.args.storage_ops)]
+    rows.append(row("validate", "api_single_cold", [
+        s for latex in single for s in timed_calls(lambda: check(c.post("/validate", json={"latex": latex})), 1)
+    ]))
+    rows.append(row("validate", "api_single_cached", [
+        s for latex in single for s in timed_calls(lambda: check(c.post("/validate", json={"latex": latex})), 1)
+    ]))
+    batches = [[next(fresh) for _ in range(50)] for _ in range(max(1, ctx.args.storage_ops // 5))]
+    rows.append(row("validate", "api_batch50_cold", [
+        s for items in batches for s in timed_calls(lambda: check(c.post("/validate:batch", json={"items": items})), 1)
+    ]))
+    return rows
+
+
+def bench_search(ctx: Context) -> List[Dict[str, Any]]:
+    """Corpus search: indexing through the storage write path, then /search queries."""
+    from backend import storage
+    from backend.schemas import EquationRecord
+    m, c, root = ctx.m, ctx.client, ctx.m.PROFILES_ROOT
+    papers, per_paper = ctx.args.search_papers, ctx.args.search_equations
+    corpus = latex_corpus(papers * per_paper, seed=4)
+    t = time.perf_counter()
+    for p in range(papers):
+        pid = f"search-{p:04d}"
+        recs = [
+            EquationRecord(eq_uid=f"s{i:05d}", paper_id=pid, latex=corpus[p * per_paper + i],
+                           boxes=[{"page": 0, "bbox_pdf": (0, i, 10, i + 1)}])
+            for i in range(per_paper)
+        ]
+        storage.append_equations(root, pid, recs)
+    total = papers * per_paper
+    build = row("search", "index_append", [time.perf_counter() - t], papers=papers, equations=total)
+    build["equations_per_s"] = round(total / (build["p50_ms"] / 1000), 1) if build["p50_ms"] else None
+    rows = [build]
+    rows.append(row("search", "reindex_full", timed_calls(lambda: storage.reindex_profiles(root, full=True), 1),
+                    papers=papers, equations=total))
+
+    rng = random.Random(5)
+    queries = [rng.choice(corpus) for _ in range(ctx.args.storage_ops)]
+    ops = {
+        "similar": lambda q: {"q": q},
+        "similar_fragment": lambda q: {"q": q[: max(4, len(q) // 2)]},
+        "exact": lambda q: {"q": q, "mode": "exact"},
+        "symbols": lambda q: {"symbols": "x,k"},
+        "similar_symbols": lambda q: {"q": q, "symbols": "x"},
+    }
+    for name, params in ops.items():
+        rows.append(row("search", f"api_{name}", [
+            s for q in queries for s in timed_calls(lambda: check(c.get("/search", params=params(q))), 1)
+        ], equations=total))
+    return rows
+
+
+def bench_load(ctx: Context) -> List[Dict[str, Any]]:
+    """Concurrent clients against the ASGI app: a read-mostly mix of the viewer's requests."""
+    import httpx
+    m, c = ctx.m, ctx.client
+    pid = ctx.add_paper("load", "sar")
+    pages = ctx.page_count(pid)
+    recs = [synthetic_record(pid, i, pages) for i in range(ctx.args.load_equations)]
+    from backend import storage
+    storage.append_equations(m.PROFILES_ROOT, pid, recs)
+    for i in range(pages):
+        check(c.get(f"/papers/{pid}/page/{i}/image"))  # viewer images are warm in steady state
+    corpus = latex_corpus(200, seed=3)
+
+    def request(rng: random.Random):
+        r = rng.random()
+        if r < 0.35:
+            return "image", "GET", f"/papers/{pid}/page/{rng.randrange(pages)}/image", None
+        if r < 0.55:
+            return "page_meta", "GET", f"/papers/{pid}/page/{rng.randrange(pages)}/meta", None
+        if r < 0.80:
+            return "equations", "GET", f"/papers/{pid}/equations", None
+        if r < 0.95:
+            return "validate", "POST", "/validate", {"latex": rng.choice(corpus)}
+        rec = rng.choice(recs)
+        return "put", "PUT", f"/papers/{pid}/equations/{rec.eq_uid}", rec.model_copy(update={"latex": rec.latex + " "}).model_dump()
+
+    async def run(concurrency: int, total: int):
+        rng = random.Random(concurrency)
+        plan = [request(rng) for _ in range(total)]
+        latencies: Dict[str, List[float]] = {}
+        errors = 0
+        transport = httpx.ASGITransport(app=m.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            queue = iter(plan)
+
+            async def worker():
+                nonlocal errors
+                for kind, method, url, body in queue:
+                    t = time.perf_counter()
+                    resp = await client.request(method, url, json=body)
+                    latencies.setdefault(kind, []).append(time.perf_counter() - t)
+                    errors += resp.status_code >= 400
+
+            t = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return time.perf_counter() - t, latencies, errors
+
+    rows = []
+    for concurrency in ctx.args.concurrency:
+        elapsed, latencies, errors = asyncio.run(run(concurrency, ctx.args.load_requests))
+        everything = [s for xs in latencies.values() for s in xs]
+        r = row("load", "all", everything, concurrency=concurrency)
+        r.update({"requests_per_s": round(len(everything) / elapsed, 1), "errors": errors})
+        rows.append(r)
+        rows += [row("load", kind, xs, concurrency=concurrency) for kind, xs in sorted(latencies.items())]
+        m.adjudications.flush(timeout=60)
+    return rows
+
+
+# --- driver ---
+
+def git_commit() -> Optional[str]:
+    try:
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + ("-dirty" if dirty else "")
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Rows whose p50 grew by more than threshold (a ratio) against the baseline."""
+    before = {r["key"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for r in current["results"]:
+        b = before.get(r["key"])
+        if b is None or not b.get("p50_ms"):
+            continue
+        ratio = r["p50_ms"] / b["p50_ms"]
+        line = f"{r['key']:<60} {b['p50_ms']:>10.2f} -> {r['p50_ms']:>10.2f} ms  x{ratio:.2f}"
+        print(line, file=sys.stderr)
+        if ratio > threshold:
+            regressions.append(line)
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    ap.add_argument("--quick", action="store_true", help="small sizes, for a smoke run")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--pages", type=int, default=40, help="pages in the synthetic paper")
+    ap.add_argument("--equations-per-page", type=int, default=8)
+    ap.add_argument("--render-pages", type=int, default=12, help="pages per paper in the render suite")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="profile sizes for the storage suite")
+    ap.add_argument("--storage-ops", type=int, default=50)
+    ap.add_argument("--validate-items", type=int, default=500)
+    ap.add_argument("--search-papers", type=int, default=200, help="papers in the search corpus")
+    ap.add_argument("--search-equations", type=int, default=100, help="equations per paper in the search corpus")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--load-requests", type=int, default=600)
+    ap.add_argument("--load-equations", type=int, default=500)
+    ap.add_argument("--models", choices=("auto", "stub"), default="auto",
+                    help="auto: real detector/recognizer where installed; stub: always the stand-ins")
+    ap.add_argument("--detector-ms", type=float, default=0.0, help="simulated stub detector cost per page")
+    ap.add_argument("--recognizer-ms", type=float, default=0.0, help="simulated stub recognizer cost per crop")
+    ap.add_argument("--out", help="write the JSON here instead of stdout")
+    ap.add_argument("--compare", help="an earlier --out file to compare p50s against")
+    ap.add_argument("--threshold", type=float, default=1.25, help="p50 ratio that counts as a regression")
+    args = ap.parse_args(argv)
+    if args.quick:
+        args.repeat, args.pages, args.render_pages = 1, 8, 3
+        args.sizes, args.storage_ops, args.validate_items = [100, 1000], 10, 100
+        args.concurrency, args.load_requests, args.load_equations = [1, 8], 100, 100
+        args.search_papers, args.search_equations = 20, 50
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="scribe-bench-") as work:
+        ctx = Context(Path(work), args)
+        try:
+            for name in args.suites:
+                t = time.perf_counter()
+                results += globals()[f"bench_{name}"](ctx)
+                print(f"{name}: {time.perf_counter() - t:.1f}s", file=sys.stderr)
+        finally:
+            ctx.close()
+
+    doc = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": ctx.models,
+            "env": {k: os.environ.get(k) for k in (
+                "AUTODETECT_WORKERS", "DETECT_BATCH", "RECOGNITION_BATCH", "VALIDATE_WORKERS", "PDF_CACHE_SIZE",
+            )},
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(doc, indent=1)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if baseline.get("meta", {}).get("models") != ctx.models:
+            print("warning: baseline used different models; timings are not comparable", file=sys.stderr)
+        regressions = compare(doc, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over x{args.threshold:g}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Microbenchmark: candidate-vs-existing dedup on one page.
+
+Compares the original nested-loop pure-Python IoU check against
+services.boxindex.BoxIndex.add_new as the number of existing boxes grows.
+
+    python -m benchmarks.bench_boxindex [--sizes 10 100 1000 5000] [--candidates 50]
+"""
+import argparse
+import json
+import random
+import time
+
+from backend.services.boxindex import BoxIndex, nms
+
+
+def calculate_iou(boxA, boxB):
+    # the pre-index implementation from backend/main.py
+    xA = max(boxA[0], boxB[0])
+    yA = max(boxA[1], boxB[1])
+    xB = min(boxA[2], boxB[2])
+    yB = min(boxA[3], boxB[3])
+    interArea = max(0, xB - xA) * max(0, yB - yA)
+    boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
+    boxBArea = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
+    unionArea = boxAArea + boxBArea - interArea
+    if unionArea == 0: return 0
+    return interArea / unionArea
+
+
+def random_boxes(n, rng):
+    out = []
+    for _ in range(n):
+        x0, y0 = rng.uniform(0, 550), rng.uniform(0, 760)
+        out.append((x0, y0, x0 + rng.uniform(20, 200), y0 + rng.uniform(8, 40)))
+    return out
+
+
+def dedup_loop(existing, candidates, thresh=0.5):
+    page_existing = list(existing)
+    kept = []
+    for cand in candidates:
+        if any(calculate_iou(cand, ex) > thresh for ex in page_existing):
+            continue
+        page_existing.append(cand)
+        kept.append(cand)
+    return kept
+
+
+def dedup_index(existing, candidates, thresh=0.5):
+    index = BoxIndex(existing)
+    return [candidates[i] for i in index.add_new(candidates, thresh)]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def run(sizes, n_candidates, repeat=5, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for n in sizes:
+        existing = random_boxes(n, rng)
+        candidates = random_boxes(n_candidates, rng)
+        assert dedup_loop(existing, candidates) == dedup_index(existing, candidates)
+        scores = [rng.random() for _ in range(n)]
+        rows.append({
+            "existing": n,
+            "candidates": n_candidates,
+            "loop_ms": 1000 * best_of(lambda: dedup_loop(existing, candidates), repeat),
+            "index_ms": 1000 * best_of(lambda: dedup_index(existing, candidates), repeat),
+            "nms_ms": 1000 * best_of(lambda: nms(existing, scores, 0.5), repeat),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    ap.add_argument("--candidates", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    for row in run(args.sizes, args.candidates, args.repeat):
+        print(json.dumps(row))
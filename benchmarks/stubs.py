@@ -0,0 +1,133 @@
+"""
+Stand-ins for the models the benchmarks need but a CI box may not have.
+
+- install_equation_scribe(): registers a minimal PyMuPDF-backed
+  `equation_scribe` (pdf_ingest, detect, recognition) in sys.modules when the
+  real package is not importable. Rendering and layout still do real PyMuPDF
+  work; recognition returns a cheap deterministic string.
+- StubDetector: drop-in for services.detector.Detector with a fixed grid of
+  boxes per page, for when best.pt / ultralytics are absent.
+- stub_recognizer(): a list-in/list-out recognizer for recognition.use_recognizer().
+
+Both model stubs can sleep per item so pipeline overheads can be measured
+against a realistic model cost.
+"""
+from typing import Any, Dict, List
+import importlib.util
+import sys
+import time
+import types
+
+
+def _have(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def install_equation_scribe() -> bool:
+    """Register the stand-in package if equation_scribe is missing; True if it did."""
+    if "equation_scribe" in sys.modules or _have("equation_scribe"):
+        return False
+    import fitz
+    from PIL import Image
+
+    class Document:
+        def __init__(self, path):
+            self.doc = fitz.open(str(path))
+            self.num_pages = self.doc.page_count
+
+        def close(self):
+            self.doc.close()
+
+    def load_pdf(path):
+        return Document(path)
+
+    def page_image(doc, page_ix, dpi=150):
+        pix = doc.doc.load_page(page_ix).get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), alpha=False)
+        return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    def page_layout(doc, page_ix):
+        spans = []
+        for block in doc.doc.load_page(page_ix).get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                for span in line["spans"]:
+                    spans.append({"text": span["text"], "bbox": tuple(span["bbox"]), "size": span["size"]})
+        return spans
+
+    def page_size_points(doc, page_ix):
+        r = doc.doc.load_page(page_ix).rect
+        return float(r.width), float(r.height)
+
+    def pdf_to_px_transform(doc, page_ix, dpi=150):
+        s = dpi / 72
+        return (lambda x, y: (x * s, y * s)), (lambda x, y: (x / s, y / s))
+
+    def find_equation_candidates(spans, page_width):
+        # lines with an "=" stand in for the real layout heuristic
+        return [{"bbox_pdf": sp["bbox"], "score": 0.5} for sp in spans if "=" in sp["text"]]
+
+    def image_to_latex(img):
+        return f"x_{{{img.size[0] % 97}}}"
+
+    def module(name, package=False, **attrs):
+        mod = types.ModuleType(name)
+        if package:
+            mod.__path__ = []
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+        return mod
+
+    pkg = module("equation_scribe", package=True)
+    pkg.pdf_ingest = module(
+        "equation_scribe.pdf_ingest",
+        load_pdf=load_pdf, page_image=page_image, page_layout=page_layout,
+        page_size_points=page_size_points, pdf_to_px_transform=pdf_to_px_transform,
+    )
+    pkg.detect = module("equation_scribe.detect", find_equation_candidates=find_equation_candidates)
+    pkg.recognition = module("equation_scribe.recognition", package=True)
+    pkg.recognition.inference = module(
+        "equation_scribe.recognition.inference", image_to_latex=image_to_latex, MODEL_VERSION="stub"
+    )
+    return True
+
+
+class StubDetector:
+    """
+    Fixed boxes per page: `per_page` full-width bands down the page, in page
+    pixels, after sleeping `ms_per_page`.
+    """
+    available = True
+    version = "stub"
+
+    def __init__(self, per_page: int = 6, ms_per_page: float = 0.0, conf_thresh: float = 0.25):
+        self.per_page = per_page
+        self.ms_per_page = ms_per_page
+        self.conf_thresh = conf_thresh
+
+    def detect(self, pages: List[Any]) -> List[List[Dict[str, Any]]]:
+        from backend.services.metrics import timed
+        with timed("detect", items=len(pages)):
+            return [self._boxes(page) for page in pages]
+
+    def _boxes(self, page: Any) -> List[Dict[str, Any]]:
+        if self.ms_per_page:
+            time.sleep(self.ms_per_page / 1000)
+        h, w = page.shape[:2] if hasattr(page, "shape") else page.size[::-1]
+        band = h / (2 * self.per_page + 1)
+        return [
+            {"xyxy": [0.15 * w, (2 * i + 1) * band, 0.85 * w, (2 * i + 1.6) * band], "conf": 0.9}
+            for i in range(self.per_page)
+        ]
+
+    def detect_one(self, page: Any) -> List[Dict[str, Any]]:
+        return self.detect([page])[0]
+
+
+def stub_recognizer(ms_per_crop: float = 0.0):
+    def recognize(crops):
+        if ms_per_crop:
+            time.sleep(ms_per_crop * len(crops) / 1000)
+        return [f"x_{{{c.size[0] % 97}}} = {c.size[1] % 13}" for c in crops]
+    return recognize
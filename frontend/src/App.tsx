@@ -1,10 +1,11 @@
 // frontend/src/App.tsx
-import React, { useEffect, useMemo, useState, useCallback } from "react";
+import React, { useEffect, useMemo, useState, useCallback, useRef } from "react";
 import PdfImage from "./pdf/PdfImage";
 import Boxes from "./canvas/Boxes";
 import {
   getPageCount,
   listEquations,
+  equationChanges,
   saveEquation,
   updateEquation,
   deleteEquation,
@@ -12,6 +13,8 @@ import {
   findProfileByPdf,
   uploadPdf,
   rescanBox,
+  clearDocumentMeta,
+  prefetchPages,
 } from "./api/client";
 import type { Box, SavedBox, EquationRecord } from "./types";
 import "katex/dist/katex.min.css";
@@ -36,32 +39,46 @@ export default function App() {
   const [latex, setLatex] = useState("");
   const [notes, setNotes] = useState("");
   const hasPdf = !!paperId && pages > 0;
+  // revision of the equations we hold, for delta refreshes after edits
+  const syncRef = useRef<{ paperId: string; revision: number; epoch: string } | null>(null);
+
+  // Warm the backend's render cache around the page being viewed
+  useEffect(() => {
+    if (!paperId || pages === 0) return;
+    prefetchPages(paperId, pageIndex, [zoom]).catch(() => {});
+  }, [paperId, pages, pageIndex, zoom]);
+
+  // The gray boxes drawn for equations
+  const savedBoxesOf = (eqs: EquationRecord[]): SavedBox[] =>
+    eqs.flatMap((eq) =>
+      (eq.boxes || []).map((b, idx) => ({
+        page: b.page,
+        bbox_pdf: b.bbox_pdf,
+        eq_uid: eq.eq_uid,
+        box_idx: idx,
+        id: `saved-${eq.eq_uid}-${idx}`,
+      }))
+    );
+
+  const showEquations = (eqs: EquationRecord[]) => {
+    setEquations(eqs);
+    setSavedBoxes(savedBoxesOf(eqs));
+  };
 
   // --- HELPER: Centralized State Loader ---
-  const loadPaperData = async (pid: string) => {
+  // clearWorking: also drop the red boxes being drawn (not wanted when the
+  // reload only catches up with a scan or another edit)
+  const loadPaperData = async (pid: string, clearWorking: boolean = true) => {
     try {
       // 1. Load Equations from Backend
       const saved = await listEquations(pid);
-      const eqs: EquationRecord[] = saved.items || [];
-      setEquations(eqs);
+      syncRef.current = { paperId: pid, revision: saved.revision, epoch: saved.epoch };
 
       // 2. Rebuild Saved Boxes for Canvas
-      const sBoxes: SavedBox[] = [];
-      for (const eq of eqs) {
-        (eq.boxes || []).forEach((b, idx) => {
-          sBoxes.push({
-            page: b.page,
-            bbox_pdf: b.bbox_pdf,
-            eq_uid: eq.eq_uid,
-            box_idx: idx,
-            id: `saved-${eq.eq_uid}-${idx}`,
-          });
-        });
-      }
-      setSavedBoxes(sBoxes);
+      showEquations(saved.items || []);
       
       // 3. Clear working state (Red boxes) now that Gray boxes are loaded
-      setCurrentBoxes([]);
+      if (clearWorking) setCurrentBoxes([]);
       return true;
     } catch (err: any) {
       console.error(err);
@@ -70,6 +87,46 @@ export default function App() {
     }
   };
 
+  // After an edit or a scan: fetch only what changed since our revision and
+  // merge it, instead of reloading the whole profile. The merge is applied to
+  // the latest state (functional updates), not to the list this closure saw:
+  // pages streamed in and other saves may have landed during the await.
+  const refreshPaperData = async (pid: string) => {
+    const sync = syncRef.current;
+    if (!sync || sync.paperId !== pid) return loadPaperData(pid, false);
+    try {
+      const delta = await equationChanges(pid, sync.revision);
+      if (delta.epoch !== sync.epoch) return loadPaperData(pid, false); // profile was recreated
+      // a refresh that finished first already applied everything up to a
+      // newer revision; merging this older delta would undo some of it
+      const current = syncRef.current;
+      if (!current || current.paperId !== pid || current.revision >= delta.revision) return true;
+      syncRef.current = { ...current, revision: delta.revision };
+
+      const changed = new Map(delta.items.map((eq) => [eq.eq_uid, eq]));
+      const gone = new Set(delta.deleted);
+      const replaced = (uid: string) => gone.has(uid) || changed.has(uid);
+      setEquations((prev) => {
+        const seen = new Set<string>();
+        const merged = prev
+          .filter((eq) => !gone.has(eq.eq_uid))
+          .map((eq) => {
+            seen.add(eq.eq_uid);
+            return changed.get(eq.eq_uid) || eq;
+          });
+        return [...merged, ...delta.items.filter((eq) => !seen.has(eq.eq_uid))];
+      });
+      setSavedBoxes((prev) => [
+        ...prev.filter((sb) => !replaced(sb.eq_uid)),
+        ...savedBoxesOf(delta.items),
+      ]);
+      return true;
+    } catch (err: any) {
+      console.error(err);
+      return loadPaperData(pid, false);
+    }
+  };
+
   const handleFileChange = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (!file) return;
@@ -77,6 +134,7 @@ export default function App() {
     try {
       setStatus(`Uploading "${file.name}"...`);
       const { paper_id } = await uploadPdf(file);
+      clearDocumentMeta(paper_id);
       setPaperId(paper_id);
       
       const { pages } = await getPageCount(paper_id);
@@ -108,9 +166,27 @@ export default function App() {
     setPdfDims({ widthPts: meta.width_pts, heightPts: meta.height_pts });
   }, []);
 
+  // Equations streamed from a running scan: show them without disturbing the
+  // boxes the reviewer is currently drawing.
+  const handlePageScanned = useCallback((found: EquationRecord[]) => {
+    setEquations((prev) => [...prev, ...found]);
+    setSavedBoxes((prev) => [
+      ...prev,
+      ...found.flatMap((eq) =>
+        (eq.boxes || []).map((b, idx) => ({
+          page: b.page,
+          bbox_pdf: b.bbox_pdf,
+          eq_uid: eq.eq_uid,
+          box_idx: idx,
+          id: `saved-${eq.eq_uid}-${idx}`,
+        }))
+      ),
+    ]);
+  }, []);
+
   const handleScanComplete = async () => {
     if (!paperId) return;
-    await loadPaperData(paperId);
+    await refreshPaperData(paperId);
     setStatus("✅ Paper scan complete. Data reloaded.");
   };
 
@@ -154,10 +230,13 @@ export default function App() {
           boxes: currentBoxes.map((b) => ({ page: b.page, bbox_pdf: b.bbox_pdf })),
         };
         await saveEquation(paperId, rec);
+        // only the boxes just saved: ones drawn meanwhile stay
+        const saved = new Set(currentBoxes);
+        setCurrentBoxes((prev) => prev.filter((b) => !saved.has(b)));
         setStatus(`✅ Saved ${currentBoxes.length} box(es).`);
       }
       
-      await loadPaperData(paperId);
+      await refreshPaperData(paperId);
       
     } catch (err: any) {
       console.error(err);
@@ -211,7 +290,7 @@ export default function App() {
         setStatus("✅ Deleted box.");
       }
       
-      await loadPaperData(paperId);
+      await refreshPaperData(paperId);
       
       setSelectedBoxId(null);
       setSelectedEqUid(null);
@@ -297,7 +376,7 @@ export default function App() {
 
         {hasPdf && (
           <div style={{ marginBottom: 8, textAlign: "center" }}>
-            <AutoDetectButton paperId={paperId} onScanComplete={handleScanComplete} />
+            <AutoDetectButton paperId={paperId} onScanComplete={handleScanComplete} onPageScanned={handlePageScanned} />
           </div>
         )}
 
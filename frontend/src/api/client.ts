@@ -1,9 +1,12 @@
 const API = "http://127.0.0.1:8000";
 
-import { DetectionCandidate, AutoDetectResponse } from "../types";
+import { DetectionCandidate, AutoDetectResponse, EquationRecord } from "../types";
 
 
-export async function uploadPdf(file: File): Promise<{ paper_id: string }> {
+// outcome "duplicate" means these exact bytes were already uploaded as paper_id
+export async function uploadPdf(
+  file: File
+): Promise<{ paper_id: string; content_hash?: string; outcome?: "new" | "duplicate" | "replaced" }> {
   const form = new FormData();
   form.append("file", file);
 
@@ -18,15 +21,41 @@ export async function uploadPdf(file: File): Promise<{ paper_id: string }> {
 export async function getPageCount(paperId: string) {
   const r = await fetch(`${API}/papers/${paperId}/pages`);
   if (!r.ok) throw new Error(await r.text());
-  return r.json(); // { pages: number }
+  return r.json(); // { pages: number, content_hash: string }
 }
 
+// Pass the PDF's content_hash (from /pages or /meta) as `version` to get an
+// immutable, long-cacheable URL; without it the browser revalidates via ETag.
 export function pageImageURL(
   paperId: string,
   idx: number,
-  zoom: number = 1.5
+  zoom: number = 1.5,
+  version?: string
 ) {
-  return `${API}/papers/${paperId}/page/${idx}/image?zoom=${zoom}`;
+  const v = version ? `&v=${encodeURIComponent(version)}` : "";
+  return `${API}/papers/${paperId}/page/${idx}/image?zoom=${zoom}${v}`;
+}
+
+export type ImageFormat = "png" | "jpeg" | "webp";
+
+// Low-resolution rendering to paint first while the full page loads.
+export function pagePreviewURL(paperId: string, idx: number, version?: string) {
+  const v = version ? `?v=${encodeURIComponent(version)}` : "";
+  return `${API}/papers/${paperId}/page/${idx}/preview${v}`;
+}
+
+// Tile (x, y) of the page rendered at `zoom`; tiles are `tile_size` px squares (see documentMeta).
+export function pageTileURL(
+  paperId: string,
+  idx: number,
+  zoom: number,
+  x: number,
+  y: number,
+  fmt: ImageFormat = "png",
+  version?: string
+) {
+  const v = version ? `&v=${encodeURIComponent(version)}` : "";
+  return `${API}/papers/${paperId}/page/${idx}/tile/${zoom}/${x}/${y}?fmt=${fmt}${v}`;
 }
 
 export async function pageMeta(
@@ -39,12 +68,83 @@ export async function pageMeta(
   return r.json();
 }
 
-export async function listEquations(paperId: string) {
-  const r = await fetch(`${API}/papers/${paperId}/equations`);
+// Whole-document geometry, fetched once per (paper, zoom) and shared by every page view.
+const documentMetaCache = new Map<string, Promise<any>>();
+
+export function documentMeta(paperId: string, zoom: number = 1.5) {
+  const key = `${paperId}@${zoom}`;
+  let p = documentMetaCache.get(key);
+  if (!p) {
+    p = fetch(`${API}/papers/${paperId}/meta?zoom=${zoom}`).then(async (r) => {
+      if (!r.ok) throw new Error(await r.text());
+      return r.json(); // { zoom, page_count, tile_size, pages: [...], content_hash }
+    });
+    p.catch(() => documentMetaCache.delete(key));
+    documentMetaCache.set(key, p);
+  }
+  return p;
+}
+
+export function clearDocumentMeta(paperId: string) {
+  for (const key of Array.from(documentMetaCache.keys())) {
+    if (key.startsWith(`${paperId}@`)) documentMetaCache.delete(key);
+  }
+}
+
+// Identifies this tab to the prefetcher, so navigating drops only our own queued renders.
+const PREFETCH_CLIENT_ID = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
+// Ask the backend to warm renders around pageIndex; this tab's earlier pending work is dropped.
+export async function prefetchPages(paperId: string, pageIndex: number, zooms: number[]) {
+  const r = await fetch(`${API}/papers/${paperId}/prefetch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ page_index: pageIndex, zooms, client_id: PREFETCH_CLIENT_ID }),
+  });
+  if (!r.ok) throw new Error(await r.text());
+  return r.json(); // { queued_pages, queue_depth, ... }
+}
+
+export type EquationsQuery = { since?: number; page?: number; cursor?: number; limit?: number };
+
+export type EquationsPage = {
+  items: EquationRecord[];
+  revision: number;
+  epoch: string;
+  next_cursor: number | null;
+  deleted?: string[]; // only with `since`
+};
+
+export async function listEquations(paperId: string, query: EquationsQuery = {}): Promise<EquationsPage> {
+  const params = new URLSearchParams();
+  for (const [k, v] of Object.entries(query)) {
+    if (v !== undefined) params.set(k, String(v));
+  }
+  const qs = params.toString();
+  const r = await fetch(`${API}/papers/${paperId}/equations${qs ? `?${qs}` : ""}`);
   if (!r.ok) throw new Error(await r.text());
   return r.json();
 }
 
+// Everything changed or deleted after revision `since`, following cursors.
+// The first page's revision is returned: a write landing while we page is
+// simply delivered again by the next call.
+export async function equationChanges(
+  paperId: string,
+  since: number,
+  limit: number = 500
+): Promise<{ items: EquationRecord[]; deleted: string[]; revision: number; epoch: string }> {
+  const first = await listEquations(paperId, { since, limit });
+  const items = [...first.items];
+  let cursor = first.next_cursor;
+  while (cursor !== null) {
+    const next = await listEquations(paperId, { since, limit, cursor });
+    items.push(...next.items);
+    cursor = next.next_cursor;
+  }
+  return { items, deleted: first.deleted || [], revision: first.revision, epoch: first.epoch };
+}
+
 export async function saveEquation(paperId: string, payload: any) {
   const r = await fetch(`${API}/papers/${paperId}/equations`, {
     method: "POST",
@@ -65,6 +165,22 @@ export async function validateLatex(latex: string) {
   return r.json();
 }
 
+export async function validateLatexBatch(items: string[]): Promise<{ results: { ok: boolean; errors: string[] }[] }> {
+  const r = await fetch(`${API}/validate:batch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ items }),
+  });
+  if (!r.ok) throw new Error(await r.text());
+  return r.json();
+}
+
+export async function validatePaper(paperId: string) {
+  const r = await fetch(`${API}/papers/${paperId}/validate`, { method: "POST" });
+  if (!r.ok) throw new Error(await r.text());
+  return r.json(); // { total, invalid, results: [{ eq_uid, ok, errors }] }
+}
+
 // frontend/src/api/client.ts
 export async function updateEquation(paperId: string, eqUid: string, payload: any) {
   const r = await fetch(`${API}/papers/${paperId}/equations/${encodeURIComponent(eqUid)}`, {
@@ -84,6 +200,84 @@ export async function deleteEquation(paperId: string, eqUid: string) {
   return r.json();
 }
 
+export type EquationOp =
+  | { op: "upsert"; record: EquationRecord }
+  | { op: "delete"; eq_uid: string };
+
+export type EquationOpResult = {
+  index: number;
+  op: "upsert" | "delete";
+  eq_uid: string | null;
+  status: "ok" | "not_found" | "error" | "skipped";
+  error?: string;
+  revision?: number | null;
+};
+
+export type EquationBatchResult = {
+  ok: boolean;
+  revision?: number; // absent when an atomic batch was rejected
+  applied: number;
+  failed: number;
+  results: EquationOpResult[];
+};
+
+// Many upserts/deletes in one request and one transaction. With atomic=true
+// a failing op rejects the batch (HTTP 409, returned here, not thrown).
+export async function batchEquations(
+  paperId: string,
+  ops: EquationOp[],
+  atomic: boolean = true
+): Promise<EquationBatchResult> {
+  const r = await fetch(`${API}/papers/${paperId}/equations:batch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ ops, atomic }),
+  });
+  if (!r.ok && r.status !== 409) throw new Error(await r.text());
+  return r.json();
+}
+
+// Collects upserts/deletes issued close together (e.g. accepting a page of
+// autodetect results) and sends them as one non-atomic batch; each call
+// resolves with its own item's result.
+export class EquationBatcher {
+  private queue: { op: EquationOp; resolve: (r: EquationOpResult) => void; reject: (e: any) => void }[] = [];
+  private timer: ReturnType<typeof setTimeout> | null = null;
+
+  constructor(private paperId: string, private delayMs: number = 20, private maxOps: number = 500) {}
+
+  upsert(record: EquationRecord) {
+    return this.enqueue({ op: "upsert", record });
+  }
+
+  delete(eqUid: string) {
+    return this.enqueue({ op: "delete", eq_uid: eqUid });
+  }
+
+  private enqueue(op: EquationOp): Promise<EquationOpResult> {
+    return new Promise((resolve, reject) => {
+      this.queue.push({ op, resolve, reject });
+      if (this.queue.length >= this.maxOps) this.flush();
+      else if (this.timer === null) this.timer = setTimeout(() => this.flush(), this.delayMs);
+    });
+  }
+
+  async flush(): Promise<void> {
+    if (this.timer !== null) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+    const pending = this.queue.splice(0, this.queue.length);
+    if (pending.length === 0) return;
+    try {
+      const res = await batchEquations(this.paperId, pending.map((p) => p.op), false);
+      pending.forEach((p, i) => p.resolve(res.results[i]));
+    } catch (err) {
+      pending.forEach((p) => p.reject(err));
+    }
+  }
+}
+
 // frontend/src/api/client.ts
 export async function findProfileByPdf(basename: string) {
   const url = `${API}/papers/find_by_pdf?basename=${encodeURIComponent(basename)}`;
@@ -123,9 +317,78 @@ export async function rescanBox(
   return res.json();
 }
 
-export async function autodetectAll(paperId: string): Promise<{ equations_found: number }> {
+// Recognize many boxes in one request (one model batch on the backend).
+export async function rescanBoxes(
+  paperId: string,
+  items: { page_index: number; bbox: [number, number, number, number] }[]
+): Promise<{ items: { latex: string }[] }> {
+  const url = `${API}/papers/${paperId}/rescan_boxes`;
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ items }),
+  });
+
+  if (!res.ok) throw new Error(`Rescan failed: ${res.statusText}`);
+  return res.json();
+}
+
+// Pages the backend has already processed with unchanged inputs are skipped
+// unless `force` is set; start_page/end_page are zero-based and inclusive.
+export type AutodetectOptions = { start_page?: number; end_page?: number; force?: boolean };
+
+export async function autodetectAll(
+  paperId: string,
+  options: AutodetectOptions = {}
+): Promise<{ equations_found: number; pages_skipped: number }> {
   const url = `${API}/papers/${paperId}/autodetect_all`;
-  const res = await fetch(url, { method: "POST" });
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(options),
+  });
   if (!res.ok) throw new Error(`Scan failed: ${res.statusText}`);
   return res.json();
-}
\ No newline at end of file
+}
+
+// --- Autodetect jobs ---
+export type JobStatus = {
+  job_id: string;
+  paper_id: string;
+  status: "queued" | "running" | "done" | "failed" | "cancelled";
+  progress: { pages_total?: number; pages_done?: number; pages_skipped?: number; equations_found?: number };
+  result: { equations_found: number; total_equations: number } | null;
+  error: string | null;
+};
+
+export async function startAutodetectJob(paperId: string, options: AutodetectOptions = {}): Promise<JobStatus> {
+  const res = await fetch(`${API}/papers/${paperId}/autodetect_jobs`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(options),
+  });
+  if (res.status === 409) {
+    // A scan is already running for this paper: attach to it instead
+    const body = await res.json();
+    return getJob(body.detail.job_id);
+  }
+  if (!res.ok) throw new Error(`Scan failed: ${res.statusText}`);
+  return res.json();
+}
+
+export async function getJob(jobId: string): Promise<JobStatus> {
+  const res = await fetch(`${API}/jobs/${jobId}`);
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
+export async function cancelJob(jobId: string): Promise<JobStatus> {
+  const res = await fetch(`${API}/jobs/${jobId}/cancel`, { method: "POST" });
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
+// Server-sent events: "page" per processed page, then "done" | "cancelled" | "error"
+export function jobEvents(jobId: string): EventSource {
+  return new EventSource(`${API}/jobs/${jobId}/events`);
+}
@@ -261,7 +261,7 @@ export default function Boxes({
       style={{border: "1px solid #ddd"}}
     >
       <Layer ref={layerRef}>
-        <KonvaImage image={image || undefined} name="bg" listening={true}/>
+        <KonvaImage image={image || undefined} width={pagePx.width} height={pagePx.height} name="bg" listening={true}/>
 
         {savedRects.map(r => {
           const isSelected = r.id === selectedId;
@@ -1,27 +1,75 @@
-import React, { useState } from "react";
-import { autodetectAll } from "../api/client";
+import React, { useEffect, useRef, useState } from "react";
+import { startAutodetectJob, cancelJob, jobEvents } from "../api/client";
+import type { EquationRecord } from "../types";
 
 interface Props {
   paperId: string;
   onScanComplete: () => void; // Changed from onCandidatesFound
+  onPageScanned?: (equations: EquationRecord[]) => void; // Equations found on each page as it finishes
 }
 
-export const AutoDetectButton: React.FC<Props> = ({ paperId, onScanComplete }) => {
+export const AutoDetectButton: React.FC<Props> = ({ paperId, onScanComplete, onPageScanned }) => {
   const [loading, setLoading] = useState(false);
   const [status, setStatus] = useState<string | null>(null);
+  const [jobId, setJobId] = useState<string | null>(null);
+  const sourceRef = useRef<EventSource | null>(null);
+
+  // Stop listening when the paper changes or the component unmounts
+  useEffect(() => {
+    return () => sourceRef.current?.close();
+  }, [paperId]);
+
+  const finish = (message: string) => {
+    sourceRef.current?.close();
+    sourceRef.current = null;
+    setJobId(null);
+    setLoading(false);
+    setStatus(message);
+  };
 
   const handleClick = async () => {
     setLoading(true);
-    setStatus("Scanning full paper... (this may take a while)");
+    setStatus("Starting scan...");
+    try {
+      const job = await startAutodetectJob(paperId);
+      setJobId(job.job_id);
+
+      const source = jobEvents(job.job_id);
+      sourceRef.current = source;
+      source.addEventListener("page", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        setStatus(`Page ${data.pages_done}/${data.pages_total} — ${data.equations_found} equations so far`);
+        if (data.equations.length > 0) onPageScanned?.(data.equations);
+      });
+      source.addEventListener("done", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        finish(`Done! Found ${data.equations_found} equations.`);
+        onScanComplete(); // Trigger reload in parent
+      });
+      source.addEventListener("cancelled", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        finish(`Cancelled after ${data.equations_found ?? 0} equations.`);
+        onScanComplete();
+      });
+      source.addEventListener("error", (e) => {
+        // Named "error" events carry data; plain connection errors do not
+        const data = (e as MessageEvent).data;
+        if (data) finish(`Scan failed: ${JSON.parse(data).error}`);
+        else if (source.readyState === EventSource.CLOSED) finish("Scan failed.");
+      });
+    } catch (err: any) {
+      console.error(err);
+      finish("Scan failed.");
+    }
+  };
+
+  const handleCancel = async () => {
+    if (!jobId) return;
+    setStatus("Cancelling...");
     try {
-      const res = await autodetectAll(paperId);
-      setStatus(`Done! Found ${res.equations_found} equations.`);
-      onScanComplete(); // Trigger reload in parent
+      await cancelJob(jobId);
     } catch (err: any) {
       console.error(err);
-      setStatus("Scan failed.");
-    } finally {
-      setLoading(false);
     }
   };
 
@@ -41,7 +89,12 @@ export const AutoDetectButton: React.FC<Props> = ({ paperId, onScanComplete }) =
       >
         {loading ? "Scanning..." : "🚀 Scan Entire Paper"}
       </button>
+      {loading && jobId && (
+        <button onClick={handleCancel} style={{ marginLeft: 8 }}>
+          Cancel
+        </button>
+      )}
       {status && <div style={{ marginTop: 4, fontSize: "0.8em", color: "#666" }}>{status}</div>}
     </div>
   );
-};
\ No newline at end of file
+};
@@ -1,6 +1,6 @@
 // frontend/src/pdf/PdfImage.tsx
 import React, { useEffect, useState } from "react";
-import { pageImageURL, pageMeta } from "../api/client";
+import { pageImageURL, pagePreviewURL, documentMeta } from "../api/client";
 
 type Props = {
   paperId: string;
@@ -17,14 +17,25 @@ export default function PdfImage({ paperId, pageIndex, zoom, onImageReady }: Pro
     let cancelled = false;
 
     async function run() {
-      // Request page metadata for the given paper/page/zoom
-      const meta = await pageMeta(paperId, pageIndex, zoom);
+      // Page geometry comes from the per-document meta, fetched once per zoom
+      const doc = await documentMeta(paperId, zoom);
+      const meta = doc.pages[pageIndex];
 
       // Build image URL for the given paper/page/zoom
-      const url = pageImageURL(paperId, pageIndex, zoom);
+      const url = pageImageURL(paperId, pageIndex, zoom, doc.content_hash);
+
+      // Paint the cheap low-res preview first; the canvas stretches it to
+      // meta's pixel size until the full rendering arrives.
+      let fullLoaded = false;
+      const preview = new Image();
+      preview.onload = () => {
+        if (!cancelled && !fullLoaded) onImageReady(preview, meta);
+      };
+      preview.src = pagePreviewURL(paperId, pageIndex, doc.content_hash);
 
       const img = new Image();
       img.onload = () => {
+        fullLoaded = true;
         if (!cancelled) onImageReady(img, meta);
       };
       img.onerror = (e) => {
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    """A fresh PROFILES_ROOT; open stores are forgotten afterwards, as if the process restarted."""
+    from backend import storage
+    monkeypatch.setattr(storage, "JSONL_EXPORT_DELAY", -1)
+    yield tmp_path
+    storage.flush_exports()
+    storage._stores.clear()
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """backend.main imported against temp data roots, with a TestClient."""
+    import os
+    work = tmp_path_factory.mktemp("api")
+    os.environ.update({
+        "PROFILES_ROOT": str(work / "profiles"),
+        "PAPERS_ROOT": str(work / "pdfs"),
+        "ADJUDICATION_ROOT": str(work / "adjudicated"),
+        "RENDER_CACHE_DIR": "",
+        "RECOGNITION_CACHE_DB": "",
+        "PREFETCH_WORKERS": "0",
+        "VALIDATE_WORKERS": "0",
+        "JSONL_EXPORT_DELAY": "-1",
+    })
+    from fastapi.testclient import TestClient
+    import backend.main as m
+    client = TestClient(m.app)
+    yield m, client
+    m.drain_background_work()
+
+
+@pytest.fixture
+def make_paper(api):
+    """make_paper(paper_id, pages=3) writes a small PDF into PAPERS_ROOT."""
+    import fitz
+    m, _ = api
+
+    def make(paper_id: str, pages: int = 3) -> str:
+        doc = fitz.open()
+        for i in range(pages):
+            doc.new_page(width=300, height=400).insert_text((40, 60), f"page {i}: E = m c^2")
+        doc.save(str(m.PAPERS_ROOT / f"{paper_id}.pdf"))
+        doc.close()
+        return paper_id
+    return make
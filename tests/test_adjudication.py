@@ -0,0 +1,27 @@
+import json
+
+from PIL import Image
+
+from backend.adjudication import AdjudicationManager
+
+
+def _lines(manager):
+    return [json.loads(line) for line in manager.manifest_path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_saves_append_to_dataset_jsonl(tmp_path):
+    manager = AdjudicationManager(str(tmp_path))
+    crop = Image.new("RGB", (20, 10), "white")
+    manager.save_correction(crop, "x^2", "paper.pdf", [1, 2, 3, 4])
+    manager.save_correction(crop, "x^2", "paper.pdf", [1, 2, 3, 4])
+    manager.flag_as_figure(crop, "paper.pdf", [5, 6, 7, 8])
+
+    assert [e["latex_gt"] for e in _lines(manager)] == ["x^2", "x^2", None]
+    assert manager.stats() == {"samples": 2, "figures": 1, "images": 1}
+
+    # our own lines are not imported back on the next start
+    reopened = AdjudicationManager(str(tmp_path))
+    assert reopened.stats()["samples"] == 2
+
+    reopened.compact()
+    assert len(_lines(reopened)) == 2
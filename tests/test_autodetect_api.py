@@ -0,0 +1,63 @@
+import pytest
+
+
+@pytest.mark.parametrize("options", [
+    {"start_page": 5},
+    {"start_page": 2, "end_page": 1},
+    {"end_page": 3},
+])
+def test_page_range_outside_the_paper_is_rejected(api, make_paper, options):
+    _, client = api
+    pid = make_paper("range")
+    assert client.post(f"/papers/{pid}/autodetect_all", json=options).status_code == 400
+    assert client.post(f"/papers/{pid}/autodetect_jobs", json=options).status_code == 400
+
+def test_negative_page_is_rejected(api, make_paper):
+    _, client = api
+    pid = make_paper("range")
+    assert client.post(f"/papers/{pid}/autodetect_jobs", json={"start_page": -1}).status_code == 422
+
+
+@pytest.fixture
+def scanned_pages(api, monkeypatch):
+    """Stand-in detection pipeline (no equation_scribe, no models); records the pages each run scans."""
+    import contextlib
+    import fitz
+    m, _ = api
+    runs = []
+
+    @contextlib.contextmanager
+    def open_pdf(paper_id):
+        with fitz.open(m.pdf_path_for(paper_id)) as doc:
+            yield type("Doc", (), {"num_pages": doc.page_count})()
+
+    def iter_pages(pdf_path, pages, existing_boxes, detect=None, recognize=None):
+        runs.append(list(pages))
+        for p in pages:
+            yield {"page": p, "detections": []}
+
+    monkeypatch.setenv("RECOGNIZER_VERSION", "stub")
+    monkeypatch.setattr(m, "open_ingest_pdf", open_pdf)
+    monkeypatch.setattr(m, "iter_autodetect", iter_pages)
+    return runs
+
+def test_rerun_skips_unchanged_pages_unless_forced(api, make_paper, scanned_pages):
+    import fitz
+    m, client = api
+    pid = make_paper("rerun", pages=3)
+    url = f"/papers/{pid}/autodetect_all"
+
+    assert client.post(url, json={}).json()["pages_scanned"] == 3
+    again = client.post(url, json={}).json()
+    assert again["pages_scanned"] == 0 and again["pages_skipped"] == 3
+    assert client.post(url, json={"force": True, "start_page": 1, "end_page": 1}).json()["pages_scanned"] == 1
+
+    # edit page 2 only: the other pages keep their hashes
+    doc = fitz.open()
+    for i, text in enumerate(["page 0: E = m c^2", "page 1: E = m c^2", "page 2 changed"]):
+        doc.new_page(width=300, height=400).insert_text((40, 60), text)
+    doc.save(str(m.PAPERS_ROOT / f"{pid}.pdf"))
+    doc.close()
+    edited = client.post(url, json={}).json()
+    assert edited["pages_scanned"] == 1 and edited["pages_skipped"] == 2
+    assert scanned_pages == [[0, 1, 2], [], [1], [2]]
@@ -0,0 +1,47 @@
+import numpy as np
+
+from backend.services.boxindex import BoxIndex, PageBoxIndex, nms, pairwise_iou
+
+
+def test_pairwise_iou():
+    a = [[0, 0, 10, 10], [0, 0, 0, 0]]
+    b = [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]]
+    iou = pairwise_iou(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+    assert iou.shape == (2, 3)
+    assert np.allclose(iou[0], [1.0, 50 / 150, 0.0])
+    assert np.allclose(iou[1], 0.0)  # empty union, not NaN
+
+
+def test_overlap_threshold_is_exclusive():
+    index = BoxIndex([[0, 0, 10, 10]], keys=["a"])
+    half = [5, 0, 15, 10]  # IoU exactly 1/3
+    assert index.max_iou(half) == 1 / 3
+    assert not index.overlaps(half, 1 / 3)
+    assert index.overlaps(half, 0.33)
+
+
+def test_exclude_key_skips_the_equation_itself():
+    index = BoxIndex([[0, 0, 10, 10], [100, 0, 110, 10]], keys=["a", "b"])
+    assert index.overlaps([0, 0, 10, 10], 0.5)
+    assert not index.overlaps([0, 0, 10, 10], 0.5, exclude_key="a")
+    assert index.overlaps([100, 0, 110, 10], 0.5, exclude_key="a")
+
+
+def test_page_index_keeps_pages_apart():
+    index = PageBoxIndex.from_records([
+        {"eq_uid": "a", "boxes": [{"page": 0, "bbox_pdf": [0, 0, 10, 10]}, {"page": 2, "bbox_pdf": [50, 50, 60, 60]}]},
+        {"eq_uid": "b", "boxes": [{"page": 1, "bbox_pdf": [0, 0, 10, 10]}]},
+    ])
+    assert sorted(index) == [0, 1, 2]
+    assert index[0].keys == ["a"] and index[1].keys == ["b"]
+    assert not index[2].overlaps([0, 0, 10, 10], 0.1)
+    assert len(index[7]) == 0  # untouched page: empty, never overlapping
+
+
+def test_add_new_and_nms():
+    index = BoxIndex([[0, 0, 10, 10]])
+    added = index.add_new([[0, 0, 10, 10.5], [20, 0, 30, 10], [20, 0, 30, 10.2]], 0.5)
+    assert added == [1] and len(index) == 2
+    boxes = [[0, 0, 10, 10], [0, 0, 10, 11], [50, 50, 60, 60]]
+    assert nms(boxes, [0.5, 0.9, 0.1], 0.5) == [1, 2]
+    assert nms([], [], 0.5) == []
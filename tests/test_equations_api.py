@@ -0,0 +1,66 @@
+from backend import storage
+
+
+def rec(paper_id, eq_uid, latex="x", page=0, box=(10, 10, 60, 30)):
+    return {"eq_uid": eq_uid, "paper_id": paper_id, "latex": latex, "boxes": [{"page": page, "bbox_pdf": list(box)}]}
+
+def listed(client, paper_id):
+    return {r["eq_uid"]: r["latex"] for r in client.get(f"/papers/{paper_id}/equations").json()["items"]}
+
+
+def test_batch_applies_mixed_ops_in_one_commit(api, make_paper):
+    m, client = api
+    pid = make_paper("batch_mixed")
+    for uid, y in (("a", 10), ("b", 100)):
+        assert client.post(f"/papers/{pid}/equations", json=rec(pid, uid, box=(10, y, 60, y + 20))).status_code == 200
+    flushes = storage.write_stats(m.PROFILES_ROOT, pid)["flushes"]
+
+    r = client.post(f"/papers/{pid}/equations:batch", json={"ops": [
+        {"op": "upsert", "record": rec(pid, "c", box=(10, 200, 60, 220))},
+        {"op": "upsert", "record": rec(pid, "a", "a2")},
+        {"op": "delete", "eq_uid": "b"},
+        {"op": "delete", "eq_uid": "missing"},
+    ]}).json()
+
+    assert r["ok"] and r["applied"] == 4 and r["failed"] == 0
+    assert [i["status"] for i in r["results"]] == ["ok", "ok", "ok", "not_found"]
+    assert r["revision"] == max(i["revision"] or 0 for i in r["results"])
+    assert listed(client, pid) == {"a": "a2", "c": "x"}
+    # one transaction for the whole batch, one history entry per replaced or deleted record
+    assert storage.write_stats(m.PROFILES_ROOT, pid)["flushes"] == flushes + 1
+    assert [h["op"] for h in storage.equation_history(m.PROFILES_ROOT, pid, "a")] == ["update"]
+    assert [h["op"] for h in storage.equation_history(m.PROFILES_ROOT, pid, "b")] == ["delete"]
+
+
+def test_atomic_batch_with_a_duplicate_box_is_rolled_back(api, make_paper):
+    m, client = api
+    pid = make_paper("batch_dup")
+    client.post(f"/papers/{pid}/equations", json=rec(pid, "a"))
+    before = client.get(f"/papers/{pid}/equations").json()["revision"]
+
+    ops = [
+        {"op": "delete", "eq_uid": "a"},
+        {"op": "upsert", "record": rec(pid, "n", box=(10, 200, 60, 220))},
+        {"op": "upsert", "record": rec(pid, "dup", box=(10, 200, 60, 221))},  # overlaps "n" from this batch
+    ]
+    r = client.post(f"/papers/{pid}/equations:batch", json={"ops": ops})
+    assert r.status_code == 409
+    body = r.json()
+    assert body["applied"] == 0 and body["failed"] == 1
+    assert [i["status"] for i in body["results"]] == ["skipped", "skipped", "error"]
+    assert listed(client, pid) == {"a": "x"}
+    assert client.get(f"/papers/{pid}/equations").json()["revision"] == before
+
+    partial = client.post(f"/papers/{pid}/equations:batch", json={"ops": ops, "atomic": False}).json()
+    assert not partial["ok"] and partial["applied"] == 2
+    assert listed(client, pid) == {"n": "x"}
+
+
+def test_single_save_rejects_a_duplicate_box(api, make_paper):
+    _, client = api
+    pid = make_paper("save_dup")
+    assert client.post(f"/papers/{pid}/equations", json=rec(pid, "a")).status_code == 200
+    assert client.post(f"/papers/{pid}/equations", json=rec(pid, "b", box=(11, 10, 60, 30))).status_code == 409
+    # the same box elsewhere, or the equation's own box on update, is fine
+    assert client.post(f"/papers/{pid}/equations", json=rec(pid, "c", page=1)).status_code == 200
+    assert client.put(f"/papers/{pid}/equations/a", json=rec(pid, "a", "a2")).status_code == 200
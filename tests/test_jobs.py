@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+
+from backend.services.jobs import Job, JobConflict, JobManager
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((int(fields["id"]), fields["event"]))
+    return events
+
+
+def test_job_lifecycle():
+    manager = JobManager(max_running=1)
+    release = threading.Event()
+
+    def work(job):
+        job.emit("page", {"page": 0})
+        release.wait(5)
+        return {"pages": 1}
+
+    job = manager.submit("p", "autodetect", work)
+    with pytest.raises(JobConflict):
+        manager.submit("p", "autodetect", work)
+    release.set()
+    assert job.wait(5)
+    assert job.status == "done" and job.result == {"pages": 1}
+    assert [e["event"] for e in job.events_since(0)] == ["page", "done"]
+    assert manager.submit("p", "autodetect", lambda job: {}).wait(5)
+
+
+def test_failed_job_reports_its_error():
+    manager = JobManager()
+    job = manager.submit("p", "autodetect", lambda job: 1 / 0)
+    assert job.wait(5)
+    assert job.status == "failed" and "division" in job.error
+    assert job.events_since(0)[-1]["event"] == "error"
+
+
+@pytest.fixture
+def fake_autodetect(api, monkeypatch):
+    m, _ = api
+
+    def run(paper_id, job=None, options=None):
+        for i in range(3):
+            job.emit("page", {"page": i})
+        return {"paper_id": paper_id, "equations_found": 0}
+    monkeypatch.setattr(m, "run_autodetect", run)
+
+
+def test_events_stream_until_done_and_resume(api, make_paper, fake_autodetect):
+    m, client = api
+    pid = make_paper("jobs")
+    job_id = client.post(f"/papers/{pid}/autodetect_jobs", json={}).json()["job_id"]
+    m.jobs.get(job_id).wait(5)
+
+    events = _parse_sse(client.get(f"/jobs/{job_id}/events").text)
+    assert events == [(1, "page"), (2, "page"), (3, "page"), (4, "done")]
+    resumed = _parse_sse(client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "2"}).text)
+    assert resumed == [(3, "page"), (4, "done")]
+
+
+def test_sync_autodetect_returns_the_job_result(api, make_paper, fake_autodetect):
+    _, client = api
+    pid = make_paper("jobs_sync")
+    r = client.post(f"/papers/{pid}/autodetect_all", json={})
+    assert r.status_code == 200 and r.json()["paper_id"] == pid
+
+
+class _LateJob(Job):
+    """Finishes between the stream's (empty) fetch and its status check."""
+    def events_since(self, after):
+        events = super().events_since(after)
+        if self.status == "running":
+            self.emit("done", {})
+            self._set_status("done")
+        return events
+
+
+def test_events_stream_does_not_miss_the_final_event(api):
+    m, client = api
+    job = _LateJob("late", "autodetect")
+    job._set_status("running")
+    with m.jobs._lock:
+        m.jobs._jobs[job.id] = job
+    assert _parse_sse(client.get(f"/jobs/{job.id}/events").text) == [(1, "done")]
+
+
+def test_cancelled_sync_autodetect_is_409(api, make_paper, monkeypatch):
+    m, client = api
+
+    def run(paper_id, job=None, options=None):
+        job.cancel()
+        return None
+    monkeypatch.setattr(m, "run_autodetect", run)
+    pid = make_paper("jobs_cancel")
+    r = client.post(f"/papers/{pid}/autodetect_all", json={})
+    assert r.status_code == 409
+    assert r.json()["detail"]["result"] is None and r.json()["detail"]["job_id"]
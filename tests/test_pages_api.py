@@ -0,0 +1,53 @@
+import pytest
+
+
+@pytest.mark.parametrize("z", ["0", "-1", "1000"])
+def test_tile_zoom_out_of_range_is_rejected(api, make_paper, z):
+    _, client = api
+    pid = make_paper("tiles")
+    assert client.get(f"/papers/{pid}/page/0/tile/{z}/0/0").status_code == 422
+
+@pytest.mark.parametrize("zoom", ["0", "-2", "1000"])
+def test_image_zoom_out_of_range_is_rejected(api, make_paper, zoom):
+    _, client = api
+    pid = make_paper("tiles")
+    assert client.get(f"/papers/{pid}/page/0/image", params={"zoom": zoom}).status_code == 422
+
+def test_tiles_render_and_outside_tiles_are_404(api, make_paper):
+    _, client = api
+    pid = make_paper("tiles")
+    r = client.get(f"/papers/{pid}/page/0/tile/1.5/0/0")
+    assert r.status_code == 200 and r.headers["content-type"] == "image/png"
+    assert client.get(f"/papers/{pid}/page/0/tile/1.5/40/40").status_code == 404
+
+def test_image_etag_and_revalidation(api, make_paper):
+    _, client = api
+    pid = make_paper("etag")
+    digest = client.get(f"/papers/{pid}/meta").json()["content_hash"]
+    url = f"/papers/{pid}/page/0/image"
+
+    r = client.get(url, params={"v": digest})
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and r.content
+    assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+    again = client.get(url, params={"v": digest}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    assert client.get(url, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get(url, params={"zoom": 2}, headers={"If-None-Match": etag}).status_code == 200
+
+@pytest.mark.parametrize("params", [{}, {"v": "stale"}])
+def test_image_without_current_version_is_revalidated(api, make_paper, params):
+    _, client = api
+    pid = make_paper("etag")
+    for path in ("image", "preview", "tile/1.5/0/0"):
+        r = client.get(f"/papers/{pid}/page/0/{path}", params=params)
+        assert r.status_code == 200 and r.headers["cache-control"] == "no-cache" and r.headers["etag"]
+
+def test_changed_pdf_gets_a_new_etag(api, make_paper):
+    _, client = api
+    pid = make_paper("etag_changed")
+    etag = client.get(f"/papers/{pid}/page/0/image").headers["etag"]
+    make_paper("etag_changed", pages=2)
+    r = client.get(f"/papers/{pid}/page/0/image", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
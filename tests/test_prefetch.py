@@ -0,0 +1,25 @@
+import threading
+import time
+
+from backend.services.prefetch import Prefetcher, page_order
+
+
+def test_cancel_drops_only_that_clients_work():
+    prefetcher = Prefetcher(workers=1)
+    gate = threading.Event()
+    prefetcher.submit("busy", 0, gate.wait, client="x")  # occupies the only worker
+    while prefetcher.status()["active"] == 0:
+        time.sleep(0.01)
+    for paper_id, client in (("p1", "a"), ("p2", "a"), ("p1", "b")):
+        prefetcher.submit(paper_id, 1, lambda: None, client=client)
+    try:
+        assert prefetcher.cancel(client="a") == 2
+        assert prefetcher.status()["by_paper"] == {"p1": 1}
+        assert prefetcher.cancel("p1", client="a") == 0
+        assert prefetcher.cancel("p1") == 1
+    finally:
+        gate.set()
+
+def test_page_order_stays_within_radius():
+    assert page_order(100, 10, 2) == [10, 11, 9, 12, 8]
+    assert page_order(3, 0, 5) == [0, 1, 2]
@@ -0,0 +1,53 @@
+from PIL import Image, ImageDraw
+
+from backend.services import recognition
+from backend.services.recognition_cache import RecognitionCache, crop_key
+
+
+def crop(width=80, height=40, ink_at=(10, 10), size=12):
+    img = Image.new("RGB", (width, height), "white")
+    x, y = ink_at
+    ImageDraw.Draw(img).rectangle([x, y, x + size, y + size // 2], fill="black")
+    return img
+
+
+def test_crop_key_ignores_white_margins_only():
+    key = crop_key(crop(), "v1")
+    assert crop_key(crop(width=120, height=60, ink_at=(30, 20)), "v1") == key
+    assert crop_key(crop(size=14), "v1") != key
+    assert crop_key(crop(), "v2") != key
+
+
+def test_recognize_batch_only_runs_misses(monkeypatch):
+    calls = []
+
+    def batch(crops):
+        calls.append(len(crops))
+        return [f"w{c.width}" for c in crops]
+
+    cache = RecognitionCache(max_items=100)
+    monkeypatch.setattr(recognition, "recognitions", cache)
+    recognition.use_recognizer(batch, "stub-1")
+    try:
+        a, b = crop(size=10), crop(size=20)
+        assert recognition.recognize_batch([a, a, b]) == ["w80", "w80", "w80"]
+        assert calls == [2]  # identical crops in one call are recognized once
+        assert cache.stats()["misses"] == 2
+
+        c = crop(size=30, width=90)
+        assert recognition.recognize_batch([b, c, a]) == ["w80", "w90", "w80"]
+        assert calls == [2, 1]
+        assert cache.stats()["hits_memory"] == 2 and cache.stats()["misses"] == 3
+
+        recognition.use_recognizer(batch, "stub-2")  # a new model version misses again
+        recognition.recognize_batch([a])
+        assert calls == [2, 1, 1]
+    finally:
+        recognition._model = None
+
+
+def test_cache_survives_restart(tmp_path):
+    RecognitionCache(db_path=tmp_path / "r.sqlite").put_many({"k1": "x^2"})
+    cache = RecognitionCache(db_path=tmp_path / "r.sqlite")
+    assert cache.get_many(["k1", "k2", "k1"]) == {"k1": "x^2"}
+    assert cache.stats()["hits_disk"] == 1 and cache.stats()["misses"] == 1
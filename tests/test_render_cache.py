@@ -0,0 +1,37 @@
+import pytest
+
+from backend.services.render_cache import RenderCache
+
+KEY = ("paper", "sig", 0, "png", 1.5)
+
+
+def _boom():
+    raise RuntimeError("render failed")
+
+
+def test_failed_render_releases_its_gate():
+    cache = RenderCache(max_bytes=1 << 20)
+    with pytest.raises(RuntimeError):
+        cache.get_or_create(KEY, _boom)
+    assert cache._inflight == {}
+    assert cache.get_or_create(KEY, lambda: b"pixels") == b"pixels"
+    assert cache.get(KEY) == b"pixels" and cache._inflight == {}
+
+
+def test_spilled_entries_come_back(tmp_path):
+    cache = RenderCache(max_bytes=8, spill_dir=tmp_path, max_disk_bytes=1 << 20)
+    cache.put(KEY, b"12345678")
+    cache.put(KEY[:2] + (1,) + KEY[3:], b"abcdefgh")  # pushes KEY to disk
+    assert cache.get(KEY) == b"12345678"
+
+
+def test_spill_dir_is_opened_on_first_use(tmp_path):
+    spill = tmp_path / "renders"
+    RenderCache(max_bytes=8, spill_dir=spill, max_disk_bytes=1 << 20)
+    assert not spill.exists()
+
+    first = RenderCache(max_bytes=8, spill_dir=spill, max_disk_bytes=1 << 20)
+    first.put(KEY, b"123456789")  # larger than memory: straight to disk
+    assert spill.exists()
+    reopened = RenderCache(max_bytes=8, spill_dir=spill, max_disk_bytes=1 << 20)
+    assert reopened.get(KEY) == b"123456789" and reopened.stats()["hits_disk"] == 1
@@ -0,0 +1,48 @@
+from backend import storage
+from backend.schemas import EquationRecord
+from backend.services.search import normalize, search_index, symbols_of, tokenize
+
+
+def record(paper_id, eq_uid, latex):
+    return EquationRecord(eq_uid=eq_uid, paper_id=paper_id, latex=latex,
+                          boxes=[{"page": 0, "bbox_pdf": (0, 0, 10, 10)}])
+
+def hits(result):
+    return [(i["paper_id"], i["eq_uid"]) for i in result["items"]]
+
+
+def test_normalize_ignores_layout_and_braces():
+    assert normalize(r"\left( x^{2} \right) \, \le \dfrac{a}{b}") == normalize(r"(x^2) \leq \frac a b")
+    assert symbols_of(tokenize(r"E_{0} = \alpha \mathbf x")) == {"E", "E_0", "\\alpha", "\\mathbf{x}"}
+
+def test_writes_keep_the_index_current(profiles):
+    storage.append_equation(profiles, record("p1", "a", r"E = m c^{2}"))
+    storage.append_equation(profiles, record("p2", "a", r"E = m c^2"))
+    storage.append_equation(profiles, record("p2", "b", r"E_0 = \alpha t"))
+    index = search_index(profiles)
+    assert hits(index.search(r"E=mc^2", mode="exact")) == [("p1", "a"), ("p2", "a")]
+    assert hits(index.search(symbols=["E_0", "\\alpha"])) == [("p2", "b")]
+
+    storage.update_equation(profiles, "p1", "a", record("p1", "a", "F = m a").model_dump())
+    storage.delete_equation(profiles, "p2", "a")
+    assert hits(index.search(r"E=mc^2", mode="exact")) == []
+    assert hits(index.search("F = m a"))[0] == ("p1", "a")
+
+def test_reindexing_a_paper_replaces_its_postings(profiles):
+    storage.append_equations(profiles, "p", [record("p", f"e{i}", f"x_{i} = y^{i}") for i in range(20)])
+    index = search_index(profiles)
+    before = index.conn.execute("SELECT COUNT(*) FROM grams").fetchone()[0]
+    storage._store(profiles, "p").publish_all()
+    assert index.conn.execute("SELECT COUNT(*) FROM grams").fetchone()[0] == before
+    assert index.stats() == {"papers": 1, "equations": 20}
+    plan = index.conn.execute(
+        "EXPLAIN QUERY PLAN DELETE FROM grams WHERE eq_id IN (SELECT id FROM equations WHERE paper_id = ?)", ("p",)
+    ).fetchall()
+    assert not any("SCAN grams" in row[-1] for row in plan)
+
+def test_reindex_profiles_catches_up(profiles):
+    storage.append_equation(profiles, record("p", "a", "z = w"))
+    index = search_index(profiles)
+    index.conn.execute("UPDATE papers SET revision = revision - 1")
+    assert storage.reindex_profiles(profiles) == [("p", 1)]
+    assert storage.reindex_profiles(profiles) == []
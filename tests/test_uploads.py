@@ -0,0 +1,62 @@
+from functools import lru_cache
+import hashlib
+
+import fitz
+
+from backend.services.uploads import PaperFiles
+
+
+@lru_cache(maxsize=None)
+def _pdf(text: str) -> bytes:
+    # memoized: PyMuPDF output differs between calls (document ID)
+    doc = fitz.open()
+    doc.new_page(width=200, height=200).insert_text((20, 40), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _upload(client, name, data, **params):
+    return client.post("/upload", files={"file": (name, data, "application/pdf")}, params=params)
+
+
+def test_duplicate_upload_maps_to_the_same_paper(api):
+    _, client = api
+    first = _upload(client, "Dup Paper.pdf", _pdf("same")).json()
+    again = _upload(client, "renamed.pdf", _pdf("same")).json()
+    assert first["outcome"] == "new" and again["outcome"] == "duplicate"
+    assert again["paper_id"] == first["paper_id"] and again["content_hash"] == first["content_hash"]
+
+
+def test_name_collision_gets_a_hash_suffix(api):
+    m, client = api
+    first = _upload(client, "clash.pdf", _pdf("one")).json()
+    other = _upload(client, "clash.pdf", _pdf("two")).json()
+    assert other["outcome"] == "new"
+    assert other["paper_id"] == f"{first['paper_id']}-{other['content_hash'][:8]}"
+    assert (m.PAPERS_ROOT / f"{first['paper_id']}.pdf").read_bytes() == _pdf("one")
+
+    replaced = _upload(client, "clash.pdf", _pdf("three"), replace="true").json()
+    assert replaced == {**replaced, "paper_id": first["paper_id"], "outcome": "replaced"}
+
+
+def test_non_pdf_is_rejected(api):
+    m, client = api
+    before = sorted(p.name for p in m.PAPERS_ROOT.iterdir())
+    assert _upload(client, "notes.txt", b"%PDF-1.4").status_code == 400
+    assert _upload(client, "fake.pdf", b"hello").status_code == 400
+    assert sorted(p.name for p in m.PAPERS_ROOT.iterdir()) == before
+
+
+def test_taken_suffix_name_is_not_overwritten(tmp_path):
+    files = PaperFiles(tmp_path)
+    (tmp_path / "p.pdf").write_bytes(_pdf("original"))
+    data = _pdf("incoming")
+    sha = hashlib.sha256(data).hexdigest()
+    squatter = tmp_path / f"p-{sha[:8]}.pdf"
+    squatter.write_bytes(_pdf("unrelated"))
+
+    tmp = tmp_path / ".upload-1.tmp"
+    tmp.write_bytes(data)
+    assert files.place(tmp, sha, "p") == (f"p-{sha[:16]}", "new")
+    assert squatter.read_bytes() == _pdf("unrelated")
@@ -0,0 +1,74 @@
+import multiprocessing
+
+import pytest
+
+from backend.services import validate
+from backend.services.validate import Validator
+
+
+class _Result:
+    def __init__(self, fn, args, hang):
+        self.fn, self.args, self.hang = fn, args, hang
+
+    def get(self, timeout=None):
+        if self.hang:
+            raise multiprocessing.TimeoutError()
+        return self.fn(*self.args)
+
+
+class _Pool:
+    def __init__(self, hang):
+        self.hang = hang
+        self.running = True
+
+    def apply_async(self, fn, args):
+        if not self.running:
+            raise ValueError("Pool not running")
+        return _Result(fn, args, self.hang)
+
+    def terminate(self):
+        self.running = False
+
+
+class _Pools(list):
+    pass
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """Pools handed out by the validator, in order; set .hang to make the next ones time out."""
+    created = _Pools()
+
+    class _Context:
+        hang = False
+
+        def Pool(self, n):
+            created.append(_Pool(_Context.hang))
+            return created[-1]
+
+    monkeypatch.setattr(validate.multiprocessing, "get_context", lambda method: _Context())
+    monkeypatch.setattr(validate, "_validate_clean", lambda s: {"ok": True, "errors": [], "parsed": s})
+    created.context = _Context
+    return created
+
+
+def test_pool_terminated_by_another_caller_is_replaced(pools):
+    v = Validator(workers=2, timeout=0.1, start_grace=0)
+    v.validate("a")
+    pools[0].terminate()  # what a concurrent _restart does between _get_pool and apply_async
+    assert v.validate_many(["b", "c"]) == [
+        {"ok": True, "errors": [], "parsed": "b"},
+        {"ok": True, "errors": [], "parsed": "c"},
+    ]
+    assert len(pools) == 2 and v.stats()["pool_restarts"] == 1
+
+
+def test_timeouts_are_not_cached(pools):
+    v = Validator(workers=1, timeout=0.1, start_grace=0)
+    pools.context.hang = True
+    assert v.validate("x^2")["errors"] == ["Validation timed out after 0.1s"]
+    assert v.stats()["cached"] == 0
+
+    pools.context.hang = False
+    assert v.validate("x^2")["ok"]
+    assert v.stats()["cached"] == 1
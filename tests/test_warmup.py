@@ -0,0 +1,30 @@
+from backend.services.warmup import Warmup
+
+
+def test_preload_runs_only_the_fork_safe_part():
+    calls = []
+    w = Warmup()
+    w.register("imports", lambda: calls.append("imports"))
+    w.register("model", lambda: calls.append("forward"), fork_safe=False, before_fork=lambda: calls.append("weights"))
+    w.register("pool", lambda: calls.append("pool"), fork_safe=False)
+
+    w.preload(w.resolve("all"))
+    assert calls == ["imports", "weights"]
+    assert w.status()["steps"]["model"]["status"] == "preloaded"
+    assert w.ready()
+
+    w.run(w.resolve("all"))
+    assert calls == ["imports", "weights", "forward", "pool"]
+    assert {s["status"] for s in w.status()["steps"].values()} == {"done"}
+
+
+def test_lifespan_starts_warmup_and_drains_on_shutdown(api, monkeypatch):
+    from fastapi.testclient import TestClient
+    m, _ = api
+    calls = []
+    monkeypatch.setattr(m, "start_warmup", lambda: calls.append("start"))
+    monkeypatch.setattr(m, "drain_background_work", lambda: calls.append("drain"))
+    with TestClient(m.app) as client:
+        assert client.get("/healthz").status_code == 200
+        assert calls == ["start"]
+    assert calls == ["start", "drain"]